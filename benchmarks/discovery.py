@@ -0,0 +1,355 @@
+"""
+Measures how the discovery-heavy commands scale with the size of an account.
+
+The commands run against a synthetic backend: a handler on the botocore
+`before-call` event answers every request from generated data, so no
+network, credentials or moto server are involved, and each answer can be
+delayed to stand in for the round trip to AWS. For each command the wall
+time, the number of API calls by operation and the peak memory are
+recorded, with a cold resource graph on every run.
+
+    python -m benchmarks.discovery
+    python -m benchmarks.discovery --stacks 800 --deleted-stacks 5000
+    python -m benchmarks.discovery --save-baseline
+    python -m benchmarks.discovery --check
+
+Baselines are stored per scenario in `benchmarks/baselines.json`, with the
+parameters they were measured with, and `--check` refuses to compare runs
+with other parameters. It fails when a command makes more API calls than
+its baseline. Wall times and memory depend on the machine and Python
+version, so they are only checked against the baseline plus the tolerance
+with `--check-time` and `--check-memory`.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from tabulate import tabulate
+
+from tizona import cache
+from tizona.aws.cloudformation import ListStackResources, ListStacks
+from tizona.core import get_credentials_key
+from tizona.decorators import State
+from tizona.services.general import GetApi, ListApis, ListFunctions
+
+BASELINES_PATH = Path(__file__).parent / 'baselines.json'
+PROJECT = 'bench'
+REGION = 'eu-west-1'
+PAGE_SIZE = 100
+# The page size API Gateway uses for get_resources when no limit is given
+RESOURCES_PAGE_SIZE = 25
+# Options that don't change what is measured, left out of the parameters
+# stored with a baseline
+CHECK_OPTIONS = (
+    'scenario', 'save_baseline', 'check', 'check_time', 'check_memory',
+    'tolerance',
+)
+
+
+class SyntheticBackend:
+    """
+    Answers the CloudFormation and API Gateway calls the discovery commands
+    make. The project has `stacks` live stacks, the first `apis` of which
+    have a REST API with `routes` routes, and the account also has as many
+    stacks of another project and `deleted_stacks` deleted stacks.
+    """
+
+    def __init__(self, stacks, deleted_stacks, resources, apis, routes,
+                 latency):
+        self.latency = latency
+        self.calls = Counter()
+        self.stack_summaries = []
+        self.stack_resources = {}
+        for index in range(deleted_stacks):
+            self.add_stack(f'{PROJECT}-removed{index}-prod', 'DELETE_COMPLETE')
+        for project in ('other', PROJECT):
+            for index in range(stacks):
+                name = f'{project}-service{index}-prod'
+                self.add_stack(name, 'UPDATE_COMPLETE')
+                self.stack_resources[name] = self.make_resources(
+                    name, resources, with_api=project == PROJECT and index < apis  # noqa: E501
+                )
+        self.api_resources = {
+            f'api{index}': [{'id': 'root', 'path': '/'}] + [
+                {'id': f'route{route}', 'path': f'/route{route}',
+                 'resourceMethods': {'GET': {}, 'POST': {}}}
+                for route in range(routes)
+            ]
+            for index in range(apis)
+        }
+
+    def add_stack(self, name, status):
+        self.stack_summaries.append({
+            'StackName': name,
+            'StackId': f'arn:aws:cloudformation:{REGION}:123456789012:stack/{name}/id',  # noqa: E501
+            'StackStatus': status,
+        })
+
+    @staticmethod
+    def make_resources(stack_name, count, with_api):
+        resources = []
+        if with_api:
+            index = stack_name.split('-')[1].replace('service', '')
+            resources.append(
+                ('Api', f'api{index}', 'AWS::ApiGateway::RestApi')
+            )
+        for index in range(count - len(resources)):
+            if index % 3 == 0:
+                resource_type = 'AWS::Lambda::Function'
+            elif index % 3 == 1:
+                resource_type = 'AWS::IAM::Role'
+            else:
+                resource_type = 'AWS::Lambda::Permission'
+            resources.append(
+                (f'Resource{index}', f'{stack_name}-resource{index}',
+                 resource_type)
+            )
+        return [
+            {'LogicalResourceId': logical_id, 'PhysicalResourceId': physical_id,  # noqa: E501
+             'ResourceType': resource_type, 'ResourceStatus': 'CREATE_COMPLETE'}  # noqa: E501
+            for logical_id, physical_id, resource_type in resources
+        ]
+
+    def register(self, session):
+        session.events.register('provide-client-params', self.keep_params)
+        session.events.register('before-call', self.respond)
+
+    @staticmethod
+    def keep_params(params, context, **kwargs):
+        context['benchmark_params'] = dict(params)
+
+    def respond(self, model, context, **kwargs):
+        self.calls[f'{model.service_model.service_name}.{model.name}'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        handler = getattr(self, model.name)
+        parsed = handler(**context['benchmark_params'])
+        parsed['ResponseMetadata'] = {
+            'HTTPStatusCode': 200, 'HTTPHeaders': {}, 'RetryAttempts': 0
+        }
+        return AWSResponse('https://synthetic', 200, {}, None), parsed
+
+    @staticmethod
+    def paginate(items, token, key, token_key, page_size=PAGE_SIZE):
+        start = int(token or 0)
+        page = {key: items[start:start + page_size]}
+        if start + page_size < len(items):
+            page[token_key] = str(start + page_size)
+        return page
+
+    def ListStacks(self, NextToken=None, **kwargs):
+        return self.paginate(
+            self.stack_summaries, NextToken, 'StackSummaries', 'NextToken'
+        )
+
+    def ListStackResources(self, StackName, NextToken=None):
+        return self.paginate(
+            self.stack_resources[StackName], NextToken,
+            'StackResourceSummaries', 'NextToken'
+        )
+
+    def GetAuthorizers(self, restApiId, **kwargs):
+        return {'items': [{'id': 'authorizer', 'name': 'Cognito'}]}
+
+    def GetResources(self, restApiId, position=None, **kwargs):
+        return self.paginate(
+            self.api_resources[restApiId], position, 'items', 'position',
+            page_size=RESOURCES_PAGE_SIZE
+        )
+
+    def GetMethod(self, restApiId, resourceId, httpMethod):
+        function_name = f'{restApiId}{resourceId}{httpMethod}'
+        return {'methodIntegration': {
+            'uri': f'arn:aws:apigateway:{REGION}:lambda:path/2015-03-31/'
+                   f'functions/arn:aws:lambda:{REGION}:123456789012:'
+                   f'function:{function_name}/invocations'
+        }}
+
+
+def make_commands():
+    state = State()
+    return {
+        'get_stacks': lambda: ListStacks(project=PROJECT, state=state).run(),
+        'list_stack_resources': lambda: ListStackResources(
+            project=PROJECT, stack=f'{PROJECT}-service0-prod', state=state
+        ).run(),
+        'list_api_functions': lambda: ListFunctions(
+            api=None, project=PROJECT, state=state
+        ).run(),
+        'ListApis': lambda: ListApis(project=PROJECT, state=state).run(),
+        'Api': lambda: GetApi(
+            project=PROJECT, service='service0', state=state
+        ).run(),
+    }
+
+
+def measure(command, backend, repeat):
+    """
+    Returns the median wall time of `repeat` cold runs, the API calls of a
+    run and the peak memory of a run traced separately, since tracing
+    slows everything down.
+    """
+    times = []
+    for _ in range(repeat):
+        cache.invalidate('graph')
+        backend.calls.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            command()
+            times.append(time.perf_counter() - started)
+    calls = dict(backend.calls)
+    cache.invalidate('graph')
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        command()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_s': round(statistics.median(times), 4),
+        'calls': calls,
+        'peak_kib': round(peak / 1024),
+    }
+
+
+def run(args):
+    backend = SyntheticBackend(
+        args.stacks, args.deleted_stacks, args.resources, args.apis,
+        args.routes, args.latency_ms / 1000
+    )
+    session = boto3.session.Session(
+        aws_access_key_id='benchmark', aws_secret_access_key='benchmark',
+        region_name=REGION
+    )
+    backend.register(session)
+    # Seeded under the key the commands look their session up with
+    cache.get_or_create(
+        ('session', 'benchmark', REGION, get_credentials_key()),
+        lambda: session
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            Path('.tizona.yaml').write_text(json.dumps({
+                'project': PROJECT, 'aws_profile': 'benchmark',
+                'aws_region': REGION, 'max_concurrency': args.max_concurrency,
+            }))
+            return {
+                name: measure(command, backend, args.repeat)
+                for name, command in make_commands().items()
+            }
+        finally:
+            os.chdir(cwd)
+
+
+def get_parameters(args):
+    return {
+        key: value for key, value in vars(args).items()
+        if key not in CHECK_OPTIONS
+    }
+
+
+def compare(results, baseline, tolerance, metrics=()):
+    """
+    Returns a description of every regression of `results` against
+    `baseline`: more API calls, or more of one of `metrics` than the
+    baseline plus the tolerance.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        calls, expected_calls = sum(result['calls'].values()), sum(expected['calls'].values())  # noqa: E501
+        if calls > expected_calls:
+            regressions.append(f'{name}: {calls} API calls, baseline {expected_calls}')  # noqa: E501
+        for metric in metrics:
+            if result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {metric} {result[metric]}, baseline '
+                    f'{expected[metric]}'
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenario', default='default',
+                        help='Name the baseline is stored under')
+    parser.add_argument('--stacks', type=int, default=200)
+    parser.add_argument('--deleted-stacks', type=int, default=2000)
+    parser.add_argument('--resources', type=int, default=30,
+                        help='Resources per stack')
+    parser.add_argument('--apis', type=int, default=20)
+    parser.add_argument('--routes', type=int, default=40,
+                        help='Routes per API')
+    parser.add_argument('--latency-ms', type=float, default=5,
+                        help='Simulated round trip of each API call')
+    parser.add_argument('--max-concurrency', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown or memory growth, as a ratio')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--check-time', action='store_true',
+                        help='Also fail --check on slower wall times')
+    parser.add_argument('--check-memory', action='store_true',
+                        help='Also fail --check on a higher peak memory')
+    args = parser.parse_args()
+
+    baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}  # noqa: E501
+    if args.check:
+        if args.scenario not in baselines:
+            sys.exit(f'No baseline for {args.scenario}')
+        expected = baselines[args.scenario]['parameters']
+        if expected != get_parameters(args):
+            sys.exit(
+                f'The baseline of {args.scenario} was measured with '
+                f'{json.dumps(expected, sort_keys=True)}, run with the same '
+                f'parameters or save a baseline under another --scenario'
+            )
+
+    results = run(args)
+    print(tabulate(
+        [[name, result['wall_s'], sum(result['calls'].values()),
+          result['peak_kib']]
+         for name, result in results.items()],
+        headers=['Command', 'Wall (s)', 'API calls', 'Peak (KiB)']
+    ))
+    if args.save_baseline:
+        baselines[args.scenario] = {
+            'parameters': get_parameters(args),
+            'results': results,
+        }
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')  # noqa: E501
+        print(f'Baseline saved as {args.scenario}')
+    if args.check:
+        metrics = [
+            metric for metric, enabled in
+            (('wall_s', args.check_time), ('peak_kib', args.check_memory))
+            if enabled
+        ]
+        regressions = compare(
+            results, baselines[args.scenario]['results'], args.tolerance,
+            metrics
+        )
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
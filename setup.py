@@ -48,7 +48,7 @@ setup(
     author_email='joseharoperalta@gmail.com',
     license='BSD',
     url='https://',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     package_data={
         'ez_sls': [
             '../requirements*',
@@ -57,11 +57,11 @@ setup(
     install_requires=get_install_requirements(),
     entry_points='''
         [console_scripts]
-        tizona=tizona.scripts.tizona:cli
+        tizona=tizona.scripts:main
     ''',
     extras_require={
-        'awscli': [
-            'awscli'
+        'brotli': [
+            'brotli'
         ],
     },
 )
@@ -0,0 +1,22 @@
+import pytest
+
+from tizona import cache
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    """
+    Runs the test from a project with a `.tizona.yaml`, with nothing cached
+    from other tests and credentials that can't reach AWS.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / '.tizona.yaml').write_text(
+        'project: indago\naws_profile: null\naws_region: eu-west-1\n'
+    )
+    for name in ('AWS_PROFILE', 'AWS_ENDPOINT_URL', 'TIZONA_AWS_ENDPOINT_URL'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    cache.invalidate()
+    yield tmp_path
+    cache.invalidate()
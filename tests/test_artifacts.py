@@ -0,0 +1,130 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from tizona.decorators import State
+from tizona.services.artifacts import (
+    DEFAULT_ARTIFACTS_BUCKET, ArtifactIndex, CollectGarbage, get_artifact_key
+)
+
+
+def days_ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def entry(hexsha, built_days_ago, deployed_days_ago=None, deployed=False):
+    entry = {
+        'key': get_artifact_key('payments', hexsha),
+        'size': 10,
+        'sha256': None,
+        'built_at': days_ago(built_days_ago),
+        'deployed': deployed,
+    }
+    if deployed_days_ago is not None:
+        entry['deployed_at'] = days_ago(deployed_days_ago)
+    return entry
+
+
+@pytest.fixture
+def s3(project_dir):
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='eu-west-1')
+        s3.create_bucket(
+            Bucket=DEFAULT_ARTIFACTS_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'}
+        )
+        yield s3
+
+
+def put_index(s3, project, artifacts):
+    s3.put_object(
+        Bucket=DEFAULT_ARTIFACTS_BUCKET,
+        Key=f'.tizona/artifacts/{project}/payments.json',
+        Body=json.dumps({'artifacts': artifacts})
+    )
+    for artifact in artifacts.values():
+        s3.put_object(
+            Bucket=DEFAULT_ARTIFACTS_BUCKET, Key=artifact['key'], Body=b'zip'
+        )
+
+
+def list_keys(s3):
+    return {
+        artifact['Key'] for artifact in s3.list_objects_v2(
+            Bucket=DEFAULT_ARTIFACTS_BUCKET, Prefix='payments/'
+        )['Contents']
+    }
+
+
+def test_gc_ignores_stale_entries_of_other_projects(s3):
+    # Both projects deployed `old` and have moved on to `new` since
+    for project in ('indago', 'staging'):
+        put_index(s3, project, {
+            'old': entry('old', 60, deployed_days_ago=50),
+            'new': entry('new', 40, deployed_days_ago=40, deployed=True),
+        })
+    CollectGarbage(
+        project='indago', service='payments', keep=1, max_age_days=30,
+        state=State()
+    ).run()
+    assert list_keys(s3) == {get_artifact_key('payments', 'new')}
+
+
+def test_gc_keeps_what_other_projects_retain(s3):
+    put_index(s3, 'indago', {
+        'old': entry('old', 60, deployed_days_ago=50),
+        'new': entry('new', 40, deployed_days_ago=40, deployed=True),
+    })
+    # Still live in staging
+    put_index(s3, 'staging', {
+        'old': entry('old', 60, deployed_days_ago=50, deployed=True),
+    })
+    CollectGarbage(
+        project='indago', service='payments', keep=1, max_age_days=30,
+        state=State()
+    ).run()
+    assert list_keys(s3) == {
+        get_artifact_key('payments', 'old'),
+        get_artifact_key('payments', 'new'),
+    }
+
+
+def load_index(s3, project):
+    return json.loads(s3.get_object(
+        Bucket=DEFAULT_ARTIFACTS_BUCKET,
+        Key=f'.tizona/artifacts/{project}/payments.json'
+    )['Body'].read())['artifacts']
+
+
+@pytest.mark.parametrize('existing', [False, True])
+def test_concurrent_builds_keep_both_entries(s3, existing):
+    if existing:
+        put_index(s3, 'indago', {'old': entry('old', 60, deployed=True)})
+    # Both builds read the index before either of them writes it
+    first, second = (
+        ArtifactIndex(s3, DEFAULT_ARTIFACTS_BUCKET, 'indago', 'payments')
+        for _ in range(2)
+    )
+    first.load()
+    second.load()
+    first.record_build('a', get_artifact_key('payments', 'a'), 10, None)
+    second.record_build('b', get_artifact_key('payments', 'b'), 10, None)
+    expected = {'a', 'b', 'old'} if existing else {'a', 'b'}
+    assert set(load_index(s3, 'indago')) == expected
+
+
+def test_deployment_racing_a_build_keeps_the_build(s3):
+    put_index(s3, 'indago', {'old': entry('old', 60)})
+    build, deploy = (
+        ArtifactIndex(s3, DEFAULT_ARTIFACTS_BUCKET, 'indago', 'payments')
+        for _ in range(2)
+    )
+    deploy.load()
+    build.record_build('new', get_artifact_key('payments', 'new'), 10, None)
+    deploy.record_deployment('old', get_artifact_key('payments', 'old'))
+    artifacts = load_index(s3, 'indago')
+    assert set(artifacts) == {'old', 'new'}
+    assert artifacts['old']['deployed'] and not artifacts['new']['deployed']
@@ -0,0 +1,40 @@
+import os
+import time
+
+from tizona.services.build import (
+    DEPENDENCIES_CACHE_PATH, fill_dependency_cache, get_dependencies_key,
+    prune_dependency_cache
+)
+
+
+def make_site_packages(root):
+    site_packages_dir = root / 'venv' / 'lib' / 'python3.7' / 'site-packages'
+    (site_packages_dir / 'requests').mkdir(parents=True)
+    (site_packages_dir / 'requests' / '__init__.py').write_text('v1')
+    return site_packages_dir
+
+
+def test_installing_packages_changes_dependencies_key(project_dir):
+    site_packages_dir = make_site_packages(project_dir)
+    key = get_dependencies_key(site_packages_dir, 'lock')
+    assert get_dependencies_key(site_packages_dir, 'lock') == key
+    assert get_dependencies_key(site_packages_dir, 'other-lock') != key
+
+    (site_packages_dir / 'extra.py').write_text('')
+    assert get_dependencies_key(site_packages_dir, 'lock') != key
+
+
+def test_cache_entry_is_reused_until_pruned(project_dir):
+    site_packages_dir = make_site_packages(project_dir)
+    key = get_dependencies_key(site_packages_dir, 'lock')
+    cache_dir = fill_dependency_cache(site_packages_dir, key)
+    assert (cache_dir / 'requests' / '__init__.py').read_text() == 'v1'
+    assert fill_dependency_cache(site_packages_dir, key) == cache_dir
+
+    stale_dir = DEPENDENCIES_CACHE_PATH / 'stale'
+    stale_dir.mkdir()
+    old = time.time() - 30 * 24 * 60 * 60
+    os.utime(stale_dir, (old, old))
+    prune_dependency_cache()
+    assert not stale_dir.exists()
+    assert cache_dir.is_dir()
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from botocore.stub import ANY, Stubber
+from click import ClickException
+
+from tizona.aws.cloudformation import Sceptre
+
+STACK_NAME = 'indago-payments-prod'
+CHANGE_SET_NAME = 'tizona-' + '0' * 32
+
+
+@pytest.fixture
+def sceptre(project_dir):
+    client = boto3.client('cloudformation', region_name='eu-west-1')
+    # Only what preparing a change set needs, without a sceptre project
+    command = Sceptre.__new__(Sceptre)
+    command.cloudformation = client
+    command.stack_name = STACK_NAME
+    command.plan = SimpleNamespace(
+        command_stacks=[SimpleNamespace(external_name=STACK_NAME)]
+    )
+    command.create_change_set = lambda change_set_name: None
+    with Stubber(client) as stubber:
+        # Nothing prepared by an earlier run
+        stubber.add_client_error(
+            'describe_change_set', 'ChangeSetNotFound',
+            expected_params={'StackName': STACK_NAME, 'ChangeSetName': ANY}
+        )
+        yield command, stubber
+        stubber.assert_no_pending_responses()
+
+
+def fail_change_set(stubber, reason):
+    stubber.add_response('describe_change_set', {
+        'ChangeSetName': CHANGE_SET_NAME, 'StackName': STACK_NAME,
+        'Status': 'FAILED', 'StatusReason': reason,
+        'ExecutionStatus': 'UNAVAILABLE', 'Changes': [],
+        'CreationTime': datetime(2024, 1, 1, tzinfo=timezone.utc),
+    })
+    stubber.add_response('delete_change_set', {}, {
+        'StackName': STACK_NAME, 'ChangeSetName': CHANGE_SET_NAME
+    })
+
+
+def test_change_set_without_changes_means_up_to_date(sceptre):
+    command, stubber = sceptre
+    fail_change_set(
+        stubber, "The submitted information didn't contain changes. Submit "
+                 "different information to create a change set."
+    )
+    assert command.prepare_change_set('0' * 64) is None
+
+
+def test_failed_change_set_without_changes_raises(sceptre):
+    command, stubber = sceptre
+    fail_change_set(
+        stubber, 'Requires capabilities : [CAPABILITY_IAM]'
+    )
+    with pytest.raises(ClickException, match='CAPABILITY_IAM'):
+        command.prepare_change_set('0' * 64)
@@ -0,0 +1,92 @@
+import os
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from tizona.aws.cloudwatch import Logs, Metrics
+from tizona.aws.engine import AsyncEngine
+from tizona.aws.graph import LAMBDA_FUNCTION, ResourceNode
+
+FUNCTION = ResourceNode(
+    'indago-payments-prod', 'Charge', 'payments-charge', LAMBDA_FUNCTION,
+    'CREATE_COMPLETE'
+)
+GROUP = '/aws/lambda/payments-charge'
+
+
+@pytest.fixture
+def logs(project_dir):
+    with mock_aws():
+        client = boto3.client('logs', region_name='eu-west-1')
+        client.create_log_group(logGroupName=GROUP)
+        for stream in ('a', 'b'):
+            client.create_log_stream(logGroupName=GROUP, logStreamName=stream)
+        # Only what fetching needs, without discovering a stack
+        command = Logs.__new__(Logs)
+        command.engine = AsyncEngine()
+        command.logs = client
+        command.filter_pattern = None
+        command.cursors = {
+            FUNCTION.logical_id: (int((time.time() - 60) * 1000), {})
+        }
+        yield command
+
+
+def put_event(logs, stream, seconds_ago, message):
+    logs.logs.put_log_events(
+        logGroupName=GROUP, logStreamName=stream,
+        logEvents=[{
+            'timestamp': int((time.time() - seconds_ago) * 1000),
+            'message': message,
+        }]
+    )
+
+
+def fetch(logs):
+    return [
+        event['message'] for _, event in
+        logs.engine.run(logs.fetch_group_async(FUNCTION))
+    ]
+
+
+def test_follow_picks_up_events_received_late(logs):
+    put_event(logs, 'a', 10, 'first')
+    put_event(logs, 'a', 5, 'second')
+    assert fetch(logs) == ['first', 'second']
+    # Received after `second`, from another instance, but older
+    put_event(logs, 'b', 8, 'late')
+    assert fetch(logs) == ['late']
+    assert fetch(logs) == []
+
+
+def test_events_older_than_the_lookback_are_forgotten(logs):
+    put_event(logs, 'a', 50, 'old')
+    put_event(logs, 'a', 5, 'new')
+    assert fetch(logs) == ['old', 'new']
+    _, seen = logs.cursors[FUNCTION.logical_id]
+    assert len(seen) == 1
+    assert fetch(logs) == []
+
+
+def test_metrics_are_reused_by_other_processes_until_they_expire(project_dir):
+    fetches = []
+
+    async def fetch_async():
+        fetches.append(None)
+        return {'f0_m0': [len(fetches)]}
+
+    # Only what loading needs, without discovering a stack
+    command = Metrics.__new__(Metrics)
+    command.engine = AsyncEngine()
+    command.fetch_async = fetch_async
+    key = ('metrics', None, 'eu-west-1', 'credentials', ('charge',), 3600)
+    assert command.load_values(key, 60) == {'f0_m0': [1]}
+    # As a command run by another process would
+    assert command.load_values(key, 60) == {'f0_m0': [1]}
+
+    for path in (project_dir / '.tizona' / 'cache' / 'metrics').iterdir():
+        expired = time.time() - 120
+        os.utime(path, (expired, expired))
+    assert command.load_values(key, 60) == {'f0_m0': [2]}
@@ -0,0 +1,15 @@
+from tizona.core import AWSCommand
+from tizona.decorators import State
+
+
+def test_sessions_are_not_shared_across_credentials(project_dir, monkeypatch):
+    first = AWSCommand(state=State())
+    assert AWSCommand(state=State()).aws_session is first.aws_session
+
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'second')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'second')
+    second = AWSCommand(state=State())
+    assert second.aws_session is not first.aws_session
+    assert second.client('s3') is not first.client('s3')
+    credentials = second.client('s3')._request_signer._credentials
+    assert credentials.access_key == 'second'
@@ -0,0 +1,124 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from tizona import daemon
+
+# Starts a daemon with a few extra commands to forward
+DAEMON_SCRIPT = textwrap.dedent('''
+    import os
+    import time
+
+    import click
+
+    from tizona import daemon
+    from tizona.scripts.tizona import cli
+
+
+    @cli.command()
+    def wait():
+        click.echo('started')
+        time.sleep(30)
+        click.echo('finished')
+
+
+    @cli.command()
+    def env():
+        click.echo(os.environ.get('AWS_ACCESS_KEY_ID', '-'))
+        click.echo('to stderr', err=True)
+
+
+    daemon.serve()
+''')
+
+
+@pytest.fixture
+def daemon_socket(tmp_path, monkeypatch):
+    path = tmp_path / 'daemon.sock'
+    monkeypatch.setenv('TIZONA_DAEMON_SOCKET', path.as_posix())
+    process = subprocess.Popen(
+        [sys.executable, '-c', DAEMON_SCRIPT],
+        env=dict(os.environ, PYTHONPATH=os.getcwd())
+    )
+    for _ in range(100):
+        if daemon.ping() is not None:
+            break
+        time.sleep(0.1)
+    else:
+        process.kill()
+        pytest.fail('The daemon did not start')
+    yield path
+    if process.poll() is None:
+        daemon.stop()
+    process.wait(timeout=10)
+
+
+def start_command(args):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(daemon.socket_path().as_posix())
+    stream = connection.makefile('rwb')
+    stream.write(json.dumps({
+        'command': 'run', 'args': args, 'cwd': os.getcwd(), 'env': {},
+        'color': False,
+    }).encode() + b'\n')
+    stream.flush()
+    return connection, stream
+
+
+def test_forward_runs_command_with_caller_env(daemon_socket, monkeypatch,
+                                              capsys):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'first')
+    assert daemon.forward(['env']) == 0
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'second')
+    assert daemon.forward(['env']) == 0
+    captured = capsys.readouterr()
+    assert captured.out == 'first\nsecond\n'
+    assert captured.err == 'to stderr\nto stderr\n'
+
+
+def test_output_is_streamed_while_command_runs(daemon_socket):
+    connection, stream = start_command(['wait'])
+    with connection, stream:
+        message = json.loads(stream.readline())
+        assert message == {'output': 'started\n', 'stream': 'stdout'}
+
+
+def test_command_is_answered_busy_while_another_runs(daemon_socket):
+    connection, stream = start_command(['wait'])
+    with connection, stream:
+        stream.readline()
+        assert daemon.forward(['env']) is None
+
+
+def test_closing_connection_cancels_command(daemon_socket, capsys):
+    connection, stream = start_command(['wait'])
+    stream.readline()
+    stream.close()
+    connection.close()
+    # The daemon is free again well before the command would have finished
+    started = time.monotonic()
+    while daemon.forward(['env']) is None:
+        assert time.monotonic() - started < 5
+        time.sleep(0.1)
+    assert capsys.readouterr().out == '-\n'
+
+
+def test_stop_while_command_runs(daemon_socket):
+    connection, stream = start_command(['wait'])
+    with connection, stream:
+        stream.readline()
+        stopping = threading.Thread(target=daemon.stop)
+        stopping.start()
+        stopping.join(timeout=5)
+        assert not stopping.is_alive()
+
+
+def test_socket_is_only_reachable_by_its_owner(daemon_socket):
+    assert daemon_socket.stat().st_mode & 0o777 == 0o600
@@ -0,0 +1,106 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from tizona.aws.cloudformation import ListStackResources, ListStacks
+from tizona.decorators import State
+from tizona.services.general import GetApi, ListApis
+
+INTEGRATION_URI = (
+    'arn:aws:apigateway:eu-west-1:lambda:path/2015-03-31/functions/'
+    'arn:aws:lambda:eu-west-1:123456789012:function:{}/invocations'
+)
+
+
+def api_template(functions):
+    resources = {
+        'Api': {
+            'Type': 'AWS::ApiGateway::RestApi',
+            'Properties': {'Name': 'api'},
+        },
+    }
+    for path, function_name in functions.items():
+        resources[f'{path}Resource'] = {
+            'Type': 'AWS::ApiGateway::Resource',
+            'Properties': {
+                'RestApiId': {'Ref': 'Api'},
+                'ParentId': {'Fn::GetAtt': ['Api', 'RootResourceId']},
+                'PathPart': path,
+            },
+        }
+        resources[f'{path}Method'] = {
+            'Type': 'AWS::ApiGateway::Method',
+            'Properties': {
+                'RestApiId': {'Ref': 'Api'},
+                'ResourceId': {'Ref': f'{path}Resource'},
+                'HttpMethod': 'GET',
+                'AuthorizationType': 'NONE',
+                'Integration': {
+                    'Type': 'AWS_PROXY',
+                    'IntegrationHttpMethod': 'POST',
+                    'Uri': INTEGRATION_URI.format(function_name),
+                },
+            },
+        }
+    return json.dumps({'Resources': resources})
+
+
+@pytest.fixture
+def account(project_dir):
+    with mock_aws():
+        cloudformation = boto3.client(
+            'cloudformation', region_name='eu-west-1'
+        )
+        cloudformation.create_stack(
+            StackName='indago-payments-prod',
+            TemplateBody=api_template({'charges': 'charge', 'refunds': 'refund'})  # noqa: E501
+        )
+        cloudformation.create_stack(
+            StackName='indago-maps-prod',
+            TemplateBody=api_template({'maps': 'map'})
+        )
+        cloudformation.create_stack(
+            StackName='other-payments-prod',
+            TemplateBody=api_template({'other': 'other'})
+        )
+        cloudformation.create_stack(
+            StackName='indago-removed-prod',
+            TemplateBody=api_template({'removed': 'removed'})
+        )
+        cloudformation.delete_stack(StackName='indago-removed-prod')
+        yield
+
+
+def test_list_stacks(account, capsys):
+    ListStacks(project='indago', state=State()).run()
+    assert sorted(capsys.readouterr().out.split()) == [
+        'indago-maps-prod', 'indago-payments-prod', 'indago-removed-prod'
+    ]
+
+
+def test_list_stack_resources(account, capsys):
+    ListStackResources(
+        project='indago', stack='indago-maps-prod', state=State()
+    ).run()
+    output = capsys.readouterr().out
+    assert 'AWS::ApiGateway::RestApi' in output
+    assert 'mapsMethod' in output
+
+
+def test_get_api(account):
+    command = GetApi(project='indago', service='payments', state=State())
+    api = command.engine.run(command.load_api())
+    assert api.resources == {
+        '/charges': {'GET': ['charge']},
+        '/refunds': {'GET': ['refund']},
+    }
+
+
+def test_list_apis_skips_other_projects_and_deleted_stacks(account):
+    command = ListApis(project='indago', state=State())
+    apis = command.engine.run(command.load_apis())
+    assert sorted(
+        path for api in apis for path in api.resources
+    ) == ['/charges', '/maps', '/refunds']
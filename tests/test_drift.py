@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from tizona.aws.cloudformation import Drift
+from tizona.aws.engine import AsyncEngine
+
+STACK_NAME = 'indago-payments-prod'
+STACK_ID = (
+    f'arn:aws:cloudformation:eu-west-1:123456789012:stack/{STACK_NAME}/id'
+)
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def drift(project_dir):
+    client = boto3.client('cloudformation', region_name='eu-west-1')
+    # Only what detecting needs, without discovering the stacks
+    command = Drift.__new__(Drift)
+    command.engine = AsyncEngine()
+    command.cloudformation = client
+    command.poll_interval = 0
+    with Stubber(client) as stubber:
+        yield command, stubber
+        stubber.assert_no_pending_responses()
+
+
+def detection_status(status, **kwargs):
+    return {
+        'StackId': STACK_ID, 'StackDriftDetectionId': 'detection',
+        'DetectionStatus': status, 'Timestamp': NOW, **kwargs,
+    }
+
+
+def test_detect_poll_and_describe_drifted_stack(drift):
+    command, stubber = drift
+    stubber.add_response(
+        'detect_stack_drift', {'StackDriftDetectionId': 'detection'},
+        {'StackName': STACK_NAME}
+    )
+    for status in (
+        detection_status('DETECTION_IN_PROGRESS'),
+        detection_status('DETECTION_COMPLETE', StackDriftStatus='DRIFTED'),
+    ):
+        stubber.add_response(
+            'describe_stack_drift_detection_status', status,
+            {'StackDriftDetectionId': 'detection'}
+        )
+    resource_drifts = [
+        {'StackId': STACK_ID, 'LogicalResourceId': logical_id,
+         'ResourceType': 'AWS::Lambda::Function',
+         'StackResourceDriftStatus': status, 'Timestamp': NOW}
+        for logical_id, status in (('Charge', 'MODIFIED'),
+                                   ('Refund', 'DELETED'))
+    ]
+    filters = ['MODIFIED', 'DELETED']
+    stubber.add_response(
+        'describe_stack_resource_drifts',
+        {'StackResourceDrifts': resource_drifts[:1], 'NextToken': 'page'},
+        {'StackName': STACK_NAME, 'StackResourceDriftStatusFilters': filters}
+    )
+    stubber.add_response(
+        'describe_stack_resource_drifts',
+        {'StackResourceDrifts': resource_drifts[1:]},
+        {'StackName': STACK_NAME, 'StackResourceDriftStatusFilters': filters,
+         'NextToken': 'page'}
+    )
+
+    detections, drifts = command.engine.run(
+        command.detect_drift_async([STACK_NAME])
+    )
+    assert detections[STACK_NAME]['StackDriftStatus'] == 'DRIFTED'
+    assert drifts == {STACK_NAME: resource_drifts}
+
+
+def test_failed_detection_is_not_polled(drift):
+    command, stubber = drift
+    stubber.add_client_error(
+        'detect_stack_drift', 'ValidationError',
+        'Drift detection is already in progress', 400,
+        expected_params={'StackName': STACK_NAME}
+    )
+
+    detections, drifts = command.engine.run(
+        command.detect_drift_async([STACK_NAME])
+    )
+    assert detections[STACK_NAME]['DetectionStatus'] == 'DETECTION_FAILED'
+    assert drifts == {}
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from tizona.aws.events import StackEventTailer
+
+STACK_NAME = 'indago-payments-prod'
+STACK_ID = (
+    f'arn:aws:cloudformation:eu-west-1:123456789012:stack/{STACK_NAME}/id'
+)
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def cloudformation(project_dir):
+    client = boto3.client('cloudformation', region_name='eu-west-1')
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def event(event_id, status):
+    return {
+        'StackId': STACK_ID, 'EventId': event_id, 'StackName': STACK_NAME,
+        'LogicalResourceId': STACK_NAME,
+        'ResourceType': 'AWS::CloudFormation::Stack',
+        'ResourceStatus': status, 'Timestamp': NOW,
+    }
+
+
+def stack(status):
+    return {'Stacks': [{
+        'StackName': STACK_NAME, 'StackStatus': status, 'CreationTime': NOW,
+    }]}
+
+
+def test_follow_returns_final_status(cloudformation, capsys):
+    client, stubber = cloudformation
+    stubber.add_response(
+        'describe_stack_events',
+        {'StackEvents': [event('2', 'UPDATE_COMPLETE'),
+                         event('1', 'UPDATE_IN_PROGRESS')]}
+    )
+    tailer = StackEventTailer(client, STACK_NAME, timeout=60)
+    assert tailer.follow() == 'UPDATE_COMPLETE'
+    assert 'UPDATE_COMPLETE' in capsys.readouterr().out
+
+
+def test_follow_falls_back_to_stack_status_after_timeout(cloudformation):
+    client, stubber = cloudformation
+    # The final event is missed
+    stubber.add_response('describe_stack_events', {'StackEvents': []})
+    stubber.add_response('describe_stacks', stack('UPDATE_COMPLETE'))
+    tailer = StackEventTailer(client, STACK_NAME, timeout=0)
+    assert tailer.follow() == 'UPDATE_COMPLETE'
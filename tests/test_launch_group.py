@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+from click import ClickException
+from sceptre.stack_status import StackStatus
+
+from tizona.aws.cloudformation import LaunchGroup
+
+
+class Stack:
+    def __init__(self, name, *dependencies):
+        self.name = name
+        self.dependencies = list(dependencies)
+
+
+@pytest.fixture
+def stacks():
+    network = Stack('network')
+    database = Stack('database', network)
+    api = Stack('api', database)
+    # Outside the group, so assumed to be in place
+    dns = Stack('dns')
+    cdn = Stack('cdn', dns)
+    return [network, database, api, cdn]
+
+
+def make_command(stacks, monkeypatch, failing=()):
+    # Values the launch exports for sceptre, restored after the test
+    monkeypatch.setenv('AWS_DEFAULT_PROFILE', '')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', '')
+    events = []
+    lock = threading.Lock()
+
+    def launch_stack(stack):
+        with lock:
+            events.append(('start', stack.name))
+        status = StackStatus.FAILED if stack.name in failing \
+            else StackStatus.COMPLETE
+        with lock:
+            events.append(('end', stack.name))
+        return status, 0
+
+    # Only what launching needs, without a sceptre project
+    command = LaunchGroup.__new__(LaunchGroup)
+    command.plan = type('Plan', (), {'command_stacks': set(stacks)})()
+    command.aws_profile = 'default'
+    command.aws_region = 'eu-west-1'
+    command.max_concurrency = 2
+    command.launch_stack = launch_stack
+    return command, events
+
+
+def test_stacks_launch_after_their_dependencies(stacks, monkeypatch):
+    command, events = make_command(stacks, monkeypatch)
+    command.run()
+    for stack in stacks:
+        started = events.index(('start', stack.name))
+        for dependency in stack.dependencies:
+            if dependency in stacks:
+                assert events.index(('end', dependency.name)) < started
+    assert sorted(name for event, name in events if event == 'start') == [
+        'api', 'cdn', 'database', 'network'
+    ]
+
+
+def test_failed_dependency_skips_its_dependents(stacks, monkeypatch,
+                                                capsys):
+    command, events = make_command(stacks, monkeypatch, failing={'network'})
+    with pytest.raises(ClickException, match='3 of 4 stacks'):
+        command.run()
+    assert sorted(name for event, name in events if event == 'start') == [
+        'cdn', 'network'
+    ]
+    output = capsys.readouterr().out
+    assert 'api: skipped, a dependency failed' in output
+    assert 'database: skipped, a dependency failed' in output
+
+
+def test_circular_dependencies_are_reported(monkeypatch):
+    first, second = Stack('first'), Stack('second')
+    first.dependencies.append(second)
+    second.dependencies.append(first)
+    command, events = make_command([first, second], monkeypatch)
+    with pytest.raises(ClickException, match='Circular dependencies'):
+        command.run()
+    assert events == []
@@ -0,0 +1,109 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pytest
+from click import ClickException
+from moto import mock_aws
+
+from tizona.decorators import State
+from tizona.services.loadtest import LoadTest
+
+INTEGRATION = {
+    'Type': 'AWS_PROXY',
+    'IntegrationHttpMethod': 'POST',
+    'Uri': 'arn:aws:apigateway:eu-west-1:lambda:path/2015-03-31/functions/'
+           'arn:aws:lambda:eu-west-1:123456789012:function:get/invocations',
+}
+
+
+def resource(parent, path_part):
+    return {
+        'Type': 'AWS::ApiGateway::Resource',
+        'Properties': {
+            'RestApiId': {'Ref': 'Api'}, 'ParentId': parent,
+            'PathPart': path_part,
+        },
+    }
+
+
+def method(resource_id, http_method):
+    return {
+        'Type': 'AWS::ApiGateway::Method',
+        'Properties': {
+            'RestApiId': {'Ref': 'Api'}, 'ResourceId': {'Ref': resource_id},
+            'HttpMethod': http_method, 'AuthorizationType': 'NONE',
+            'Integration': INTEGRATION,
+        },
+    }
+
+
+TEMPLATE = json.dumps({'Resources': {
+    'Api': {
+        'Type': 'AWS::ApiGateway::RestApi', 'Properties': {'Name': 'api'},
+    },
+    'Items': resource({'Fn::GetAtt': ['Api', 'RootResourceId']}, 'items'),
+    'Item': resource({'Ref': 'Items'}, '{id}'),
+    'ItemsGet': method('Items', 'GET'),
+    'ItemGet': method('Item', 'GET'),
+    'ItemDelete': method('Item', 'DELETE'),
+}})
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        status = 500 if self.path == '/items' else 200
+        body = b'{}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.paths = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def account(project_dir):
+    with mock_aws():
+        boto3.client('cloudformation', region_name='eu-west-1').create_stack(
+            StackName='indago-payments-prod', TemplateBody=TEMPLATE
+        )
+        yield
+
+
+def test_load_test_against_local_server(account, server, capsys):
+    LoadTest(
+        project='indago', service='payments',
+        url=f'http://127.0.0.1:{server.server_port}', duration='1s',
+        concurrency=2, params=['id=a/b c'], state=State()
+    ).run()
+    assert set(server.paths) == {'/items', '/items/a%2Fb%20c'}
+    output = capsys.readouterr().out
+    assert 'GET /items/a%2Fb%20c' in output
+    assert 'x 500' in output
+
+
+@pytest.mark.parametrize('option, message', [
+    ({'params': ['id']}, '--param must be NAME=VALUE'),
+    ({'headers': ['Foo']}, '--header must be "Name: value"'),
+])
+def test_malformed_options_are_rejected(option, message):
+    with pytest.raises(ClickException, match=message):
+        LoadTest(project='indago', service='payments', state=State(),
+                 **option)
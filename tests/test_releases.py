@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from tizona.aws.cloudfront import changed_paths
+from tizona.ui.deploy import Deploy, Release
+
+
+def release(hexsha, entry, **assets):
+    return {'hexsha': hexsha, 'entry': entry, 'assets': assets}
+
+
+def test_switching_releases_invalidates_root():
+    releases = [release('a', 'entry-a', **{'app.js': '1'})]
+    before = Release.get_served_paths(releases, 'a', 'b')
+    after = Release.get_release_paths(
+        release('b', 'entry-b', **{'app.js': '2'})
+    )
+    assert changed_paths(before, after) == ['/']
+
+
+def test_redeploy_with_other_content_invalidates_rewritten_files():
+    releases = [release('a', 'entry-a', **{'app.js': '1', 'app.css': '1'})]
+    before = Release.get_served_paths(releases, 'a', 'a')
+    after = Release.get_release_paths(
+        release('a', 'entry-gz', **{'app.js': '2', 'app.css': '1'})
+    )
+    assert changed_paths(before, after) == ['/', '/a.html', '/a/app.js']
+
+
+def test_redeploy_of_unchanged_release_invalidates_nothing():
+    releases = [release('a', 'entry-a', **{'app.js': '1'})]
+    before = Release.get_served_paths(releases, 'a', 'a')
+    assert changed_paths(before, Release.get_release_paths(releases[0])) == []
+
+
+def test_unknown_served_release_invalidates_root():
+    before = Release.get_served_paths([], None, 'a')
+    after = Release.get_release_paths(release('a', 'entry-a'))
+    assert changed_paths(before, after) == ['/']
+
+
+def test_manifest_keeps_the_last_releases():
+    saved = []
+    # Only what recording needs, without discovering the stack
+    command = Deploy.__new__(Deploy)
+    command.tizona_config = {'max_releases': 3}
+    command.current_hexsha = 'c'
+    command.git = SimpleNamespace(summary='Third')
+    command.save_releases = saved.append
+    releases = [release(hexsha, f'entry-{hexsha}') for hexsha in 'wxyc']
+    command.record_release(releases, 'entry-c2', {'app.js': '1'})
+    assert [release['hexsha'] for release in saved[0]] == ['x', 'y', 'c']
+    assert saved[0][-1]['entry'] == 'entry-c2'
@@ -0,0 +1,88 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from tizona.aws.engine import AsyncEngine
+from tizona.aws.s3 import (
+    ASSETS_MANIFEST_KEY, S3Uploader, get_content_type
+)
+
+BUCKET = 'indago-website'
+
+
+@pytest.fixture
+def s3(project_dir):
+    with mock_aws():
+        client = boto3.client('s3', region_name='eu-west-1')
+        client.create_bucket(
+            Bucket=BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'}
+        )
+        yield client
+
+
+@pytest.fixture
+def dist(tmp_path):
+    dist = tmp_path / 'dist'
+    (dist / 'js').mkdir(parents=True)
+    (dist / 'js' / 'app.js').write_text('console.log("app")')
+    (dist / 'app.css').write_text('body {}')
+    return dist
+
+
+def sync(s3, directory, prefix, encoding=None):
+    uploader = S3Uploader(s3, BUCKET, AsyncEngine(), encoding=encoding)
+    copies = []
+    copy = uploader.copy
+
+    def record_copy(source_key, key):
+        copies.append((source_key, key))
+        return copy(source_key, key)
+    uploader.copy = record_copy
+    files, uploaded, _ = uploader.engine.run(
+        uploader.sync_async(directory, prefix)
+    )
+    return files, uploaded, copies
+
+
+def read(s3, key):
+    return s3.get_object(Bucket=BUCKET, Key=key)['Body'].read().decode()
+
+
+def test_second_sync_uploads_nothing(s3, dist):
+    files, uploaded, copies = sync(s3, dist, 'first')
+    assert sorted(files) == ['app.css', 'js/app.js']
+    assert uploaded == 2
+    manifest = json.loads(read(s3, ASSETS_MANIFEST_KEY))
+    assert sorted(manifest.values()) == ['first/app.css', 'first/js/app.js']
+
+    assert sync(s3, dist, 'first') == (files, 0, [])
+
+
+def test_moved_files_are_copied_server_side(s3, dist):
+    sync(s3, dist, 'first')
+    (dist / 'js' / 'app.js').rename(dist / 'js' / 'main.js')
+    (dist / 'new.js').write_text('console.log("new")')
+
+    files, uploaded, copies = sync(s3, dist, 'second')
+    assert uploaded == 1
+    assert sorted(copies) == [
+        ('first/app.css', 'second/app.css'),
+        ('first/js/app.js', 'second/js/main.js'),
+    ]
+    assert read(s3, 'second/js/main.js') == 'console.log("app")'
+    head = s3.head_object(Bucket=BUCKET, Key='second/js/main.js')
+    # The headers of the original upload are copied along
+    assert head['ContentType'] == get_content_type(dist / 'js' / 'main.js')
+
+
+def test_files_are_uploaded_again_with_other_headers(s3, dist):
+    (dist / 'js' / 'app.js').write_text('console.log("app");\n' * 100)
+    plain, _, _ = sync(s3, dist, 'first')
+    compressed, uploaded, _ = sync(s3, dist, 'first', encoding='gzip')
+    assert compressed['js/app.js'] != plain['js/app.js']
+    assert uploaded == 1
+    head = s3.head_object(Bucket=BUCKET, Key='first/js/app.js')
+    assert head['ContentEncoding'] == 'gzip'
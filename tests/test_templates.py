@@ -0,0 +1,84 @@
+from tizona.aws.templates import (
+    diff_templates, format_path, group_changes, load_template
+)
+
+OLD = load_template('''
+AWSTemplateFormatVersion: 2010-09-09
+Resources:
+  Charge:
+    Type: AWS::Lambda::Function
+    Properties:
+      Role: !GetAtt ChargeRole.Arn
+      Environment:
+        Variables:
+          TABLE: !Ref Table
+      Layers:
+        - layer-1
+  Refund:
+    Type: AWS::Lambda::Function
+''')
+
+NEW = load_template('''
+AWSTemplateFormatVersion: 2010-09-09
+Resources:
+  Charge:
+    Type: AWS::Lambda::Function
+    Properties:
+      Role: !GetAtt ChargeRole.Arn
+      Environment:
+        Variables:
+          TABLE: !Ref OtherTable
+          STAGE: prod
+      Layers:
+        - layer-1
+        - layer-2
+  Table:
+    Type: AWS::DynamoDB::Table
+''')
+
+
+def test_intrinsic_function_tags_become_their_long_form():
+    properties = OLD['Resources']['Charge']['Properties']
+    assert properties['Role'] == {'Fn::GetAtt': ['ChargeRole', 'Arn']}
+    assert properties['Environment']['Variables']['TABLE'] == {'Ref': 'Table'}
+    assert OLD['AWSTemplateFormatVersion'] == '2010-09-09'
+
+
+def test_diff_templates():
+    variables = ('Resources', 'Charge', 'Properties', 'Environment',
+                 'Variables')
+    assert sorted(diff_templates(OLD, NEW)) == sorted([
+        ('~', variables + ('TABLE', 'Ref'), 'Table', 'OtherTable'),
+        ('+', variables + ('STAGE',), None, 'prod'),
+        ('+', ('Resources', 'Charge', 'Properties', 'Layers', 1), None,
+         'layer-2'),
+        ('-', ('Resources', 'Refund'), OLD['Resources']['Refund'], None),
+        ('+', ('Resources', 'Table'), None, NEW['Resources']['Table']),
+    ])
+
+
+def test_unchanged_templates_have_no_changes():
+    assert diff_templates(OLD, load_template(OLD)) == []
+
+
+def test_group_changes():
+    groups = group_changes(diff_templates(OLD, NEW))
+    assert groups[('Resources', 'Refund')] == ('removed', [])
+    assert groups[('Resources', 'Table')] == ('added', [])
+    status, changes = groups[('Resources', 'Charge')]
+    assert status == 'modified'
+    assert sorted(format_path(path) for _, path, _, _ in changes) == [
+        'Properties.Environment.Variables.STAGE',
+        'Properties.Environment.Variables.TABLE.Ref',
+        'Properties.Layers[1]',
+    ]
+
+
+def test_replaced_top_level_value_is_modified():
+    groups = group_changes([('~', ('Outputs', 'Url'), 'a', 'b')])
+    assert groups == {('Outputs', 'Url'): ('modified', [('~', (), 'a', 'b')])}
+
+
+def test_format_path():
+    assert format_path(('Properties', 'Layers', 0, 'Arn')) == \
+        'Properties.Layers[0].Arn'
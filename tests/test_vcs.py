@@ -0,0 +1,61 @@
+import subprocess
+
+import pytest
+
+from tizona.vcs import GitMetadata
+
+
+def git(path, *args):
+    return subprocess.run(
+        ['git', *args], cwd=path, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, 'init', '-q', '-b', 'main')
+    git(tmp_path, 'config', 'user.email', 'dev@example.com')
+    git(tmp_path, 'config', 'user.name', 'Dev')
+    (tmp_path / 'src').mkdir()
+    for message in ('First', 'Second'):
+        (tmp_path / 'src' / 'app.py').write_text(message)
+        git(tmp_path, 'add', '.')
+        git(tmp_path, 'commit', '-q', '-m', message)
+    return tmp_path
+
+
+def test_head_from_loose_ref(repo):
+    assert (repo / '.git' / 'refs' / 'heads' / 'main').is_file()
+    metadata = GitMetadata(repo / 'src')
+    assert metadata.head_hexsha == git(repo, 'rev-parse', 'HEAD')
+    assert metadata.summary == 'Second'
+
+
+def test_head_from_packed_refs(repo):
+    git(repo, 'pack-refs', '--all')
+    assert not (repo / '.git' / 'refs' / 'heads' / 'main').exists()
+    assert GitMetadata(repo).head_hexsha == git(repo, 'rev-parse', 'HEAD')
+
+
+def test_detached_head(repo):
+    first = git(repo, 'rev-parse', 'HEAD~1')
+    git(repo, 'checkout', '-q', '--detach', first)
+    assert GitMetadata(repo).head_hexsha == first
+
+
+def test_head_of_worktree(repo, tmp_path_factory):
+    worktree = tmp_path_factory.mktemp('worktree') / 'feature'
+    git(repo, 'worktree', 'add', '-q', '-b', 'feature', worktree.as_posix(),
+        'HEAD~1')
+    git(repo, 'pack-refs', '--all')
+    assert GitMetadata(worktree).head_hexsha == \
+        git(repo, 'rev-parse', 'HEAD~1')
+    assert GitMetadata(repo).head_hexsha == git(repo, 'rev-parse', 'HEAD')
+
+
+def test_uncommitted_changes_are_scoped_to_paths(repo):
+    (repo / 'src' / 'app.py').write_text('Changed')
+    (repo / 'README').write_text('Untracked')
+    metadata = GitMetadata(repo)
+    assert metadata.uncommitted_changes([repo / 'src']) == ['src/app.py']
+    assert metadata.uncommitted_changes([repo / 'missing']) == []
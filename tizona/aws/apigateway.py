@@ -4,4 +4,4 @@ from tizona.core import AWSCommand
 class ApiGatewayMixin(AWSCommand):
     def __init__(self, *args, **kwargs):
         super(ApiGatewayMixin, self).__init__(*args, **kwargs)
-        self.apigateway = self.aws_session.client('apigateway')
\ No newline at end of file
+        self.apigateway = self.client('apigateway')
\ No newline at end of file
@@ -1,56 +1,47 @@
-import difflib
+import asyncio
+import hashlib
 import json
-import operator
 import os
-import uuid
-from functools import lru_cache, reduce
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 import click
 import click_spinner
+from botocore.exceptions import ClientError
 from click import ClickException
+from sceptre import __version__ as sceptre_version
 from sceptre.context import SceptreContext
+from sceptre.plan.actions import StackActions
 from sceptre.plan.plan import SceptrePlan
+from sceptre.stack_status import StackStatus
 from tabulate import tabulate
 
-from tizona.core import AWSCommand
+from tizona import cache, profiling
+from tizona.aws.events import SUCCESS_STATUSES, StackEventTailer
+from tizona.aws.graph import ResourceGraphMixin
+from tizona.aws.templates import (
+    diff_templates, format_path, group_changes, load_template, template_hash
+)
 
+TEMPLATE_CACHE_PATH = Path('.tizona') / 'cache' / 'templates'
+# Status reasons of the change sets that fail because the stack is already
+# up to date, as opposed to a change that can't be made
+NO_CHANGES_REASONS = (
+    "didn't contain changes", 'No updates are to be performed'
+)
 
-class CloudFormation(AWSCommand):
+
+class CloudFormation(ResourceGraphMixin):
     def __init__(self, project, *args, **kwargs):
         super(CloudFormation, self).__init__(*args, **kwargs)
-        self.cloudformation = self.aws_session.client('cloudformation')
-        self.aws_lambda = self.aws_session.client('lambda')
-        self.stacks = self.get_stacks()
+        self.aws_lambda = self.client('lambda')
 
     def list_stacks(self):
         paginator = self.cloudformation.get_paginator('list_stacks').paginate()
         return [page['StackSummaries'] for page in paginator]
 
-    def list_stack_resources(self, stack_name):
-        resources = []
-        for page in self.cloudformation.get_paginator(
-                'list_stack_resources'
-        ).paginate(StackName=stack_name):
-            for resource in page['StackResourceSummaries']:
-                resources.append(resource)
-        return resources
-
-    @lru_cache(maxsize=30)
-    def get_stacks(self):
-        stacks = reduce(
-            operator.concat,
-            [page['StackSummaries'] for page in
-             self.cloudformation.get_paginator('list_stacks').paginate()]
-        )
-        return [stack for stack in stacks if self.project in stack['StackName']]
-
-    @lru_cache(maxsize=30)
-    def get_stack(self, service):
-        for stack in self.stacks:
-            if service in stack['StackName']:
-                return stack
-
 
 class ListStacks(CloudFormation):
     def __init__(self, project, *args, **kwargs):
@@ -59,7 +50,7 @@ class ListStacks(CloudFormation):
 
     def run(self):
         for stack in self.stacks:
-            click.secho(stack['StackName'], fg='green')
+            click.secho(stack.name, fg='green')
 
 
 class ListStackResources(CloudFormation):
@@ -69,12 +60,12 @@ class ListStackResources(CloudFormation):
         super(ListStackResources, self).__init__(project, *args, **kwargs)
 
     def run(self):
-        resources = self.list_stack_resources(self.stack)
+        resources = self.engine.run(
+            self.list_stack_resources_async(self.stack)
+        )
         table = []
         for resource in resources:
-            table.append(
-                [resource['LogicalResourceId'], resource['ResourceType']]
-            )
+            table.append([resource.logical_id, resource.resource_type])
         click.secho(
             tabulate(table, headers=['Logical Resource Id', 'ResourceType']), fg='green'  # noqa: E501
         )
@@ -85,24 +76,30 @@ class Sceptre(CloudFormation):
         self.project = project
         self.stack = stack
         super(Sceptre, self).__init__(project, *args, **kwargs)
-        self.stack_name = self.get_stack(stack)['StackName']
+        self.stack_name = self.get_stack(stack).name
         context = SceptreContext(
             self.resolve_sceptre_project_path().as_posix(),
             self.resolve_stack_file().as_posix(),
             ignore_dependencies=True
         )
         self.plan = SceptrePlan(context)
+        self._template_cache_path = None
         # import pdb; pdb.set_trace()
 
     @staticmethod
     def resolve_sceptre_project_path():
+        def find_infrastructure():
+            for content in cwd.iterdir():
+                if 'infrastructure' in content.as_posix() and content.is_dir():
+                    return content
+            raise ClickException(
+                'We could not find an infrastructure folder. Make sure you '
+                'are at the top-level directory of the project you are trying '
+                'to deploy.'
+            )
         cwd = Path().cwd()
-        for content in cwd.iterdir():
-            if 'infrastructure' in content.as_posix() and content.is_dir():
-                return content
-        raise ClickException(
-            'We could not find an infrastructure folder. Make sure you are at '
-            'the top-level directory of the project you are trying to deploy.'
+        return cache.get_or_create(
+            ('sceptre_project', cwd.as_posix()), find_infrastructure
         )
 
     def resolve_stack_file(self):
@@ -113,6 +110,159 @@ class Sceptre(CloudFormation):
             stack_file_path = Path('prod') / stack_file_path
         return Path(stack_file_path)
 
+    @property
+    def sceptre_stack(self):
+        return next(iter(self.plan.command_stacks))
+
+    def get_template_sources(self):
+        """
+        Returns the files the rendered template depends on: the configs of
+        the stack and of the stack groups above it, and the template. Python
+        and Jinja templates may import or include the other templates of
+        the same kind, so all of those are included for them.
+        """
+        project_path = self.resolve_sceptre_project_path()
+        config_path = project_path / 'config'
+        stack_file = config_path / self.resolve_stack_file()
+        sources = [
+            directory / 'config.yaml'
+            for directory in reversed(stack_file.parents)
+            if directory == config_path or config_path in directory.parents
+        ]
+        sources.append(stack_file)
+        handler_config = self.sceptre_stack.template_handler_config
+        if handler_config.get('type', 'file') != 'file':
+            # Templates fetched from S3 or HTTP can change without us knowing
+            return None
+        template_path = project_path / 'templates' / handler_config['path']
+        if template_path.suffix in ('.py', '.j2'):
+            sources.extend(sorted(
+                template_path.parent.rglob(f'*{template_path.suffix}')
+            ))
+        else:
+            sources.append(template_path)
+        return [source for source in sources if source.is_file()]
+
+    def get_template_cache_path(self):
+        """
+        Returns where the rendered template is cached, or None when it
+        can't be. The key covers the template sources, the stack config and
+        the resolved parameters and user data, so any change to them renders
+        the template again.
+        """
+        sources = self.get_template_sources()
+        if sources is None:
+            return None
+        project_path = self.resolve_sceptre_project_path()
+        digest = hashlib.sha256(sceptre_version.encode())
+        for source in sources:
+            digest.update(source.as_posix().encode())
+            digest.update(source.read_bytes())
+        digest.update(json.dumps(
+            {
+                'parameters': self.sceptre_stack.parameters,
+                'sceptre_user_data': self.sceptre_stack.sceptre_user_data,
+            },
+            sort_keys=True, default=str
+        ).encode())
+        # sceptre's file handler loads .yaml files as they are
+        return project_path.parent / TEMPLATE_CACHE_PATH / f'{digest.hexdigest()}.yaml'  # noqa: E501
+
+    def get_template_body(self):
+        """
+        Returns the rendered template, from the local cache when the stack
+        hasn't changed since it was last rendered. On a hit the sceptre
+        stack's template config is pointed at the cached file, which sceptre
+        loads without rendering, so change sets don't render it either.
+        This has to happen before anything reads `sceptre_stack.template`,
+        which sceptre creates from the config once.
+        """
+        if self._template_cache_path is None:
+            # Computed once: the config changes below on a hit. False when
+            # the template can't be cached
+            cache_path = self.get_template_cache_path()
+            self._template_cache_path = cache_path or False
+        cache_path = self._template_cache_path
+        if cache_path and cache_path.is_file():
+            self.sceptre_stack.template_handler_config = {
+                'type': 'file', 'path': cache_path.as_posix(),
+            }
+        body = self.sceptre_stack.template.body
+        if cache_path and not cache_path.is_file():
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Written under a temporary name first, so that a concurrent run
+            # never reads a half-written template
+            temporary_path = cache_path.with_suffix(
+                f'.{os.getpid()}.{threading.get_ident()}'
+            )
+            temporary_path.write_text(body)
+            temporary_path.replace(cache_path)
+        return body
+
+    def render_template(self):
+        return load_template(self.get_template_body())
+
+    def resolve_parameters(self, template):
+        """
+        Returns the parameters of the local stack the way CloudFormation
+        reports them for a deployed one: as strings, with lists joined by
+        commas and the defaults of the template filled in.
+        """
+        parameters = {}
+        for name, value in self.sceptre_stack.parameters.items():
+            if value is not None:
+                parameters[name] = value
+        for name, spec in template.get('Parameters', {}).items():
+            if name not in parameters and 'Default' in spec:
+                parameters[name] = spec['Default']
+        return {
+            name: ','.join(map(str, value)) if isinstance(value, list) else str(value)  # noqa: E501
+            for name, value in parameters.items()
+        }
+
+    def get_local_template(self):
+        """
+        Renders the local template and returns it along with the hash of
+        the template, parameters and tags.
+        """
+        with profiling.phase('render'):
+            template = self.render_template()
+        tags = {
+            str(key): str(value)
+            for key, value in self.sceptre_stack.tags.items()
+        }
+        return template, template_hash(
+            template, self.resolve_parameters(template), tags
+        )
+
+    async def get_deployed_template_async(self):
+        stacks, template = await self.engine.gather([
+            self.engine.call(
+                self.cloudformation.describe_stacks, StackName=self.stack_name
+            ),
+            self.engine.call(
+                self.cloudformation.get_template, StackName=self.stack_name,
+                TemplateStage='Original'
+            ),
+        ])
+        stack = stacks['Stacks'][0]
+        template = load_template(template['TemplateBody'])
+        parameters = {
+            parameter['ParameterKey']: parameter['ParameterValue']
+            for parameter in stack.get('Parameters', [])
+        }
+        tags = {tag['Key']: tag['Value'] for tag in stack.get('Tags', [])}
+        return template, template_hash(template, parameters, tags)
+
+    async def compare_templates_async(self):
+        """
+        Renders the local template while the deployed one is fetched.
+        """
+        return await self.engine.gather([
+            self.engine.call(self.get_local_template),
+            self.get_deployed_template_async(),
+        ])
+
     def create_change_set(self, change_set_name):
         os.environ['AWS_DEFAULT_PROFILE'] = self.aws_profile
         os.environ['AWS_DEFAULT_REGION'] = self.aws_region
@@ -120,44 +270,105 @@ class Sceptre(CloudFormation):
             self.plan.create_change_set(change_set_name)
             self.plan.wait_for_cs_completion(change_set_name)
 
+    def describe_change_set(self, change_set_name):
+        try:
+            return self.cloudformation.describe_change_set(
+                StackName=self.sceptre_stack.external_name,
+                ChangeSetName=change_set_name
+            )
+        except ClientError as error:
+            # moto reports missing change sets as validation errors
+            if error.response['Error']['Code'] in ('ChangeSetNotFound', 'ValidationError'):  # noqa: E501
+                return None
+            raise
+
+    def prepare_change_set(self, local_hash):
+        """
+        Returns the name of a change set that updates the stack to the local
+        template, parameters and tags, or None when it wouldn't change
+        anything. Change sets are named after the hash of what they were
+        created from, so one prepared by `aws diff` is reused by `aws
+        launch` as long as CloudFormation still considers it executable.
+        """
+        change_set_name = f'tizona-{local_hash[:32]}'
+        change_set = self.describe_change_set(change_set_name)
+        if change_set is not None and change_set['ExecutionStatus'] == 'AVAILABLE':  # noqa: E501
+            click.secho(f'Reusing change set {change_set_name}', fg='green')
+            return change_set_name
+        if change_set is not None:
+            # Failed, or obsolete because the stack changed since
+            self.cloudformation.delete_change_set(
+                StackName=self.sceptre_stack.external_name,
+                ChangeSetName=change_set_name
+            )
+        self.create_change_set(change_set_name)
+        change_set = self.describe_change_set(change_set_name)
+        if change_set is None:
+            raise ClickException(
+                f'The change set for {self.stack_name} could not be created'
+            )
+        if change_set['Status'] == 'FAILED':
+            self.cloudformation.delete_change_set(
+                StackName=self.sceptre_stack.external_name,
+                ChangeSetName=change_set_name
+            )
+            reason = change_set.get('StatusReason') or ''
+            if any(text in reason for text in NO_CHANGES_REASONS):
+                return None
+            raise ClickException(
+                f'The change set for {self.stack_name} failed: '
+                f'{change_set.get("StatusReason")}'
+            )
+        return change_set_name
+
 
 class Diff(Sceptre):
+    status_colors = {'added': 'green', 'removed': 'red', 'modified': 'yellow'}
+    change_colors = {'+': 'green', '-': 'red', '~': 'yellow'}
+
     def __init__(self, project, stack, *args, **kwargs):
         self.project = project
         self.stack = stack
         super(Diff, self).__init__(project, stack, *args, **kwargs)
 
     def run(self):
-        change_set_name = f'a-{uuid.uuid1().hex}'
-        self.create_change_set(change_set_name)
-        deployed_template = self.cloudformation.get_template(
-            StackName=self.stack_name
-        )
-        new_template = self.cloudformation.get_template(
-            StackName=self.stack_name, ChangeSetName=change_set_name
-        )
-        # import pdb; pdb.set_trace()
-        # Transform the dictionaries into json objects, ordering the keys to
-        # make them comparable, indent them for better visualisation and
-        # split into lines so that we can do the diff
-        deployed_template = json.dumps(
-            deployed_template['TemplateBody'], sort_keys=True, indent=2
-        ).splitlines()
-        new_template = json.dumps(
-            new_template['TemplateBody'], sort_keys=True, indent=2
-        ).splitlines()
-        for line in difflib.unified_diff(
-                deployed_template, new_template, fromfile='deployed template',
-                tofile='local template', lineterm=''
-        ):
-            if line.startswith('-'):
-                # lines that are going to be removed appear in red
-                click.secho(line, fg='red')
-            elif line.startswith('+'):
-                # lines that are going to be added appear in green
-                click.secho(line, fg='green')
-            else:
-                click.secho(line)
+        (local_template, local_hash), (deployed_template, deployed_hash) = \
+            self.engine.run(self.compare_templates_async())
+        # Same template, parameters and tags as the deployed stack, so there
+        # is no need to ask CloudFormation for a change set
+        if local_hash == deployed_hash:
+            click.secho('No changes', fg='green')
+            return
+        # The change set validates the update against CloudFormation and is
+        # kept for `aws launch`. Its original template is the local one, so
+        # that's what gets compared
+        if self.prepare_change_set(local_hash) is None:
+            click.secho('No changes', fg='green')
+            return
+        changes = diff_templates(deployed_template, local_template)
+        if not changes:
+            click.secho('No changes to the template', fg='green')
+        for element, (status, element_changes) in group_changes(changes).items():  # noqa: E501
+            click.secho(
+                f'{format_path(element)} ({status})', bold=True,
+                fg=self.status_colors[status]
+            )
+            for change, path, old, new in element_changes:
+                click.secho(
+                    f'  {change} {self.format_change(change, path, old, new)}',
+                    fg=self.change_colors[change]
+                )
+
+    @staticmethod
+    def format_change(change, path, old, new):
+        def format_value(value):
+            return json.dumps(value, sort_keys=True, default=str)
+        prefix = f'{format_path(path)}: ' if path else ''
+        if change == '+':
+            return f'{prefix}{format_value(new)}'
+        if change == '-':
+            return f'{prefix}{format_value(old)}'
+        return f'{prefix}{format_value(old)} -> {format_value(new)}'
 
 
 class Launch(Sceptre):
@@ -165,14 +376,271 @@ class Launch(Sceptre):
         self.project = project
         self.stack = stack
         super(Launch, self).__init__(project, stack, *args, **kwargs)
-        self.stack_name = self.get_stack(stack)['StackName']
+        self.stack_name = self.get_stack(stack).name
 
     def run(self):
-        # The change set name pattern has to be [a-zA-Z][-a-zA-Z0-9]*
-        change_set_name = f'a-{uuid.uuid1().hex}'
-        self.create_change_set(change_set_name)
-        with click_spinner.spinner():
-            # self.plan.execute_change_set(change_set_name)
-            # self.plan.wait_for_cs_completion()
-            self.plan.launch()
+        (_, local_hash), (_, deployed_hash) = self.engine.run(
+            self.compare_templates_async()
+        )
+        if local_hash == deployed_hash:
+            click.secho('No changes, the stack is up to date', fg='green')
+            return
+        with profiling.phase('change-set'):
+            change_set_name = self.prepare_change_set(local_hash)
+        if change_set_name is None:
+            click.secho('No changes, the stack is up to date', fg='green')
+            return
+        tailer = StackEventTailer(
+            self.cloudformation, self.sceptre_stack.external_name
+        )
+        tailer.start()
+        self.cloudformation.execute_change_set(
+            StackName=self.sceptre_stack.external_name,
+            ChangeSetName=change_set_name
+        )
+        try:
+            with profiling.phase('update'):
+                status = tailer.follow()
+        finally:
+            # the stack resources may have changed, so a daemon mustn't
+            # reuse what it discovered before the update
+            cache.invalidate('graph')
+        tailer.echo_timings()
+        if status.endswith('IN_PROGRESS'):
+            raise ClickException(
+                f'Timed out following the update, the stack is {status}'
+            )
+        if status not in SUCCESS_STATUSES:
+            raise ClickException(f'Stack update failed: {status}')
         click.secho('Stack updated', fg='green')
+
+
+class LaunchGroup(CloudFormation):
+    """
+    Launches every stack of a sceptre stack group, following the
+    dependencies declared in the stack configs. Stacks whose dependencies
+    have been launched run concurrently, up to `max_concurrency` at a time.
+    When a stack fails, the stacks that depend on it are skipped.
+    Dependencies on stacks outside the group are assumed to be in place.
+    """
+
+    def __init__(self, project, group, max_concurrency, *args, **kwargs):
+        self.project = project
+        self.group = group
+        super(LaunchGroup, self).__init__(project, *args, **kwargs)
+        self.max_concurrency = max_concurrency or self.engine.max_concurrency
+        context = SceptreContext(
+            Sceptre.resolve_sceptre_project_path().as_posix(), group
+        )
+        self.plan = SceptrePlan(context)
+
+    def get_dependencies(self):
+        stacks = self.plan.command_stacks
+        return {
+            stack: {
+                dependency for dependency in stack.dependencies
+                if dependency in stacks
+            }
+            for stack in stacks
+        }
+
+    @staticmethod
+    def launch_stack(stack):
+        started = time.monotonic()
+        status = StackActions(stack).launch()
+        return status, time.monotonic() - started
+
+    def run(self):
+        os.environ['AWS_DEFAULT_PROFILE'] = self.aws_profile
+        os.environ['AWS_DEFAULT_REGION'] = self.aws_region
+        dependencies = self.get_dependencies()
+        pending = sorted(dependencies, key=lambda stack: stack.name)
+        results = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while pending or running:
+                # Skipping a stack may skip the stacks that depend on it,
+                # so this goes over the pending stacks until nothing changes
+                changed = True
+                while changed:
+                    changed = False
+                    for stack in list(pending):
+                        statuses = {
+                            results.get(dependency)
+                            for dependency in dependencies[stack]
+                        }
+                        if statuses & {StackStatus.FAILED, 'skipped'}:
+                            pending.remove(stack)
+                            results[stack] = 'skipped'
+                            changed = True
+                            click.secho(
+                                f'{stack.name}: skipped, a dependency failed',
+                                fg='yellow'
+                            )
+                        elif statuses <= {StackStatus.COMPLETE}:
+                            pending.remove(stack)
+                            click.secho(f'{stack.name}: launching', fg='green')  # noqa: E501
+                            running[executor.submit(self.launch_stack, stack)] = stack  # noqa: E501
+                if not pending and not running:
+                    break
+                if not running:
+                    raise ClickException(
+                        'Circular dependencies between '
+                        f'{", ".join(stack.name for stack in pending)}'
+                    )
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stack = running.pop(future)
+                    try:
+                        status, elapsed = future.result()
+                    except Exception as error:
+                        status, elapsed = StackStatus.FAILED, None
+                        click.secho(f'{stack.name}: {error}', fg='red')
+                    if status != StackStatus.COMPLETE:
+                        status = StackStatus.FAILED
+                    results[stack] = status
+                    click.secho(
+                        f'{stack.name}: {status}' +
+                        (f' in {elapsed:.0f}s' if elapsed is not None else ''),
+                        fg='green' if status == StackStatus.COMPLETE else 'red'
+                    )
+        cache.invalidate('graph')
+        failed = [
+            stack.name for stack, status in results.items()
+            if status != StackStatus.COMPLETE
+        ]
+        if failed:
+            raise ClickException(
+                f'{len(failed)} of {len(results)} stacks were not launched: '
+                f'{", ".join(sorted(failed))}'
+            )
+        click.secho(f'{len(results)} stacks launched', fg='green')
+
+
+class Drift(CloudFormation):
+    """
+    Detects drift on every stack of the project at once. The detections
+    are started concurrently and their statuses polled together, so the
+    whole run takes about as long as the slowest stack.
+    """
+    poll_interval = 5
+
+    def __init__(self, project, *args, **kwargs):
+        self.project = project
+        super(Drift, self).__init__(project, *args, **kwargs)
+
+    async def start_detection_async(self, stack_name):
+        try:
+            response = await self.engine.call(
+                self.cloudformation.detect_stack_drift, StackName=stack_name
+            )
+        except ClientError as error:
+            # e.g. stacks with an operation in progress
+            return {
+                'StackId': stack_name,
+                'DetectionStatus': 'DETECTION_FAILED',
+                'DetectionStatusReason': error.response['Error']['Message'],
+            }
+        return {
+            'StackDriftDetectionId': response['StackDriftDetectionId'],
+            'DetectionStatus': 'DETECTION_IN_PROGRESS',
+        }
+
+    async def wait_for_detections_async(self, detections):
+        pending = [
+            stack_name for stack_name, detection in detections.items()
+            if detection['DetectionStatus'] == 'DETECTION_IN_PROGRESS'
+        ]
+        while pending:
+            statuses = await self.engine.gather([
+                self.engine.call(
+                    self.cloudformation.describe_stack_drift_detection_status,
+                    StackDriftDetectionId=detections[stack_name][
+                        'StackDriftDetectionId'
+                    ]
+                )
+                for stack_name in pending
+            ])
+            for stack_name, status in zip(pending, statuses):
+                detections[stack_name] = status
+            pending = [
+                stack_name for stack_name in pending
+                if detections[stack_name]['DetectionStatus'] == 'DETECTION_IN_PROGRESS'  # noqa: E501
+            ]
+            if pending:
+                await asyncio.sleep(self.poll_interval)
+        return detections
+
+    async def describe_drifts_async(self, stack_name):
+        # botocore has no paginator for describe_stack_resource_drifts
+        drifts, token = [], {}
+        while True:
+            response = await self.engine.call(
+                self.cloudformation.describe_stack_resource_drifts,
+                StackName=stack_name,
+                StackResourceDriftStatusFilters=['MODIFIED', 'DELETED'],
+                **token
+            )
+            drifts.extend(response['StackResourceDrifts'])
+            if 'NextToken' not in response:
+                return drifts
+            token = {'NextToken': response['NextToken']}
+
+    async def detect_drift_async(self, stack_names):
+        """
+        Returns the final detection status of each stack, and the resources
+        that drifted in the stacks that did.
+        """
+        started = await self.engine.gather([
+            self.start_detection_async(stack_name)
+            for stack_name in stack_names
+        ])
+        detections = await self.wait_for_detections_async(
+            dict(zip(stack_names, started))
+        )
+        drifted = [
+            stack_name for stack_name, detection in detections.items()
+            if detection.get('StackDriftStatus') == 'DRIFTED'
+        ]
+        resources = await self.engine.gather([
+            self.describe_drifts_async(stack_name) for stack_name in drifted
+        ])
+        return detections, dict(zip(drifted, resources))
+
+    def run(self):
+        stack_names = self.get_live_stack_names()
+        if not stack_names:
+            raise ClickException(f'No stacks found for {self.project}')
+        detections, drifts = self.engine.run(
+            self.detect_drift_async(stack_names)
+        )
+        table = []
+        for stack_name, resources in drifts.items():
+            for resource in resources:
+                table.append([
+                    stack_name,
+                    resource['LogicalResourceId'],
+                    resource['ResourceType'],
+                    resource['StackResourceDriftStatus'],
+                    ', '.join(
+                        difference['PropertyPath']
+                        for difference in resource.get('PropertyDifferences', [])  # noqa: E501
+                    ),
+                ])
+        if table:
+            click.secho(tabulate(
+                table,
+                headers=['Stack', 'Logical Resource Id', 'ResourceType',
+                         'Drift', 'Properties']
+            ), fg='yellow')
+        failed = {
+            stack_name: detection.get('DetectionStatusReason')
+            for stack_name, detection in detections.items()
+            if detection['DetectionStatus'] == 'DETECTION_FAILED'
+        }
+        for stack_name, reason in failed.items():
+            click.secho(f'Drift detection failed for {stack_name}: {reason}', fg='red')  # noqa: E501
+        click.secho(
+            f'{len(drifts)} of {len(stack_names)} stacks drifted',
+            fg='yellow' if drifts else 'green'
+        )
@@ -0,0 +1,54 @@
+import hashlib
+import json
+
+# Each path of an invalidation is billed, and a wildcard counts as one, so
+# past this many paths their directories are invalidated instead
+MAX_INVALIDATION_PATHS = 50
+
+
+def changed_paths(previous, current):
+    """
+    Returns the paths whose content differs between two releases, given
+    the hash of the content each release serves at each path, with None
+    for content that isn't known. Paths only one of them serves can't be
+    stale: a new path was never cached, and an old one keeps its content.
+    """
+    return sorted(
+        path for path in previous.keys() & current.keys()
+        if previous[path] is None or previous[path] != current[path]
+    )
+
+
+def batch_paths(paths, max_paths=MAX_INVALIDATION_PATHS):
+    if len(paths) <= max_paths:
+        return paths
+    directories = sorted({f'{path.rsplit("/", 1)[0]}/*' for path in paths})
+    if len(directories) > max_paths:
+        return ['/*']
+    return directories
+
+
+def create_invalidation(cloudfront, distribution_id, paths, reference,
+                        wait=False):
+    """
+    Invalidates `paths` in a single batch and returns the invalidation id.
+    The caller reference is derived from `reference` and the paths, so
+    sending the same invalidation again, e.g. when a request is retried,
+    doesn't create a second one.
+    """
+    caller_reference = hashlib.sha256(
+        json.dumps([reference, sorted(paths)]).encode()
+    ).hexdigest()
+    response = cloudfront.create_invalidation(
+        DistributionId=distribution_id,
+        InvalidationBatch={
+            'Paths': {'Quantity': len(paths), 'Items': paths},
+            'CallerReference': caller_reference,
+        }
+    )
+    invalidation_id = response['Invalidation']['Id']
+    if wait:
+        cloudfront.get_waiter('invalidation_completed').wait(
+            DistributionId=distribution_id, Id=invalidation_id
+        )
+    return invalidation_id
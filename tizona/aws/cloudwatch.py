@@ -0,0 +1,324 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import click
+from botocore.exceptions import ClientError
+from click import ClickException
+from tabulate import tabulate
+
+from tizona import cache
+from tizona.aws.graph import LAMBDA_FUNCTION, ResourceGraphMixin
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+FUNCTION_COLORS = ('cyan', 'magenta', 'blue', 'yellow', 'green')
+# The most queries a single GetMetricData request accepts
+MAX_METRIC_DATA_QUERIES = 500
+# How long, in seconds, fetched metrics are reused by later commands, by
+# default: `metrics_ttl` of `.tizona.yaml` overrides it
+DEFAULT_METRICS_TTL = 60
+# Holds the metrics fetched in the last `metrics_ttl` seconds, so that they
+# are shared by commands run in separate processes
+METRICS_CACHE_PATH = Path('.tizona') / 'cache' / 'metrics'
+# Column, metric name and statistic of each value shown per function
+LAMBDA_METRICS = (
+    ('Invocations', 'Invocations', 'Sum'),
+    ('Errors', 'Errors', 'Sum'),
+    ('Throttles', 'Throttles', 'Sum'),
+    ('p50 (ms)', 'Duration', 'p50'),
+    ('p99 (ms)', 'Duration', 'p99'),
+    ('Concurrency', 'ConcurrentExecutions', 'Maximum'),
+)
+
+
+def parse_duration(text):
+    """
+    Returns the seconds in a duration such as `30s`, `10m`, `2h` or `1d`.
+    """
+    match = re.fullmatch(r'(\d+)([smhd])', text.strip())
+    if match is None:
+        raise ClickException(
+            f'Invalid duration {text}, use a number followed by s, m, h or d'
+        )
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class CloudWatch(ResourceGraphMixin):
+    def __init__(self, project, *args, **kwargs):
+        super(CloudWatch, self).__init__(*args, **kwargs)
+
+    def get_service_functions(self, service):
+        """
+        Returns the lambda functions of the service's stack, as found by the
+        stack discovery.
+        """
+        stack = self.get_stack(service)
+        if stack is None:
+            raise ClickException(
+                f'No stack found for {service} in {self.project}'
+            )
+        self.load_stack_resources([stack.name])
+        functions = [
+            function_ for function_ in
+            self.graph.find_resources(stack.name, LAMBDA_FUNCTION)
+            if function_.physical_id
+        ]
+        if not functions:
+            raise ClickException(f'{stack.name} has no lambda functions')
+        return functions
+
+
+class Logs(CloudWatch):
+    """
+    Searches the log groups of every function of a service at once and
+    prints their events as a single stream, oldest first.
+
+    Each group keeps a cursor with the ids and timestamps of the events
+    seen in the last `lookback` seconds before its newest one. Following
+    the logs asks again for that window, since CloudWatch may receive an
+    event after newer ones from another instance of the function, and
+    skips the events already printed. While following, polling starts every
+    `min_interval` seconds and backs off up to `max_interval` while the
+    functions are quiet.
+    """
+    min_interval = 1
+    max_interval = 10
+    lookback = 30
+
+    def __init__(self, project, service, filter_pattern=None, since='10m',
+                 follow=False, *args, **kwargs):
+        self.project = project
+        self.service = service
+        self.filter_pattern = filter_pattern
+        self.follow = follow
+        super(Logs, self).__init__(project, *args, **kwargs)
+        self.logs = self.client('logs')
+        self.functions = self.get_service_functions(service)
+        start_time = int((time.time() - parse_duration(since)) * 1000)
+        self.cursors = {
+            function_.logical_id: (start_time, {})
+            for function_ in self.functions
+        }
+        self.colors = dict(zip(
+            self.cursors, itertools.cycle(FUNCTION_COLORS)
+        ))
+
+    async def fetch_group_async(self, function_):
+        """
+        Returns the events of the function's log group that haven't been
+        returned yet, oldest first, and moves its cursor.
+        """
+        start_time, seen = self.cursors[function_.logical_id]
+        kwargs = {
+            'logGroupName': f'/aws/lambda/{function_.physical_id}',
+            'startTime': start_time,
+        }
+        if self.filter_pattern:
+            kwargs['filterPattern'] = self.filter_pattern
+        events = []
+        while True:
+            try:
+                page = await self.engine.call(
+                    self.logs.filter_log_events, **kwargs
+                )
+            except ClientError as error:
+                # The group is created on the first invocation
+                if error.response['Error']['Code'] == 'ResourceNotFoundException':  # noqa: E501
+                    return []
+                raise
+            events.extend(
+                event for event in page['events']
+                if event['eventId'] not in seen
+            )
+            # A search may return empty pages before it reaches the streams
+            # with matching events, so only a missing token ends it
+            if 'nextToken' not in page:
+                break
+            kwargs['nextToken'] = page['nextToken']
+        if events:
+            events.sort(key=lambda event: event['timestamp'])
+            seen.update(
+                (event['eventId'], event['timestamp']) for event in events
+            )
+            start_time = max(
+                start_time, max(seen.values()) - self.lookback * 1000
+            )
+            seen = {
+                event_id: timestamp for event_id, timestamp in seen.items()
+                if timestamp >= start_time
+            }
+            self.cursors[function_.logical_id] = (start_time, seen)
+        return [(function_.logical_id, event) for event in events]
+
+    async def fetch_async(self):
+        groups = await self.engine.gather([
+            self.fetch_group_async(function_) for function_ in self.functions
+        ])
+        return list(heapq.merge(
+            *groups, key=lambda item: item[1]['timestamp']
+        ))
+
+    def echo(self, function_name, event):
+        timestamp = datetime.fromtimestamp(event['timestamp'] / 1000)
+        click.echo(
+            click.style(f'{timestamp:%Y-%m-%d %H:%M:%S} ', fg='white') +
+            click.style(f'{function_name} ', fg=self.colors[function_name]) +
+            event['message'].rstrip('\n')
+        )
+
+    def run(self):
+        interval = self.min_interval
+        try:
+            while True:
+                events = self.engine.run(self.fetch_async())
+                for function_name, event in events:
+                    self.echo(function_name, event)
+                if not self.follow:
+                    return
+                if events:
+                    interval = self.min_interval
+                else:
+                    interval = min(interval * 2, self.max_interval)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+class Metrics(CloudWatch):
+    """
+    Shows the main metrics of every function of a service over a period in
+    a single table. Every value is one query of a `GetMetricData` request,
+    with a period that spans the whole range so that CloudWatch returns a
+    single aggregated datapoint for it, and the queries are sent in as few
+    requests as the API allows, concurrently.
+
+    The values are reused for `metrics_ttl` seconds, a minute by default,
+    from memory in the daemon and from `.tizona/cache/metrics` otherwise.
+    """
+
+    def __init__(self, project, service, since='1h', *args, **kwargs):
+        self.project = project
+        self.service = service
+        self.since = parse_duration(since)
+        super(Metrics, self).__init__(project, *args, **kwargs)
+        self.cloudwatch = self.client('cloudwatch')
+        self.functions = self.get_service_functions(service)
+
+    def build_queries(self):
+        """
+        Returns the queries for every function and metric, with ids that map
+        back to their position in `self.functions` and `LAMBDA_METRICS`.
+        """
+        # Periods must be a multiple of 60 seconds
+        period = max(60, -(-self.since // 60) * 60)
+        return [
+            {
+                'Id': f'f{function_index}_m{metric_index}',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/Lambda',
+                        'MetricName': metric_name,
+                        'Dimensions': [{
+                            'Name': 'FunctionName',
+                            'Value': function_.physical_id,
+                        }],
+                    },
+                    'Period': period,
+                    'Stat': stat,
+                },
+                'ReturnData': True,
+            }
+            for function_index, function_ in enumerate(self.functions)
+            for metric_index, (_, metric_name, stat) in enumerate(LAMBDA_METRICS)  # noqa: E501
+        ]
+
+    async def fetch_async(self):
+        """
+        Returns the values of each query by id.
+        """
+        queries = self.build_queries()
+        # Aligned to the minute, so that runs close together ask for the
+        # same range
+        end_time = datetime.now(timezone.utc).replace(second=0, microsecond=0)  # noqa: E501
+        start_time = end_time - timedelta(seconds=self.since)
+        batches = await self.engine.gather([
+            self.engine.paginate(
+                self.cloudwatch, 'get_metric_data', 'MetricDataResults',
+                MetricDataQueries=queries[start:start + MAX_METRIC_DATA_QUERIES],  # noqa: E501
+                StartTime=start_time, EndTime=end_time
+            )
+            for start in range(0, len(queries), MAX_METRIC_DATA_QUERIES)
+        ])
+        values = defaultdict(list)
+        for results in batches:
+            for result in results:
+                values[result['Id']].extend(result['Values'])
+        return dict(values)
+
+    def get_values(self):
+        key = (
+            'metrics', *self.aws_scope,
+            tuple(function_.physical_id for function_ in self.functions),
+            self.since,
+        )
+        ttl = self.tizona_config.get('metrics_ttl', DEFAULT_METRICS_TTL)
+        return cache.get_or_create(
+            key, lambda: self.load_values(key, ttl), ttl=ttl
+        )
+
+    def load_values(self, key, ttl):
+        """
+        Returns the values a command saved less than `ttl` seconds ago under
+        `key`, or fetches and saves them.
+        """
+        digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        path = METRICS_CACHE_PATH / f'{digest}.json'
+        now = time.time()
+        try:
+            if path.stat().st_mtime > now - ttl:
+                return json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            pass
+        values = self.engine.run(self.fetch_async())
+        METRICS_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        # Expired values of other services or periods aren't read again
+        for expired in METRICS_CACHE_PATH.glob('*.json'):
+            if expired.stat().st_mtime <= now - ttl:
+                expired.unlink()
+        # Written aside and moved into place, so that a command running at
+        # the same time never reads a partial file
+        staging_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        staging_path.write_text(json.dumps(values))
+        os.replace(staging_path, path)
+        return values
+
+    def run(self):
+        values = self.get_values()
+        table = []
+        for function_index, function_ in enumerate(self.functions):
+            row = [function_.logical_id]
+            for metric_index, (_, _, stat) in enumerate(LAMBDA_METRICS):
+                datapoints = values.get(f'f{function_index}_m{metric_index}')  # noqa: E501
+                if not datapoints:
+                    row.append(None)
+                elif stat == 'Sum':
+                    row.append(int(sum(datapoints)))
+                elif stat == 'Maximum':
+                    row.append(int(max(datapoints)))
+                else:
+                    row.append(max(datapoints))
+            invocations, errors = row[1], row[2]
+            row.insert(3, errors / invocations * 100 if invocations and errors is not None else None)  # noqa: E501
+            table.append(row)
+        headers = ['Function'] + [column for column, _, _ in LAMBDA_METRICS]
+        headers.insert(3, 'Errors (%)')
+        click.echo(tabulate(
+            table, headers=headers, floatfmt='.1f', missingval='-'
+        ))
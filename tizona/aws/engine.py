@@ -0,0 +1,62 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+# Each call to `AsyncEngine.run` has its own loop, and several threads may
+# be running one at the same time, so the semaphore is looked up from the
+# context of the running tasks rather than stored on the engine
+_semaphore = contextvars.ContextVar('semaphore')
+
+
+class AsyncEngine:
+    """
+    Runs blocking boto3 calls as asyncio tasks on a thread pool. boto3
+    clients are thread safe, so the calls for independent resources can be
+    in flight at the same time. A semaphore caps the number of requests in
+    flight for a run, and the size of the shared thread pool caps them
+    across runs happening in different threads.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def run(self, coroutine):
+        """
+        Runs `coroutine` to completion from synchronous code and returns its
+        result. The semaphore is created inside the running loop because
+        asyncio primitives are bound to the loop they are created in.
+        """
+        async def main():
+            _semaphore.set(asyncio.Semaphore(self.max_concurrency))
+            return await coroutine
+        return asyncio.run(main())
+
+    async def call(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        async with _semaphore.get():
+            return await loop.run_in_executor(
+                self.executor, partial(function, *args, **kwargs)
+            )
+
+    async def paginate(self, client, operation, result_key, **kwargs):
+        """
+        Fetches every page of `operation` and returns the concatenated items
+        under `result_key`. Pages depend on the previous page's token, so
+        they are fetched one after the other, but each fetch only holds a
+        slot of the concurrency cap while the request is in flight.
+        """
+        pages = iter(client.get_paginator(operation).paginate(**kwargs))
+        items = []
+        while True:
+            page = await self.call(next, pages, None)
+            if page is None:
+                return items
+            items.extend(page[result_key])
+
+    @staticmethod
+    async def gather(coroutines):
+        return await asyncio.gather(*coroutines)
@@ -0,0 +1,182 @@
+import time
+from collections import defaultdict
+
+import click
+from tabulate import tabulate
+
+STACK_RESOURCE_TYPE = 'AWS::CloudFormation::Stack'
+SUCCESS_STATUSES = {
+    'CREATE_COMPLETE', 'UPDATE_COMPLETE', 'DELETE_COMPLETE', 'IMPORT_COMPLETE'
+}
+TERMINAL_STATUSES = SUCCESS_STATUSES | {
+    'ROLLBACK_COMPLETE', 'ROLLBACK_FAILED', 'UPDATE_ROLLBACK_COMPLETE',
+    'UPDATE_ROLLBACK_FAILED', 'DELETE_FAILED', 'IMPORT_ROLLBACK_COMPLETE',
+    'IMPORT_ROLLBACK_FAILED',
+}
+# How long to follow an operation on a stack without a `TimeoutInMinutes`
+DEFAULT_TIMEOUT_MINUTES = 60
+
+
+class StackEventTailer:
+    """
+    Streams the events of a stack while an operation is in progress and
+    times how long each resource takes.
+
+    `describe_stack_events` returns the newest events first, so each poll
+    only reads pages until it reaches the newest event it has already seen.
+    Polling starts every `min_interval` seconds and backs off up to
+    `max_interval` while no new events come in. A poll can miss the final
+    event of the stack, e.g. when it was throttled, so following gives up
+    after `timeout` seconds, the stack's `TimeoutInMinutes` or an hour by
+    default, and falls back to the status the stack reports.
+    """
+
+    def __init__(self, cloudformation, stack_name, min_interval=1,
+                 max_interval=15, timeout=None):
+        self.cloudformation = cloudformation
+        self.stack_name = stack_name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.last_event_id = None
+        self.started = {}
+        self.finished = {}
+        self.resource_types = {}
+
+    def start(self):
+        """
+        Marks the events that exist before the operation as seen. Call it
+        before starting the operation.
+        """
+        page = self.cloudformation.describe_stack_events(
+            StackName=self.stack_name
+        )
+        if page['StackEvents']:
+            self.last_event_id = page['StackEvents'][0]['EventId']
+
+    def poll(self):
+        """
+        Returns the events that happened since the last poll, oldest first.
+        """
+        events = []
+        paginator = self.cloudformation.get_paginator('describe_stack_events')
+        for page in paginator.paginate(StackName=self.stack_name):
+            for event in page['StackEvents']:
+                if event['EventId'] == self.last_event_id:
+                    break
+                events.append(event)
+            else:
+                continue
+            break
+        if events:
+            self.last_event_id = events[0]['EventId']
+        return list(reversed(events))
+
+    def describe_stack(self):
+        return self.cloudformation.describe_stacks(
+            StackName=self.stack_name
+        )['Stacks'][0]
+
+    def follow(self):
+        """
+        Prints the events as they happen until the stack reaches a final
+        status, and returns that status, or the current status of the stack
+        once the timeout expires.
+        """
+        timeout = self.timeout
+        if timeout is None:
+            timeout = self.describe_stack().get(
+                'TimeoutInMinutes', DEFAULT_TIMEOUT_MINUTES
+            ) * 60
+        deadline = time.monotonic() + timeout
+        interval = self.min_interval
+        while True:
+            events = self.poll()
+            for event in events:
+                self.record(event)
+                self.echo(event)
+                if self.is_stack_event(event) and \
+                        event['ResourceStatus'] in TERMINAL_STATUSES:
+                    return event['ResourceStatus']
+            if events:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 1.5, self.max_interval)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self.describe_stack()['StackStatus']
+            time.sleep(min(interval, remaining))
+
+    def is_stack_event(self, event):
+        return event['ResourceType'] == STACK_RESOURCE_TYPE and \
+            event['LogicalResourceId'] == self.stack_name
+
+    def record(self, event):
+        logical_id = event['LogicalResourceId']
+        self.resource_types[logical_id] = event['ResourceType']
+        self.started.setdefault(logical_id, event['Timestamp'])
+        if not event['ResourceStatus'].endswith('IN_PROGRESS'):
+            self.finished[logical_id] = event['Timestamp']
+
+    @staticmethod
+    def echo(event):
+        status = event['ResourceStatus']
+        if 'FAILED' in status or 'ROLLBACK' in status:
+            color = 'red'
+        elif status.endswith('IN_PROGRESS'):
+            color = 'yellow'
+        else:
+            color = 'green'
+        reason = event.get('ResourceStatusReason', '')
+        click.secho(
+            f'{event["Timestamp"]:%H:%M:%S} {event["LogicalResourceId"]} '
+            f'{event["ResourceType"]} {status} {reason}'.rstrip(),
+            fg=color
+        )
+
+    def durations(self):
+        """
+        Returns the seconds each resource took, from its first event to its
+        last final one, for the resources that finished.
+        """
+        return {
+            logical_id: (
+                self.finished[logical_id] - self.started[logical_id]
+            ).total_seconds()
+            for logical_id in self.finished
+            if logical_id in self.started
+        }
+
+    def echo_timings(self):
+        durations = self.durations()
+        stack_duration = durations.pop(self.stack_name, None)
+        by_type = defaultdict(list)
+        for logical_id, duration in durations.items():
+            by_type[self.resource_types[logical_id]].append(duration)
+        if stack_duration is not None:
+            click.secho(
+                f'Stack operation took {stack_duration:.0f}s', bold=True
+            )
+        if not durations:
+            return
+        click.secho('Time per resource type:', bold=True)
+        click.echo(tabulate(
+            sorted(
+                ([resource_type, len(type_durations), sum(type_durations),
+                  max(type_durations)]
+                 for resource_type, type_durations in by_type.items()),
+                key=lambda row: row[2], reverse=True
+            ),
+            headers=['Resource type', 'Count', 'Total (s)', 'Max (s)'],
+            floatfmt='.0f'
+        ))
+        click.secho('Time per resource:', bold=True)
+        click.echo(tabulate(
+            sorted(
+                ([logical_id, self.resource_types[logical_id], duration]
+                 for logical_id, duration in durations.items()),
+                key=lambda row: row[2], reverse=True
+            ),
+            headers=['Logical Resource Id', 'ResourceType', 'Time (s)'],
+            floatfmt='.0f'
+        ))
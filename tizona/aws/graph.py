@@ -0,0 +1,241 @@
+import threading
+from collections import defaultdict
+
+from tizona import cache, profiling
+from tizona.core import AWSCommand
+
+# How long, in seconds, a discovered graph is reused by later commands run
+# by the same process, e.g. the daemon
+DEFAULT_DISCOVERY_TTL = 60
+
+LAMBDA_FUNCTION = 'AWS::Lambda::Function'
+REST_API = 'AWS::ApiGateway::RestApi'
+S3_BUCKET = 'AWS::S3::Bucket'
+CLOUDFRONT_DISTRIBUTION = 'AWS::CloudFront::Distribution'
+
+
+class StackNode:
+    __slots__ = ('name', 'stack_id', 'status')
+
+    def __init__(self, name, stack_id, status):
+        self.name = name
+        self.stack_id = stack_id
+        self.status = status
+
+    def __repr__(self):
+        return f'StackNode({self.name!r})'
+
+
+class ResourceNode:
+    __slots__ = (
+        'stack_name', 'logical_id', 'physical_id', 'resource_type', 'status'
+    )
+
+    def __init__(self, stack_name, logical_id, physical_id, resource_type,
+                 status):
+        self.stack_name = stack_name
+        self.logical_id = logical_id
+        self.physical_id = physical_id
+        self.resource_type = resource_type
+        self.status = status
+
+    def __repr__(self):
+        return f'ResourceNode({self.stack_name!r}, {self.logical_id!r})'
+
+
+class ResourceGraph:
+    """
+    Compact, indexed view of the stacks of an account and of the resources
+    of the stacks that have been loaded so far. Only the fields the commands
+    use are kept from the boto summaries.
+
+    Stacks are kept in listing order, deleted ones included, and looked up
+    by substring like the linear scans this replaces. The result of each
+    scan is memoised until more stacks are added.
+
+    The graph may be shared by commands running in several threads, which
+    hold `lock` while they add to it.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.stacks = []
+        self.resources_by_stack = {}
+        self.resources_by_type = defaultdict(list)
+        self.resources_by_logical_id = defaultdict(list)
+        self.resources_by_physical_id = {}
+        self.stack_by_physical_id = {}
+        self._resources_by_stack_type = defaultdict(list)
+        self._stack_scans = {}
+        self._live_stack_names = set()
+        self._deleted_stack_names = set()
+
+    def add_stack(self, summary):
+        name = summary['StackName']
+        self.stacks.append(
+            StackNode(name, summary['StackId'], summary['StackStatus'])
+        )
+        if summary['StackStatus'] == 'DELETE_COMPLETE':
+            self._deleted_stack_names.add(name)
+        else:
+            self._live_stack_names.add(name)
+        self._stack_scans.clear()
+
+    def add_resources(self, stack_name, summaries):
+        if stack_name in self.resources_by_stack:
+            return self.resources_by_stack[stack_name]
+        resources = []
+        for summary in summaries:
+            resource = ResourceNode(
+                stack_name,
+                summary['LogicalResourceId'],
+                summary.get('PhysicalResourceId'),
+                summary['ResourceType'],
+                summary['ResourceStatus'],
+            )
+            resources.append(resource)
+            self.resources_by_type[resource.resource_type].append(resource)
+            self.resources_by_logical_id[resource.logical_id].append(resource)
+            self._resources_by_stack_type[
+                (stack_name, resource.resource_type)
+            ].append(resource)
+            if resource.physical_id:
+                self.resources_by_physical_id[resource.physical_id] = resource
+                self.stack_by_physical_id[resource.physical_id] = stack_name
+        self.resources_by_stack[stack_name] = resources
+        return resources
+
+    def has_resources(self, stack_name):
+        return stack_name in self.resources_by_stack
+
+    def is_deleted(self, stack_name):
+        """
+        Whether every stack listed under `stack_name` has been deleted, in
+        which case it has no resources left to query.
+        """
+        return stack_name in self._deleted_stack_names and \
+            stack_name not in self._live_stack_names
+
+    def find_stacks(self, text):
+        """
+        Returns the stacks whose name contains `text`, in listing order.
+        """
+        if text not in self._stack_scans:
+            self._stack_scans[text] = [
+                stack for stack in self.stacks if text in stack.name
+            ]
+        return self._stack_scans[text]
+
+    def find_stack(self, text):
+        stacks = self.find_stacks(text)
+        if stacks:
+            return stacks[0]
+
+    def find_resources(self, stack_name=None, resource_type=None):
+        if stack_name is not None and resource_type is not None:
+            return self._resources_by_stack_type.get(
+                (stack_name, resource_type), []
+            )
+        if stack_name is not None:
+            return self.resources_by_stack.get(stack_name, [])
+        if resource_type is not None:
+            return self.resources_by_type.get(resource_type, [])
+        return [
+            resource for resources in self.resources_by_stack.values()
+            for resource in resources
+        ]
+
+    def find_resource(self, stack_name, resource_type):
+        resources = self.find_resources(stack_name, resource_type)
+        if resources:
+            return resources[0]
+
+
+class ResourceGraphMixin(AWSCommand):
+    """
+    Discovers the stacks of the account into a `ResourceGraph` and exposes
+    the project-scoped lookups shared by the commands. Stack resources are
+    loaded on demand, concurrently, and only once per stack. The graph is
+    shared by every command run in the process against the same account.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ResourceGraphMixin, self).__init__(*args, **kwargs)
+        self.cloudformation = self.client('cloudformation')
+        self.graph = cache.get_or_create(
+            ('graph', *self.aws_scope),
+            ResourceGraph,
+            ttl=self.tizona_config.get('discovery_ttl', DEFAULT_DISCOVERY_TTL)
+        )
+        self.stacks = self.get_stacks()
+
+    def get_stacks(self):
+        with self.graph.lock:
+            if not self.graph.stacks:
+                with profiling.phase('discovery'):
+                    self.engine.run(self.load_stacks_async())
+            return self.graph.find_stacks(self.project)
+
+    async def load_stacks_async(self):
+        summaries = await self.engine.paginate(
+            self.cloudformation, 'list_stacks', 'StackSummaries'
+        )
+        with self.graph.lock:
+            for summary in summaries:
+                self.graph.add_stack(summary)
+
+    def get_stack(self, service):
+        stacks = [
+            stack for stack in self.graph.find_stacks(service)
+            if self.project in stack.name
+        ]
+        # A deleted stack may be listed before the live one
+        for stack in stacks:
+            if not self.graph.is_deleted(stack.name):
+                return stack
+        if stacks:
+            return stacks[0]
+
+    def get_live_stack_names(self):
+        """
+        Returns the names of the project's stacks that haven't been deleted,
+        once each.
+        """
+        return [
+            stack_name for stack_name in
+            dict.fromkeys(stack.name for stack in self.stacks)
+            if not self.graph.is_deleted(stack_name)
+        ]
+
+    def load_stack_resources(self, stack_names):
+        self.engine.run(self.load_stack_resources_async(stack_names))
+
+    async def load_stack_resources_async(self, stack_names):
+        stack_names = [
+            stack_name for stack_name in dict.fromkeys(stack_names)
+            if not self.graph.has_resources(stack_name) and
+            not self.graph.is_deleted(stack_name)
+        ]
+        with profiling.phase('discovery'):
+            stacks_resources = await self.engine.gather([
+                self.engine.paginate(
+                    self.cloudformation, 'list_stack_resources',
+                    'StackResourceSummaries', StackName=stack_name
+                )
+                for stack_name in stack_names
+            ])
+        with self.graph.lock:
+            for stack_name, resources in zip(stack_names, stacks_resources):
+                self.graph.add_resources(stack_name, resources)
+
+    def list_stack_resources(self, stack_name):
+        self.load_stack_resources([stack_name])
+        return self.graph.find_resources(stack_name)
+
+    async def list_stack_resources_async(self, stack_name):
+        await self.load_stack_resources_async([stack_name])
+        return self.graph.find_resources(stack_name)
+
+    def find_resource(self, stack_name, resource_type):
+        self.load_stack_resources([stack_name])
+        return self.graph.find_resource(stack_name, resource_type)
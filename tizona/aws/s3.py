@@ -0,0 +1,200 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import tempfile
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+from click import ClickException
+
+# Maps the hash of every file uploaded by tizona to a key holding it
+ASSETS_MANIFEST_KEY = '.tizona/assets.json'
+# Files under a release prefix never change, so browsers and CloudFront can
+# keep them for as long as they like
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ENTRY_CACHE_CONTROL = 'public, max-age=60'
+ENCODINGS = ('gzip', 'br')
+COMPRESSIBLE_TYPES = {
+    'application/javascript', 'application/json', 'application/manifest+json',
+    'application/wasm', 'application/xml', 'image/svg+xml',
+}
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with path.open('rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_content_type(path):
+    content_type, _ = mimetypes.guess_type(path.name)
+    return content_type or 'application/octet-stream'
+
+
+def is_compressible(content_type):
+    return content_type.startswith('text/') or \
+        content_type in COMPRESSIBLE_TYPES
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        # No timestamp, so that the same file always compresses the same
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        raise ClickException(
+            'brotli compression needs the brotli package. Install it with '
+            '`pip install tizona[brotli]`'
+        )
+    return brotli.compress(data)
+
+
+class S3Uploader:
+    """
+    Uploads a directory to a prefix of a bucket, transferring only the files
+    whose content isn't in the bucket yet. A manifest in the bucket maps the
+    hash of each file uploaded before to the key that holds it, and those
+    files are copied server-side from that key instead of uploaded again.
+    Hashing, compression, copies and uploads run concurrently on the engine.
+
+    When an `encoding` is given, text files are compressed with it before
+    they are uploaded, and served with the matching `Content-Encoding`.
+    """
+
+    def __init__(self, s3, bucket, engine, encoding=None,
+                 cache_control=IMMUTABLE_CACHE_CONTROL):
+        self.s3 = s3
+        self.bucket = bucket
+        self.engine = engine
+        self.encoding = encoding
+        self.cache_control = cache_control
+
+    def load_manifest(self):
+        try:
+            response = self.s3.get_object(
+                Bucket=self.bucket, Key=ASSETS_MANIFEST_KEY
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return {}
+            raise
+        return json.loads(response['Body'].read())
+
+    def save_manifest(self, manifest):
+        self.s3.put_object(
+            Bucket=self.bucket, Key=ASSETS_MANIFEST_KEY,
+            Body=json.dumps(manifest, sort_keys=True).encode(),
+            ContentType='application/json'
+        )
+
+    def prepare(self, path, staged_path):
+        """
+        Returns the file to upload for `path`, which is `staged_path` when
+        the file is compressed, along with its headers and a hash of both,
+        so that a file uploaded with other headers isn't reused.
+        """
+        extra_args = {'ContentType': get_content_type(path)}
+        if self.cache_control:
+            extra_args['CacheControl'] = self.cache_control
+        if self.encoding and is_compressible(extra_args['ContentType']):
+            data = path.read_bytes()
+            compressed = compress(data, self.encoding)
+            if len(compressed) < len(data):
+                staged_path.write_bytes(compressed)
+                extra_args['ContentEncoding'] = self.encoding
+                path = staged_path
+        digest = hashlib.sha256(hash_file(path).encode())
+        digest.update(json.dumps(extra_args, sort_keys=True).encode())
+        return path, extra_args, digest.hexdigest()
+
+    def upload(self, path, key, extra_args):
+        self.s3.upload_file(
+            Filename=path.as_posix(), Bucket=self.bucket, Key=key,
+            ExtraArgs=extra_args
+        )
+
+    def upload_entry(self, path, key):
+        """
+        Uploads the html file the distribution serves as its root, which
+        only stays cached for a short while so that releases and rollbacks
+        show up quickly, and returns the hash of its content.
+        """
+        body = path.read_bytes()
+        extra_args = {
+            'ACL': 'public-read',
+            'ContentType': 'text/html',
+            'CacheControl': ENTRY_CACHE_CONTROL,
+        }
+        if self.encoding:
+            body = compress(body, self.encoding)
+            extra_args['ContentEncoding'] = self.encoding
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, **extra_args)  # noqa: E501
+        return hashlib.sha256(body).hexdigest()
+
+    def copy(self, source_key, key):
+        """
+        Copies `source_key` to `key` within the bucket and returns whether
+        it could, which it can't when the source has been deleted since it
+        was recorded in the manifest.
+        """
+        try:
+            self.s3.copy_object(
+                Bucket=self.bucket, Key=key,
+                CopySource={'Bucket': self.bucket, 'Key': source_key},
+                MetadataDirective='COPY'
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return False
+            raise
+        return True
+
+    async def transfer_async(self, path, key, staged_path, manifest):
+        """
+        Returns the hash of the file and the number of bytes uploaded, which
+        is 0 for a copy.
+        """
+        path, extra_args, content_hash = await self.engine.call(
+            self.prepare, path, staged_path
+        )
+        source_key = manifest.get(content_hash)
+        if source_key == key:
+            return content_hash, 0
+        if source_key is not None and \
+                await self.engine.call(self.copy, source_key, key):
+            return content_hash, 0
+        await self.engine.call(self.upload, path, key, extra_args)
+        return content_hash, path.stat().st_size
+
+    async def sync_async(self, directory, prefix):
+        """
+        Uploads every file under `directory` to `prefix`, and returns the
+        hash of each file by its path relative to `directory`, along with
+        the number of files and bytes uploaded.
+        """
+        paths = sorted(path for path in directory.rglob('*') if path.is_file())
+        keys = [
+            f'{prefix}/{path.relative_to(directory).as_posix()}'
+            for path in paths
+        ]
+        manifest = await self.engine.call(self.load_manifest)
+        with tempfile.TemporaryDirectory() as staging:
+            transfers = await self.engine.gather([
+                self.transfer_async(path, key, Path(staging) / str(index), manifest)  # noqa: E501
+                for index, (path, key) in enumerate(zip(paths, keys))
+            ])
+        hashes = [content_hash for content_hash, _ in transfers]
+        uploaded = [size for _, size in transfers]
+        for key, content_hash, size in zip(keys, hashes, uploaded):
+            if size or content_hash not in manifest:
+                manifest[content_hash] = key
+        await self.engine.call(self.save_manifest, manifest)
+        files = {
+            path.relative_to(directory).as_posix(): content_hash
+            for path, content_hash in zip(paths, hashes)
+        }
+        return files, sum(1 for size in uploaded if size), sum(uploaded)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+
+import yaml
+
+
+class TemplateLoader(yaml.SafeLoader):
+    """
+    Loads CloudFormation templates written in YAML into the same structure
+    CloudFormation returns for JSON templates. Short-form intrinsic
+    functions like `!Ref` or `!GetAtt` become their long form, and dates
+    such as `AWSTemplateFormatVersion` are kept as strings.
+    """
+
+
+TemplateLoader.yaml_implicit_resolvers = {
+    first: [
+        (tag, regexp) for tag, regexp in resolvers
+        if tag != 'tag:yaml.org,2002:timestamp'
+    ]
+    for first, resolvers in yaml.SafeLoader.yaml_implicit_resolvers.items()
+}
+
+
+def _construct_intrinsic_function(loader, tag_suffix, node):
+    name = 'Ref' if tag_suffix == 'Ref' else f'Fn::{tag_suffix}'
+    if isinstance(node, yaml.ScalarNode):
+        value = loader.construct_scalar(node)
+        if tag_suffix == 'GetAtt':
+            value = value.split('.', 1)
+    elif isinstance(node, yaml.SequenceNode):
+        value = loader.construct_sequence(node, deep=True)
+    else:
+        value = loader.construct_mapping(node, deep=True)
+    return {name: value}
+
+
+TemplateLoader.add_multi_constructor('!', _construct_intrinsic_function)
+
+
+def load_template(body):
+    """
+    Returns the template as a dictionary. `body` may already be one, which
+    is what boto returns for JSON templates, or a JSON or YAML string.
+    """
+    if isinstance(body, dict):
+        return body
+    return yaml.load(body, Loader=TemplateLoader)
+
+
+def template_hash(template, parameters, tags):
+    """
+    Hashes everything a stack update depends on, in a form that doesn't
+    change when keys are reordered or the template is reformatted.
+    """
+    canonical = json.dumps(
+        {'template': template, 'parameters': parameters, 'tags': tags},
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def diff_templates(old, new, path=()):
+    """
+    Compares two templates as trees and returns the changes as a list of
+    `(change, path, old value, new value)` tuples, where change is one of
+    `+`, `-` or `~`, and path is the tuple of keys and list indexes that
+    leads to the value.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in old:
+            if key not in new:
+                changes.append(('-', path + (key,), old[key], None))
+            else:
+                changes.extend(diff_templates(old[key], new[key], path + (key,)))  # noqa: E501
+        for key in new:
+            if key not in old:
+                changes.append(('+', path + (key,), None, new[key]))
+        return changes
+    if isinstance(old, list) and isinstance(new, list):
+        changes = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            changes.extend(diff_templates(old_item, new_item, path + (index,)))
+        for index in range(len(new), len(old)):
+            changes.append(('-', path + (index,), old[index], None))
+        for index in range(len(old), len(new)):
+            changes.append(('+', path + (index,), None, new[index]))
+        return changes
+    if old != new:
+        return [('~', path, old, new)]
+    return []
+
+
+def group_changes(changes):
+    """
+    Groups the changes by the top-level element they belong to, e.g.
+    `('Resources', 'MyFunction')` or `('Outputs', 'Url')`. Each group
+    reports whether the element was added, removed or modified, and the
+    changes relative to the element.
+    """
+    groups = {}
+    for change, path, old, new in changes:
+        element, relative_path = path[:2], path[2:]
+        if not relative_path:
+            status = 'added' if change == '+' else 'removed' if change == '-' else 'modified'  # noqa: E501
+            groups[element] = (status, [])
+            if change != '~':
+                continue
+        groups.setdefault(element, ('modified', []))[1].append(
+            (change, relative_path, old, new)
+        )
+    return groups
+
+
+def format_path(path):
+    return '.'.join(
+        f'[{part}]' if isinstance(part, int) else part for part in path
+    ).replace('.[', '[')
@@ -0,0 +1,118 @@
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from click import ClickException
+
+from tizona.core import TizonaCommand
+
+
+class ThreadOutput(io.TextIOBase):
+    """
+    Stand-in for `sys.stdout` while a batch runs. Whatever a project's
+    worker thread prints is kept in that thread's buffer, so that the output
+    of each project can be printed as a group. Output from the main thread
+    goes straight to the terminal, and output from any other thread, such as
+    the spinners started by the commands, is dropped.
+    """
+
+    def __init__(self, stream):
+        super(ThreadOutput, self).__init__()
+        self.stream = stream
+        self.main_thread = threading.current_thread()
+        self.local = threading.local()
+
+    @property
+    def encoding(self):
+        return self.stream.encoding
+
+    def isatty(self):
+        return self.stream.isatty()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(text)
+        if threading.current_thread() is self.main_thread:
+            return self.stream.write(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def capture(self, function, *args, **kwargs):
+        """
+        Calls `function` and returns what it printed, along with the
+        exception it raised, if any.
+        """
+        self.local.buffer = io.StringIO()
+        try:
+            function(*args, **kwargs)
+            error = None
+        except Exception as exception:
+            error = exception
+        finally:
+            output = self.local.buffer.getvalue()
+            self.local.buffer = None
+        return output, error
+
+
+def resolve_projects(state):
+    """
+    Returns the projects a command should run for in batch mode, or an
+    empty list when it should run for a single project.
+    """
+    if state.all_projects:
+        try:
+            return TizonaCommand._load_tizona_config()['projects']
+        except KeyError:
+            raise ClickException(
+                '--all-projects needs a `projects` list in .tizona.yaml'
+            )
+    return state.projects
+
+
+def run_batch(projects, run_project):
+    """
+    Runs `run_project(project)` for every project concurrently, in a single
+    process so that sessions, clients and discovered stacks are shared. The
+    output of each project is printed as a group, in the order the projects
+    were given, as soon as that project and the ones before it are done.
+    """
+    stdout = sys.stdout
+    output = ThreadOutput(stdout)
+    sys.stdout = output
+    failed = []
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=len(projects)) as executor:
+            futures = [
+                executor.submit(output.capture, run_project, project)
+                for project in projects
+            ]
+            for project, future in zip(projects, futures):
+                text, error = future.result()
+                click.secho(f'==> {project}', bold=True, fg='blue')
+                output.stream.write(text)
+                if isinstance(error, ClickException):
+                    click.secho(f'Error: {error.format_message()}', fg='red')
+                elif error is not None:
+                    click.secho(f'Error: {error!r}', fg='red')
+                    errors.append(error)
+                if error is not None:
+                    failed.append(project)
+                output.flush()
+    finally:
+        sys.stdout = stdout
+    if errors:
+        raise errors[0]
+    if failed:
+        raise ClickException(
+            f'{len(failed)} of {len(projects)} projects failed: '
+            f'{", ".join(failed)}'
+        )
@@ -0,0 +1,39 @@
+import threading
+import time
+
+_entries = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+def get_or_create(key, factory, ttl=None):
+    """
+    Returns the value cached under `key`, calling `factory` to create it
+    when it is missing or older than `ttl` seconds. Values live for as long
+    as the process, which for a one-off command is a single run and for the
+    daemon is until it stops. Callers racing for the same key wait for the
+    first one to create the value instead of creating it twice.
+    """
+    with _lock:
+        key_lock = _locks.setdefault(key, threading.Lock())
+    with key_lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires is None or expires > time.monotonic():
+                return value
+        value = factory()
+        expires = time.monotonic() + ttl if ttl is not None else None
+        _entries[key] = (value, expires)
+        return value
+
+
+def invalidate(kind=None):
+    """
+    Drops the cached values whose key starts with `kind`, or every value
+    when `kind` is not given.
+    """
+    with _lock:
+        for key in list(_entries):
+            if kind is None or key[0] == kind:
+                del _entries[key]
@@ -1,3 +1,7 @@
+import hashlib
+import json
+import os
+import threading
 from pathlib import Path
 
 import boto3
@@ -5,18 +9,45 @@ import click
 import yaml
 from click import ClickException
 
+from tizona import cache, profiling
+from tizona.aws.engine import AsyncEngine, DEFAULT_MAX_CONCURRENCY
+
+# boto3 sessions aren't thread safe, so clients are created one at a time
+_client_lock = threading.Lock()
+
+
+def get_credentials_key():
+    """
+    Digest of the AWS_ environment variables, which can select other
+    credentials than the profile does. It is part of the key of everything
+    cached per account, so that a daemon serving callers with different
+    credentials never hands one of them another's session.
+    """
+    environment = sorted(
+        (name, value) for name, value in os.environ.items()
+        if name.startswith('AWS_')
+    )
+    return hashlib.sha256(json.dumps(environment).encode()).hexdigest()
+
 
 class TizonaCommand:
     def __init__(self, *args, **kwargs):
         self.tizona_config = self._load_tizona_config()
-        self.project = self._resolve_project(kwargs.get('project'))
+        # Subclasses take the project as a positional argument and set it
+        # before calling this constructor
+        self.project = self._resolve_project(
+            kwargs.get('project') or getattr(self, 'project', None)
+        )
 
     @staticmethod
     def _load_tizona_config():
-        tizona_config_file = Path('.tizona.yaml')
+        tizona_config_file = Path('.tizona.yaml').absolute()
         if not tizona_config_file.exists():
             raise click.ClickException('.tizona.yaml file missing')
-        return yaml.safe_load(tizona_config_file.read_text())
+        return cache.get_or_create(
+            ('config', tizona_config_file, tizona_config_file.stat().st_mtime_ns),  # noqa: E501
+            lambda: yaml.safe_load(tizona_config_file.read_text())
+        )
 
     def _resolve_project(self, project):
         if not project:
@@ -32,9 +63,43 @@ class AWSCommand(TizonaCommand):
         super(AWSCommand, self).__init__(*args, **kwargs)
         self.aws_profile = self._resolve_aws_profile(kwargs['state'].aws_profile)  # noqa: E501
         self.aws_region = self._resolve_aws_region(kwargs['state'].aws_region)
-        self.aws_session = boto3.session.Session(
-            profile_name=self.aws_profile, region_name=self.aws_region
+        self.aws_credentials_key = get_credentials_key()
+        self.aws_session = cache.get_or_create(
+            ('session', self.aws_profile, self.aws_region,
+             self.aws_credentials_key),
+            lambda: boto3.session.Session(
+                profile_name=self.aws_profile, region_name=self.aws_region
+            )
         )
+        # Points every client at an alternative endpoint, such as a local
+        # moto server, when set
+        self.aws_endpoint_url = (
+            os.environ.get('TIZONA_AWS_ENDPOINT_URL') or
+            self.tizona_config.get('aws_endpoint_url')
+        )
+        # Identifies the account and endpoint in the keys of the values
+        # cached for them
+        self.aws_scope = (
+            self.aws_profile, self.aws_region, self.aws_credentials_key,
+            self.aws_endpoint_url
+        )
+        max_concurrency = self.tizona_config.get(
+            'max_concurrency', DEFAULT_MAX_CONCURRENCY
+        )
+        self.engine = cache.get_or_create(
+            ('engine', max_concurrency), lambda: AsyncEngine(max_concurrency)
+        )
+
+    def client(self, service_name):
+        def create_client():
+            with _client_lock:
+                return self.aws_session.client(
+                    service_name, endpoint_url=self.aws_endpoint_url
+                )
+        return profiling.instrument(cache.get_or_create(
+            ('client', *self.aws_scope, service_name),
+            create_client
+        ))
 
     def _resolve_aws_profile(self, profile):
         if not profile:
@@ -0,0 +1,306 @@
+"""
+Opt-in background process that keeps the imports, parsed `.tizona.yaml`,
+boto sessions, clients and discovered stacks of previous commands warm.
+
+The `tizona` entry point forwards its arguments to the daemon over a unix
+socket when one is listening, and runs the command in-process otherwise.
+This module is imported on every invocation, so the client side only uses
+the standard library.
+
+Every message is a line of JSON. The daemon streams the output of a command
+back as it is written, as `{"output": ..., "stream": "stdout"}` messages,
+and ends with `{"exit_code": ...}`. Closing the connection before that, as
+the client does on Ctrl-C, cancels the command.
+"""
+import io
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from pathlib import Path
+
+# Environment variables forwarded with each command, which covers the
+# defaults of the `--aws-profile` and `--aws-region` options
+FORWARDED_ENV_PREFIXES = ('AWS_', 'TIZONA_')
+# Sent to the daemon's main thread to interrupt the command it is running
+CANCEL_SIGNAL = signal.SIGUSR1
+
+
+def socket_path():
+    return Path(
+        os.environ.get('TIZONA_DAEMON_SOCKET') or
+        Path.home() / '.tizona' / 'daemon.sock'
+    )
+
+
+def _connect():
+    path = socket_path()
+    if not path.exists():
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path.as_posix())
+    except (ConnectionRefusedError, FileNotFoundError):
+        # A daemon that died without cleaning up leaves the socket behind
+        connection.close()
+        return None
+    return connection
+
+
+def _send(request):
+    connection = _connect()
+    if connection is None:
+        return None
+    with connection, connection.makefile('rwb') as stream:
+        try:
+            stream.write(json.dumps(request).encode() + b'\n')
+            stream.flush()
+            response = stream.readline()
+        except ConnectionError:
+            # The daemon was stopping
+            return None
+        return json.loads(response) if response else None
+
+
+def forward(args):
+    """
+    Runs the command in the daemon and returns its exit code, or None when
+    no daemon is listening, or it is busy with another command, and the
+    command should run in-process.
+    """
+    connection = _connect()
+    if connection is None:
+        return None
+    with connection, connection.makefile('rwb') as stream:
+        stream.write(json.dumps({
+            'command': 'run',
+            'args': args,
+            'cwd': os.getcwd(),
+            'env': {
+                name: value for name, value in os.environ.items()
+                if name.startswith(FORWARDED_ENV_PREFIXES)
+            },
+            'color': sys.stdout.isatty(),
+        }).encode() + b'\n')
+        stream.flush()
+        try:
+            for line in stream:
+                message = json.loads(line)
+                if message.get('busy'):
+                    return None
+                if 'exit_code' in message:
+                    return message['exit_code']
+                output = sys.stderr if message['stream'] == 'stderr' else sys.stdout  # noqa: E501
+                output.write(message['output'])
+                output.flush()
+        except KeyboardInterrupt:
+            # The daemon cancels the command once the connection is closed
+            connection.shutdown(socket.SHUT_RDWR)
+            return 130
+    # The daemon stopped before the command finished
+    return 1
+
+
+def ping():
+    return _send({'command': 'ping'})
+
+
+def stop():
+    return _send({'command': 'stop'})
+
+
+class SocketOutput(io.RawIOBase):
+    """
+    Sends what a command writes to one of its streams to the client. Once
+    the client is gone the output is dropped, so that the command can still
+    unwind.
+    """
+
+    def __init__(self, wfile, name):
+        super(SocketOutput, self).__init__()
+        self.wfile = wfile
+        self.name = name
+        self.connected = True
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if data and self.connected:
+            try:
+                self.wfile.write(json.dumps({
+                    'output': bytes(data).decode('utf-8', 'replace'),
+                    'stream': self.name,
+                }).encode() + b'\n')
+            except OSError:
+                self.connected = False
+        return len(data)
+
+
+class Job:
+    def __init__(self, request, wfile):
+        self.request = request
+        self.wfile = wfile
+        self.cancelled = False
+        self.done = threading.Event()
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        if request['command'] == 'ping':
+            response = {'pid': os.getpid()}
+        elif request['command'] == 'stop':
+            response = {'pid': os.getpid()}
+            self.server.stop()
+        elif not self.server.busy.acquire(blocking=False):
+            response = {'busy': True}
+        else:
+            job = Job(request, self.wfile)
+            self.server.jobs.put(job)
+            # The client doesn't send anything else, so this returns once it
+            # closes the connection, after the exit code or on Ctrl-C
+            self.rfile.read()
+            self.server.cancel(job)
+            # The connection is closed once this returns, which the command
+            # may still be writing to while it unwinds
+            job.done.wait()
+            return
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Connections are handled on their own threads, but commands run one at
+    a time on the main thread: they depend on the working directory,
+    environment and standard streams of the caller, which are process-wide
+    state, and running them there lets a client cancel them with a signal.
+    A command forwarded while another one runs is answered as busy, and the
+    client runs it in-process instead of waiting.
+    """
+    daemon_threads = True
+
+    def __init__(self, path):
+        super(DaemonServer, self).__init__(path.as_posix(), DaemonHandler)
+        self.busy = threading.Lock()
+        self.jobs = queue.Queue()
+        self.running = None
+        # Imported once here so that forwarded commands don't pay for it
+        from tizona.scripts.tizona import cli
+        self.cli = cli
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def cancel(self, job):
+        job.cancelled = True
+        if self.running is job:
+            signal.pthread_kill(threading.main_thread().ident, CANCEL_SIGNAL)
+
+    def interrupt(self, signum, frame):
+        # A signal that arrives once the command has finished is ignored
+        if self.running is not None and self.running.cancelled:
+            raise KeyboardInterrupt
+
+    def run_job(self, job):
+        request = job.request
+        stdout = io.TextIOWrapper(
+            SocketOutput(job.wfile, 'stdout'), encoding='utf-8',
+            write_through=True
+        )
+        stderr = io.TextIOWrapper(
+            SocketOutput(job.wfile, 'stderr'), encoding='utf-8',
+            write_through=True
+        )
+        streams = sys.stdin, sys.stdout, sys.stderr
+        environ = dict(os.environ)
+        try:
+            os.chdir(request['cwd'])
+            # Variables the caller doesn't have are unset for the command,
+            # so that the daemon's own environment doesn't leak into it
+            for name in environ:
+                if name.startswith(FORWARDED_ENV_PREFIXES):
+                    del os.environ[name]
+            os.environ.update(request['env'])
+            sys.stdin, sys.stdout, sys.stderr = io.StringIO(), stdout, stderr
+            exit_code = self.invoke(job)
+        except OSError as error:
+            stderr.write(f'Error: {error}\n')
+            exit_code = 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streams
+            os.environ.clear()
+            os.environ.update(environ)
+        return exit_code
+
+    def invoke(self, job):
+        try:
+            try:
+                self.running = job
+                if job.cancelled:
+                    raise KeyboardInterrupt
+                self.cli.main(
+                    args=job.request['args'], prog_name='tizona',
+                    color=job.request['color']
+                )
+            finally:
+                self.running = None
+        except SystemExit as error:
+            if error.code is None or isinstance(error.code, int):
+                return error.code or 0
+            sys.stderr.write(f'{error.code}\n')
+            return 1
+        except KeyboardInterrupt:
+            return 130
+        except Exception:
+            sys.stderr.write(traceback.format_exc())
+            return 1
+        return 0
+
+    def serve(self):
+        signal.signal(CANCEL_SIGNAL, self.interrupt)
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    return
+                try:
+                    exit_code = self.run_job(job)
+                finally:
+                    self.busy.release()
+                # Only sent once the daemon is free, so the client's next
+                # command isn't answered as busy
+                try:
+                    job.wfile.write(json.dumps({'exit_code': exit_code}).encode() + b'\n')  # noqa: E501
+                except OSError:
+                    pass
+                job.done.set()
+        finally:
+            self.shutdown()
+
+
+def serve():
+    path = socket_path()
+    # Commands run with the AWS credentials of whoever connects, so only the
+    # user running the daemon may reach it
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    umask = os.umask(0o077)
+    try:
+        server = DaemonServer(path)
+    finally:
+        os.umask(umask)
+    path.chmod(0o600)
+    try:
+        server.serve()
+    finally:
+        server.server_close()
+        path.unlink()
@@ -2,6 +2,8 @@ import os
 
 import click
 
+from tizona import profiling
+
 
 class State(object):
 
@@ -10,6 +12,10 @@ class State(object):
         self.aws_region = ''
         self.verbosity = 0
         self.tizona_config = ''
+        self.projects = []
+        self.all_projects = False
+        self.profile = False
+        self.profile_trace = None
 
 
 pass_state = click.make_pass_decorator(State, ensure=True)
@@ -56,8 +62,71 @@ def aws_region_option(f):
     )(f)
 
 
+def profile_option(f):
+    def start_profiling(ctx):
+        state = ctx.ensure_object(State)
+        if not state.profile:
+            state.profile = True
+            profiling.start()
+            ctx.call_on_close(lambda: profiling.stop(state.profile_trace))
+
+    def profile_callback(ctx, param, value):
+        if value:
+            start_profiling(ctx)
+        return value
+
+    def profile_trace_callback(ctx, param, value):
+        if value:
+            ctx.ensure_object(State).profile_trace = value
+            start_profiling(ctx)
+        return value
+    f = click.option(
+        '--profile-trace',
+        callback=profile_trace_callback,
+        expose_value=False,
+        type=click.Path(dir_okay=False),
+        help='Profile this command and write a Chrome trace to this file'
+    )(f)
+    return click.option(
+        '--profile',
+        callback=profile_callback,
+        expose_value=False,
+        is_flag=True,
+        help='Print the time spent in AWS calls and in each phase of this '
+             'command'
+    )(f)
+
+
 def common_options(f):
     f = verbosity_option(f)
     f = aws_profile_option(f)
     f = aws_region_option(f)
+    f = profile_option(f)
     return f
+
+
+def projects_option(f):
+    def projects_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.projects = [
+            project.strip() for project in value.split(',') if project.strip()
+        ] if value else []
+        return value
+
+    def all_projects_callback(ctx, param, value):
+        state = ctx.ensure_object(State)
+        state.all_projects = value
+        return value
+    f = click.option(
+        '--projects',
+        callback=projects_callback,
+        expose_value=False,
+        help='Comma-separated projects to run this command for concurrently'
+    )(f)
+    return click.option(
+        '--all-projects',
+        callback=all_projects_callback,
+        expose_value=False,
+        is_flag=True,
+        help='Run this command for every project listed in .tizona.yaml'
+    )(f)
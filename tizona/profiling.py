@@ -0,0 +1,217 @@
+"""
+Records the AWS calls and named phases of a command when it runs with
+`--profile`. Nothing is hooked while profiling is off: clients are only
+instrumented once a profiler is started, and `phase` is a no-op.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlencode
+
+import click
+from tabulate import tabulate
+
+_profiler = None
+
+
+class Profiler:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.calls = []
+        self.phases = []
+        self.clients = []
+
+    def instrument(self, client):
+        """
+        Hooks the events botocore emits around each API call of `client`.
+        Latency runs from before the request is signed to after the response
+        is parsed, so it includes the retries botocore made.
+        """
+        with self.lock:
+            if any(instrumented is client for instrumented in self.clients):
+                return
+            self.clients.append(client)
+        client.meta.events.register(
+            'before-call', self.before_call, unique_id='tizona-profile-before'
+        )
+        client.meta.events.register(
+            'after-call', self.after_call, unique_id='tizona-profile-after'
+        )
+        client.meta.events.register(
+            'after-call-error', self.after_call_error,
+            unique_id='tizona-profile-error'
+        )
+
+    def uninstrument(self):
+        for client in self.clients:
+            client.meta.events.unregister(
+                'before-call', unique_id='tizona-profile-before'
+            )
+            client.meta.events.unregister(
+                'after-call', unique_id='tizona-profile-after'
+            )
+            client.meta.events.unregister(
+                'after-call-error', unique_id='tizona-profile-error'
+            )
+        self.clients = []
+
+    @staticmethod
+    def before_call(model, params, context, **kwargs):
+        body = params.get('body') or b''
+        if isinstance(body, (bytes, str)):
+            bytes_sent = len(body)
+        elif isinstance(body, dict):
+            # Query protocol parameters, form-encoded when sent
+            bytes_sent = len(urlencode(body))
+        else:
+            # Streamed bodies, such as uploaded files
+            bytes_sent = int(params.get('headers', {}).get('Content-Length', 0))  # noqa: E501
+        context['tizona_profile'] = {
+            'name': f'{model.service_model.service_name}.{model.name}',
+            'start': time.perf_counter(),
+            'bytes_sent': bytes_sent,
+        }
+
+    def after_call(self, model, http_response, parsed, context, **kwargs):
+        metadata = parsed.get('ResponseMetadata', {})
+        self.record_call(
+            context,
+            retries=metadata.get('RetryAttempts', 0),
+            bytes_received=int(
+                metadata.get('HTTPHeaders', {}).get('content-length', 0)
+            ),
+            error=parsed.get('Error', {}).get('Code'),
+        )
+
+    def after_call_error(self, exception, context, **kwargs):
+        self.record_call(context, error=type(exception).__name__)
+
+    def record_call(self, context, retries=0, bytes_received=0, error=None):
+        started = context.get('tizona_profile')
+        if started is None:
+            return
+        end = time.perf_counter()
+        with self.lock:
+            self.calls.append({
+                'name': started['name'],
+                'start': started['start'] - self.origin,
+                'duration': end - started['start'],
+                'retries': retries,
+                'bytes_sent': started['bytes_sent'],
+                'bytes_received': bytes_received,
+                'error': error,
+                'thread': threading.get_ident(),
+            })
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.phases.append({
+                    'name': name,
+                    'start': start - self.origin,
+                    'duration': end - start,
+                    'thread': threading.get_ident(),
+                })
+
+    def echo_summary(self):
+        calls = defaultdict(list)
+        for call in self.calls:
+            calls[call['name']].append(call)
+        click.secho('AWS calls:', bold=True, err=True)
+        click.echo(tabulate(
+            sorted(
+                ([name, len(group),
+                  sum(call['duration'] for call in group) * 1000,
+                  max(call['duration'] for call in group) * 1000,
+                  sum(call['retries'] for call in group),
+                  sum(1 for call in group if call['error']),
+                  sum(call['bytes_sent'] for call in group),
+                  sum(call['bytes_received'] for call in group)]
+                 for name, group in calls.items()),
+                key=lambda row: row[2], reverse=True
+            ),
+            headers=['Operation', 'Calls', 'Total (ms)', 'Max (ms)',
+                     'Retries', 'Errors', 'Sent (B)', 'Received (B)'],
+            floatfmt='.0f'
+        ), err=True)
+        phases = defaultdict(list)
+        for phase in self.phases:
+            phases[phase['name']].append(phase['duration'])
+        click.secho('Phases:', bold=True, err=True)
+        click.echo(tabulate(
+            [[name, len(durations), sum(durations) * 1000]
+             for name, durations in phases.items()],
+            headers=['Phase', 'Count', 'Total (ms)'],
+            floatfmt='.0f'
+        ), err=True)
+        click.secho(
+            f'Total: {(time.perf_counter() - self.origin) * 1000:.0f}ms',
+            bold=True, err=True
+        )
+
+    def write_trace(self, path):
+        """
+        Writes the calls and phases in the Chrome trace event format, which
+        chrome://tracing and Perfetto open, with one row per thread.
+        """
+        pid = os.getpid()
+        events = [
+            {'name': phase['name'], 'cat': 'phase', 'ph': 'X', 'pid': pid,
+             'tid': phase['thread'], 'ts': phase['start'] * 1e6,
+             'dur': phase['duration'] * 1e6}
+            for phase in self.phases
+        ] + [
+            {'name': call['name'], 'cat': 'aws', 'ph': 'X', 'pid': pid,
+             'tid': call['thread'], 'ts': call['start'] * 1e6,
+             'dur': call['duration'] * 1e6,
+             'args': {key: call[key] for key in (
+                 'retries', 'bytes_sent', 'bytes_received', 'error'
+             )}}
+            for call in self.calls
+        ]
+        with open(path, 'w') as trace:
+            json.dump({'traceEvents': events}, trace)
+
+
+def start():
+    global _profiler
+    _profiler = Profiler()
+
+
+def stop(trace_path=None):
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+    profiler.uninstrument()
+    profiler.echo_summary()
+    if trace_path:
+        profiler.write_trace(trace_path)
+        click.secho(f'Trace written to {trace_path}', fg='green', err=True)
+
+
+def instrument(client):
+    if _profiler is not None:
+        _profiler.instrument(client)
+    return client
+
+
+def phase(name):
+    """
+    Times the block it wraps as the phase `name`:
+
+        with profiling.phase('upload'):
+            ...
+    """
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.phase(name)
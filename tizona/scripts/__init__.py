@@ -0,0 +1,16 @@
+import sys
+
+
+def main():
+    """
+    Entry point of the `tizona` script. Commands are forwarded to the daemon
+    when one is running, before importing any of the command modules.
+    """
+    from tizona import daemon
+    args = sys.argv[1:]
+    if args[:1] != ['daemon']:
+        exit_code = daemon.forward(args)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    from tizona.scripts.tizona import cli
+    cli()
@@ -0,0 +1,55 @@
+import click
+from click_help_colors import HelpColorsGroup, HelpColorsCommand
+
+from tizona.decorators import common_options, pass_state
+from tizona.services.artifacts import CollectGarbage, ListArtifacts
+
+
+@click.group(
+    cls=HelpColorsGroup,
+    help_headers_color='yellow',
+    help_options_color='green'
+)
+def artifacts():
+    """
+    Manages the packages built for the services.
+    """
+    pass
+
+
+@artifacts.command(
+    cls=HelpColorsCommand,
+    help_options_color='green',
+    name='list'
+)
+@click.argument('service')
+@click.option('--project')
+@common_options
+@pass_state
+def list_artifacts(state, service, project):
+    ListArtifacts(project=project, service=service, state=state).run()
+
+
+@artifacts.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+@click.argument('service')
+@click.option('--project')
+@click.option('--keep', default=10, show_default=True,
+              help='Number of the newest artifacts to keep')
+@click.option('--max-age-days', default=30, show_default=True,
+              help='Keep the artifacts built or deployed more recently')
+@click.option('--dry-run', is_flag=True, default=False,
+              help='List the artifacts that would be deleted')
+@common_options
+@pass_state
+def gc(state, service, project, keep, max_age_days, dry_run):
+    """
+    Deletes the indexed artifacts of SERVICE nothing needs anymore. Packages
+    uploaded to the root of the bucket before artifacts were indexed are
+    never deleted.
+    """
+    CollectGarbage(project=project, service=service, keep=keep,
+                   max_age_days=max_age_days, dry_run=dry_run,
+                   state=state).run()
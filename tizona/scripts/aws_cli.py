@@ -1,9 +1,11 @@
 import click
+from click import ClickException
 from click_help_colors import HelpColorsGroup, HelpColorsCommand
 
 from tizona.aws.cloudformation import ListStacks, ListStackResources, Diff, \
-    Launch
-from tizona.decorators import pass_state, common_options
+    Drift, Launch, LaunchGroup
+from tizona.batch import resolve_projects, run_batch
+from tizona.decorators import pass_state, common_options, projects_option
 
 
 @click.group(
@@ -22,9 +24,16 @@ def aws(ctx):
     name='list-stacks'
 )
 @click.option('--project')
+@projects_option
 @common_options
 @pass_state
 def list_stacks(state, project):
+    projects = resolve_projects(state)
+    if projects:
+        return run_batch(
+            projects,
+            lambda project: ListStacks(project=project, state=state).run()
+        )
     return ListStacks(project=project, state=state).run()
 
 
@@ -59,9 +68,27 @@ def diff(state, stack, project):
 )
 @click.option('--project')
 @click.option('--stack')
+@click.option('--group', help='Stack group to launch, following the '
+                              'dependencies between its stacks')
+@click.option('--max-concurrency', type=int,
+              help='Maximum number of stacks launched at the same time')
 @common_options
 @pass_state
-def launch(state, stack, project):
+def launch(state, stack, project, group, max_concurrency):
+    if bool(stack) == bool(group):
+        raise ClickException('You must specify either stack or group')
+    if group:
+        return LaunchGroup(project=project, group=group,
+                           max_concurrency=max_concurrency, state=state).run()
     return Launch(project=project, stack=stack, state=state).run()
 
 
+@aws.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+@click.option('--project')
+@common_options
+@pass_state
+def drift(state, project):
+    return Drift(project=project, state=state).run()
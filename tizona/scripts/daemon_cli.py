@@ -0,0 +1,57 @@
+import click
+from click import ClickException
+from click_help_colors import HelpColorsGroup, HelpColorsCommand
+
+from tizona import daemon as tizona_daemon
+
+
+@click.group(
+    cls=HelpColorsGroup,
+    help_headers_color='yellow',
+    help_options_color='green'
+)
+def daemon():
+    """
+    Keeps sessions, config and discovered stacks warm between commands.
+    """
+    pass
+
+
+@daemon.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+def start():
+    if tizona_daemon.ping() is not None:
+        raise ClickException(
+            f'A daemon is already running on {tizona_daemon.socket_path()}'
+        )
+    click.secho(
+        f'Listening on {tizona_daemon.socket_path()}', fg='green'
+    )
+    tizona_daemon.serve()
+
+
+@daemon.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+def stop():
+    if tizona_daemon.stop() is None:
+        raise ClickException('No daemon is running')
+    click.secho('Daemon stopped', fg='green')
+
+
+@daemon.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+def status():
+    response = tizona_daemon.ping()
+    if response is None:
+        click.secho('No daemon is running', fg='yellow')
+    else:
+        click.secho(
+            f'Daemon running with pid {response["pid"]} on '
+            f'{tizona_daemon.socket_path()}', fg='green'
+        )
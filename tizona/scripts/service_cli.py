@@ -2,10 +2,14 @@ import click
 from click import ClickException
 from click_help_colors import HelpColorsCommand, HelpColorsGroup
 
-from tizona.decorators import common_options, pass_state
-from tizona.services.build import Build
-from tizona.services.deploy import Deploy
+from tizona.aws.cloudwatch import Logs, Metrics
+from tizona.batch import resolve_projects, run_batch
+from tizona.decorators import common_options, pass_state, projects_option
+from tizona.services.bench import Bench
+from tizona.services.build import Build, BuildServices
+from tizona.services.deploy import Deploy, LocalDeploy
 from tizona.services.general import ListFunctions, GetApi, ListApis
+from tizona.services.loadtest import LoadTest
 
 
 @click.group(
@@ -25,9 +29,18 @@ def service(ctx):
 )
 @click.option('--api')
 @click.option('--project')
+@projects_option
 @common_options
 @pass_state
 def list_functions(state, api, project):
+    projects = resolve_projects(state)
+    if projects:
+        return run_batch(
+            projects,
+            lambda project: ListFunctions(
+                api=api, project=project, state=state
+            ).run()
+        )
     return ListFunctions(api=api, project=project, state=state).run()
 
 
@@ -37,9 +50,16 @@ def list_functions(state, api, project):
     name='list-apis'
 )
 @click.option('--project')
+@projects_option
 @common_options
 @pass_state
 def list_apis(state, project):
+    projects = resolve_projects(state)
+    if projects:
+        return run_batch(
+            projects,
+            lambda project: ListApis(project=project, state=state).run()
+        )
     return ListApis(project=project, state=state).run()
 
 
@@ -65,6 +85,121 @@ def get_api(state, service, project):
     GetApi(project=project, service=service, state=state).run()
 
 
+@service.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+@click.argument('service')
+@click.option('--project')
+@click.option('--filter', 'filter_pattern',
+              help='CloudWatch filter pattern the events must match')
+@click.option('--since', default='10m', show_default=True,
+              help='How far back to start, e.g. 30s, 10m, 2h or 1d')
+@click.option('--follow', '-f', is_flag=True, default=False,
+              help='Keep printing new events as they come in')
+@common_options
+@pass_state
+def logs(state, service, project, filter_pattern, since, follow):
+    Logs(project=project, service=service, filter_pattern=filter_pattern,
+         since=since, follow=follow, state=state).run()
+
+
+@service.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+@click.argument('service')
+@click.option('--project')
+@click.option('--since', default='1h', show_default=True,
+              help='Period the metrics cover, e.g. 30m, 6h or 1d')
+@common_options
+@pass_state
+def metrics(state, service, project, since):
+    """
+    Shows the metrics of the functions of SERVICE. Metrics fetched less than
+    metrics_ttl seconds ago, a minute by default, are reused from
+    .tizona/cache/metrics.
+    """
+    Metrics(project=project, service=service, since=since, state=state).run()
+
+
+@service.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+@click.argument('service')
+@click.option('--project')
+@click.option('--url', help='Base url to send the requests to instead of '
+                            'the API\'s, e.g. a local server. The routes '
+                            'still come from the deployed API')
+@click.option('--duration', default='30s', show_default=True,
+              help='How long to send requests for, e.g. 30s or 5m')
+@click.option('--concurrency', default=10, show_default=True,
+              help='Clients sending requests, or requests in flight with '
+                   '--rate')
+@click.option('--rate', type=float,
+              help='Requests started per second, whatever the responses take')
+@click.option('--method', 'methods', multiple=True, default=['GET'],
+              show_default=True, help='Methods of the routes to test')
+@click.option('--param', 'params', multiple=True,
+              help='Value of a path parameter, e.g. --param id=42')
+@click.option('--header', 'headers', multiple=True,
+              help='Header sent with every request, e.g. '
+                   '--header "Authorization: Bearer ..."')
+@click.option('--timeout', default=10.0, show_default=True,
+              help='Seconds before a request counts as failed')
+@common_options
+@pass_state
+def loadtest(state, service, project, url, duration, concurrency, rate,
+             methods, params, headers, timeout):
+    LoadTest(project=project, service=service, url=url, duration=duration,
+             concurrency=concurrency, rate=rate, methods=methods,
+             params=params, headers=headers, timeout=timeout,
+             state=state).run()
+
+
+@service.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+@click.argument('service')
+@click.option('--project')
+@click.option('--lambda-handler', required=True,
+              help='Handler to benchmark, e.g. app.handler')
+@click.option('--event', 'events', type=click.Path(exists=True),
+              help='JSON file with a sample event, or a list of them')
+@click.option('--runs', default=100, show_default=True,
+              type=click.IntRange(0),
+              help='Warm invocations per cold start')
+@click.option('--cold-starts', default=3, show_default=True,
+              type=click.IntRange(1),
+              help='Fresh interpreters the handler is imported in')
+@click.option('--memory', default=128, show_default=True,
+              help='Memory reported by the context, in MB')
+@click.option('--timeout', default=30, show_default=True,
+              help='Timeout reported by the context, in seconds')
+@click.option('--python', help='Interpreter to run the handler with, the '
+                               'service\'s virtualenv by default')
+@click.option('--cprofile', type=click.Path(),
+              help='Write cProfile stats of the warm invocations here')
+@click.option('--flamegraph', type=click.Path(),
+              help='Write folded stacks of the warm invocations here')
+@click.option('--max-cold-ms', type=float,
+              help='Fail when import and first invocation take longer')
+@click.option('--max-p99-ms', type=float,
+              help='Fail when the warm p99 latency is higher')
+@common_options
+@pass_state
+def bench(state, service, project, lambda_handler, events, runs, cold_starts,
+          memory, timeout, python, cprofile, flamegraph, max_cold_ms,
+          max_p99_ms):
+    Bench(project=project, service=service, lambda_handler=lambda_handler,
+          events=events, runs=runs, cold_starts=cold_starts, memory=memory,
+          timeout=timeout, python=python, profile=cprofile,
+          flamegraph=flamegraph, max_cold_ms=max_cold_ms,
+          max_p99_ms=max_p99_ms, state=state).run()
+
+
 @service.command(
     cls=HelpColorsCommand,
     help_options_color='green',
@@ -82,14 +217,31 @@ def get_deployments():
     cls=HelpColorsCommand,
     help_options_color='green',
 )
-@click.argument('service')
+@click.argument('services', nargs=-1)
 @click.option('--project')
 @click.option('--lambda-function')
+@click.option('--all', 'all_services', is_flag=True, default=False,
+              help='Build every service of the services mapping of '
+                   '.tizona.yaml')
+@click.option('--jobs', type=int,
+              help='Services built at the same time, the number of CPUs by '
+                   'default')
+@click.option('--no-cache', is_flag=True, default=False,
+              help='Package the dependencies straight from the virtualenv '
+                   'instead of the dependency cache of .tizona/cache')
 @common_options
 @pass_state
-def build(state, service, project, lambda_function):
-    return Build(project=project, service=service,
-                 lambda_function=lambda_function, state=state).run()
+def build(state, services, project, lambda_function, all_services, jobs,
+          no_cache):
+    if not services and not all_services:
+        raise ClickException('You must specify either services or --all')
+    if len(set(services)) == 1 and not all_services:
+        return Build(project=project, service=services[0],
+                     lambda_function=lambda_function, no_cache=no_cache,
+                     state=state).run()
+    return BuildServices(project=project, services=services,
+                         all_services=all_services, jobs=jobs,
+                         no_cache=no_cache, state=state).run()
 
 
 @service.command(
@@ -129,14 +281,31 @@ def rollback():
 @click.option('--commit', help='Commit to be deployed. A packaged version of '
                                'the code under this commit must exist in s3')
 @click.option('--lambda-handler', help='Path to the execution file')
+@projects_option
 @common_options
 @pass_state
 def deploy(state, service, project, lambda_function, local, commit, lambda_handler):  # noqa: E501
     if not local and not commit:
         raise ClickException('You must specify either local or commit')
+    projects = resolve_projects(state)
+    if local and not projects:
+        return LocalDeploy(
+            service=service, project=project,
+            lambda_function=lambda_function, state=state
+        ).run()
     if local:
-        commit = Build(project=project, service=service,
+        # The package doesn't depend on the project, so in batch mode it is
+        # built once and deployed to every project
+        commit = Build(project=projects[0], service=service,
                        lambda_function=lambda_function, state=state).run()
+    if projects:
+        return run_batch(
+            projects,
+            lambda project: Deploy(
+                service=service, project=project,
+                lambda_function=lambda_function, commit=commit, state=state
+            ).run()
+        )
     return Deploy(
         service=service, project=project, lambda_function=lambda_function,
         commit=commit, state=state
@@ -1,7 +1,9 @@
 import click
 from click_help_colors import HelpColorsGroup
 
+from tizona.scripts.artifacts_cli import artifacts
 from tizona.scripts.aws_cli import aws
+from tizona.scripts.daemon_cli import daemon
 from tizona.scripts.service_cli import service
 from tizona.scripts.ui_cli import ui
 
@@ -15,6 +17,8 @@ def cli():
     pass
 
 
+cli.add_command(artifacts)
 cli.add_command(aws)
+cli.add_command(daemon)
 cli.add_command(service)
 cli.add_command(ui)
@@ -1,8 +1,9 @@
 import click
 from click_help_colors import HelpColorsGroup, HelpColorsCommand
 
+from tizona.aws.s3 import ENCODINGS
 from tizona.decorators import common_options, pass_state
-from tizona.ui.deploy import Build, Deploy
+from tizona.ui.deploy import Build, Deploy, Rollback
 
 
 @click.group(
@@ -19,10 +20,12 @@ def ui():
     help_options_color='green'
 )
 @click.option('--project')
+@click.option('--force', is_flag=True,
+              help='Install and build even if nothing changed')
 @common_options
 @pass_state
-def build(state, project):
-    return Build(project=project, state=state).run()
+def build(state, project, force):
+    return Build(project=project, force=force, state=state).run()
 
 
 @ui.command(
@@ -30,7 +33,30 @@ def build(state, project):
     help_options_color='green'
 )
 @click.option('--project')
+@click.option('--compress', type=click.Choice(ENCODINGS),
+              help='Compress text assets before uploading them')
+@click.option('--wait', is_flag=True,
+              help='Wait for the CloudFront invalidation to complete')
 @common_options
 @pass_state
-def deploy(state, project):
-    return Deploy(project=project, state=state).run()
+def deploy(state, project, compress, wait):
+    return Deploy(project=project, compress=compress, wait=wait,
+                  state=state).run()
+
+
+@ui.command(
+    cls=HelpColorsCommand,
+    help_options_color='green'
+)
+@click.option('--project')
+@click.option('--to', help='Commit of the release to roll back to, by '
+                           'default the one before the current release')
+@click.option('--list', 'list_releases', is_flag=True,
+              help='List the releases that can be rolled back to')
+@click.option('--wait', is_flag=True,
+              help='Wait for the CloudFront invalidation to complete')
+@common_options
+@pass_state
+def rollback(state, project, to, list_releases, wait):
+    return Rollback(project=project, to=to, list_releases=list_releases,
+                    wait=wait, state=state).run()
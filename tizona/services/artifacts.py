@@ -0,0 +1,323 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import click
+from botocore.exceptions import ClientError
+from click import ClickException
+from humanize import naturalsize
+from tabulate import tabulate
+
+from tizona.core import AWSCommand
+
+DEFAULT_ARTIFACTS_BUCKET = 'indago-map'
+# Holds an index object per project and service, e.g.
+# `.tizona/artifacts/indago/payments.json`
+ARTIFACTS_INDEX_PREFIX = '.tizona/artifacts'
+# The most keys a single DeleteObjects request accepts
+MAX_DELETE_KEYS = 1000
+# Times an update of an index is tried while other commands keep writing it
+MAX_INDEX_ATTEMPTS = 5
+# What S3 answers a conditional write of an object that changed since
+CONFLICT_ERRORS = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+
+def get_artifacts_bucket(tizona_config):
+    return tizona_config.get('artifacts_bucket', DEFAULT_ARTIFACTS_BUCKET)
+
+
+def get_artifact_key(service, hexsha):
+    return f'{service}/{hexsha}.zip'
+
+
+def get_retained(artifacts, keep, cutoff):
+    """
+    Returns the commits of an index whose artifacts are still needed: the
+    live one, the `keep` newest ones and those built or deployed after
+    `cutoff`.
+    """
+    newest = sorted(
+        artifacts, key=lambda hexsha: artifacts[hexsha]['built_at'],
+        reverse=True
+    )[:keep]
+    return {
+        hexsha for hexsha, entry in artifacts.items()
+        if entry['deployed'] or hexsha in newest or
+        entry['built_at'] >= cutoff or entry.get('deployed_at', '') >= cutoff
+    }
+
+
+class ArtifactIndex:
+    """
+    Records the packages built for a service and where they have been
+    deployed within a project, so that finding them doesn't need a listing
+    of the bucket. Entries are keyed by commit and hold the key, size and
+    sha256 of the package, when it was built and when it was last deployed.
+    The entry deployed last is the one marked as `deployed`.
+
+    Builds and deploys of the same service may run at the same time, e.g.
+    in separate CI jobs, so the index is only written if it hasn't changed
+    since it was read, and a change that lost the race is applied again to
+    the index as the other command left it.
+    """
+
+    def __init__(self, s3, bucket, project, service):
+        self.s3 = s3
+        self.bucket = bucket
+        self.project = project
+        self.service = service
+        self.key = f'{ARTIFACTS_INDEX_PREFIX}/{project}/{service}.json'
+        self.artifacts = None
+        # ETag of the index as it was read, None when there was none
+        self.etag = None
+
+    def load(self):
+        if self.artifacts is None:
+            self.artifacts, self.etag = self.read_key(self.key)
+        return self.artifacts
+
+    def read_key(self, key):
+        """
+        Returns the artifacts of the index under `key` and its ETag.
+        """
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return {}, None
+            raise
+        return json.loads(response['Body'].read())['artifacts'], \
+            response['ETag']
+
+    def load_key(self, key):
+        return self.read_key(key)[0]
+
+    def save(self):
+        """
+        Writes the index, unless it changed since it was read, in which case
+        S3 rejects the write with one of `CONFLICT_ERRORS`.
+        """
+        if self.etag is None:
+            condition = {'IfNoneMatch': '*'}
+        else:
+            condition = {'IfMatch': self.etag}
+        response = self.s3.put_object(
+            Bucket=self.bucket, Key=self.key,
+            Body=json.dumps({'artifacts': self.artifacts}, indent=2).encode(),
+            ContentType='application/json', **condition
+        )
+        self.etag = response['ETag']
+
+    def update(self, change):
+        """
+        Calls `change` with the artifacts and saves them. When another
+        command wrote the index in the meantime, it is read again and
+        `change` applied to what that command left.
+        """
+        for _ in range(MAX_INDEX_ATTEMPTS):
+            change(self.load())
+            try:
+                self.save()
+                return
+            except ClientError as error:
+                if error.response['Error']['Code'] not in CONFLICT_ERRORS:
+                    raise
+            self.artifacts = None
+        raise ClickException(
+            f'Could not update {self.key}, other commands kept changing it'
+        )
+
+    def get(self, hexsha):
+        return self.load().get(hexsha)
+
+    def record_build(self, hexsha, key, size, content_hash):
+        built_at = datetime.now(timezone.utc).isoformat()
+
+        def change(artifacts):
+            entry = artifacts.setdefault(hexsha, {'deployed': False})
+            entry.update({
+                'key': key,
+                'size': size,
+                'sha256': content_hash,
+                'built_at': built_at,
+            })
+        self.update(change)
+
+    def record_deployment(self, hexsha, key):
+        """
+        Marks `hexsha` as the artifact deployed in the project. Packages
+        built once and deployed to several projects are only recorded in
+        the index of the project they were built for, so the entry is
+        filled in from the object itself when it is missing.
+        """
+        deployed_at = datetime.now(timezone.utc).isoformat()
+
+        def change(artifacts):
+            if hexsha not in artifacts:
+                response = self.s3.head_object(Bucket=self.bucket, Key=key)
+                artifacts[hexsha] = {
+                    'key': key,
+                    'size': response['ContentLength'],
+                    'sha256': response.get('Metadata', {}).get('sha256'),
+                    'built_at': response['LastModified'].isoformat(),
+                }
+            for entry in artifacts.values():
+                entry['deployed'] = False
+            artifacts[hexsha].update({
+                'deployed': True,
+                'deployed_at': deployed_at,
+            })
+        self.update(change)
+
+    def forget(self, hexshas):
+        """
+        Drops the entries of `hexshas` from the index.
+        """
+        def change(artifacts):
+            for hexsha in hexshas:
+                artifacts.pop(hexsha, None)
+        self.update(change)
+
+    def load_referenced_keys(self, keep, cutoff):
+        """
+        Returns the keys the indexes of the service in the other projects,
+        which share the packages of the service, still need by the same
+        rule as `get_retained`. Entries those projects would collect
+        themselves don't keep a package alive.
+        """
+        paginator = self.s3.get_paginator('list_objects_v2')
+        keys = set()
+        for page in paginator.paginate(Bucket=self.bucket,
+                                       Prefix=f'{ARTIFACTS_INDEX_PREFIX}/'):
+            for index_object in page.get('Contents', []):
+                if index_object['Key'] == self.key or \
+                        not index_object['Key'].endswith(f'/{self.service}.json'):  # noqa: E501
+                    continue
+                artifacts = self.load_key(index_object['Key'])
+                keys.update(
+                    artifacts[hexsha]['key']
+                    for hexsha in get_retained(artifacts, keep, cutoff)
+                )
+        return keys
+
+
+class Artifacts(AWSCommand):
+    def __init__(self, project, service, *args, **kwargs):
+        self.project = project
+        self.service = service
+        super(Artifacts, self).__init__(*args, **kwargs)
+        self.s3 = self.client('s3')
+        self.bucket = get_artifacts_bucket(self.tizona_config)
+        self.index = ArtifactIndex(
+            self.s3, self.bucket, self.project, self.service
+        )
+
+
+class ListArtifacts(Artifacts):
+    def __init__(self, project, service, *args, **kwargs):
+        super(ListArtifacts, self).__init__(project, service, *args, **kwargs)
+
+    def run(self):
+        artifacts = self.index.load()
+        if not artifacts:
+            raise ClickException(
+                f'No artifacts recorded for {self.service} in {self.project}'
+            )
+        click.echo(tabulate(
+            sorted(
+                ([hexsha[:12], entry['built_at'], naturalsize(entry['size']),
+                  entry.get('deployed_at', ''),
+                  '*' if entry['deployed'] else '']
+                 for hexsha, entry in artifacts.items()),
+                key=lambda row: row[1], reverse=True
+            ),
+            headers=['Commit', 'Built', 'Size', 'Deployed', 'Live'],
+            disable_numparse=True
+        ))
+
+
+class CollectGarbage(Artifacts):
+    """
+    Deletes the artifacts of a service that nothing needs anymore. The live
+    artifact, the `keep` newest ones and those built or deployed in the last
+    `max_age_days` days are kept, as is anything the index of another
+    project keeps by the same rule. The rest are deleted in batches of up to
+    1000 keys, concurrently, and dropped from the index.
+
+    Only indexed packages are collected: those uploaded to the root of the
+    bucket before the index existed are never deleted, unless a deploy has
+    since recorded them.
+    """
+
+    def __init__(self, project, service, keep=10, max_age_days=30,
+                 dry_run=False, *args, **kwargs):
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self.dry_run = dry_run
+        super(CollectGarbage, self).__init__(project, service, *args, **kwargs)
+
+    def find_garbage(self):
+        artifacts = self.index.load()
+        cutoff = (
+            datetime.now(timezone.utc) - timedelta(days=self.max_age_days)
+        ).isoformat()
+        retained = get_retained(artifacts, self.keep, cutoff)
+        referenced = self.index.load_referenced_keys(self.keep, cutoff)
+        return [
+            hexsha for hexsha, entry in artifacts.items()
+            if hexsha not in retained and entry['key'] not in referenced
+        ]
+
+    async def delete_async(self, keys):
+        """
+        Returns the keys that couldn't be deleted, with the reason.
+        """
+        responses = await self.engine.gather([
+            self.engine.call(
+                self.s3.delete_objects, Bucket=self.bucket,
+                Delete={
+                    'Objects': [
+                        {'Key': key}
+                        for key in keys[start:start + MAX_DELETE_KEYS]
+                    ],
+                    'Quiet': True,
+                }
+            )
+            for start in range(0, len(keys), MAX_DELETE_KEYS)
+        ])
+        return {
+            error['Key']: error['Message']
+            for response in responses
+            for error in response.get('Errors', [])
+        }
+
+    def run(self):
+        garbage = self.find_garbage()
+        if not garbage:
+            click.secho('Nothing to delete', fg='green')
+            return
+        artifacts = self.index.artifacts
+        if self.dry_run:
+            for hexsha in garbage:
+                click.echo(artifacts[hexsha]['key'])
+            size = sum(artifacts[hexsha]['size'] for hexsha in garbage)
+            click.secho(
+                f'Would delete {len(garbage)} artifacts ({naturalsize(size)})',
+                fg='yellow'
+            )
+            return
+        failed = self.engine.run(self.delete_async(
+            [artifacts[hexsha]['key'] for hexsha in garbage]
+        ))
+        for key, reason in failed.items():
+            click.secho(f'Could not delete {key}: {reason}', fg='red')
+        deleted = [
+            hexsha for hexsha in garbage
+            if artifacts[hexsha]['key'] not in failed
+        ]
+        size = sum(artifacts[hexsha]['size'] for hexsha in deleted)
+        self.index.forget(deleted)
+        click.secho(
+            f'Deleted {len(deleted)} of {len(garbage)} artifacts '
+            f'({naturalsize(size)})',
+            fg='yellow' if failed else 'green'
+        )
@@ -0,0 +1,187 @@
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import click
+import delegator
+from click import ClickException
+from tabulate import tabulate
+
+from tizona.aws.s3 import hash_file
+from tizona.core import TizonaCommand
+from tizona.services.build import (
+    fill_dependency_cache, get_service_dir, resolve_dependencies
+)
+from tizona.services.loadtest import PERCENTILES, percentile
+
+BENCH_RUNNER = Path(__file__).parent / 'bench_runner.py'
+
+
+class Bench(TizonaCommand):
+    """
+    Measures a lambda handler locally, from the same sources and cached
+    dependencies a build packages. Every cold start is a fresh interpreter
+    running `bench_runner.py`, which times the import of the handler apart
+    from its first invocation and from `runs` warm invocations with the
+    sample events. Cold start figures are the median over `cold_starts`
+    interpreters, and warm latencies are pooled from all of them.
+    """
+
+    def __init__(self, project, service, lambda_handler, events=None,
+                 runs=100, cold_starts=3, memory=128, timeout=30,
+                 python=None, profile=None, flamegraph=None,
+                 max_cold_ms=None, max_p99_ms=None, *args, **kwargs):
+        self.project = project
+        self.service = service
+        self.lambda_handler = lambda_handler
+        self.events = events
+        self.runs = runs
+        self.cold_starts = cold_starts
+        self.memory = memory
+        self.timeout = timeout
+        self.python = python
+        self.profile = profile
+        self.flamegraph = flamegraph
+        self.max_cold_ms = max_cold_ms
+        self.max_p99_ms = max_p99_ms
+        super(Bench, self).__init__(*args, **kwargs)
+        self.service_dir = get_service_dir(self.tizona_config, service)
+
+    def load_events(self):
+        """
+        Returns the sample events, which the file holds either as a single
+        event or as a list the invocations go through in turn.
+        """
+        if self.events is None:
+            return [{}]
+        events = json.loads(Path(self.events).read_text())
+        events = events if isinstance(events, list) else [events]
+        if not events:
+            raise ClickException(f'{self.events} has no events')
+        return events
+
+    def get_paths(self):
+        """
+        Returns the directories the handler is imported from: the sources
+        first, then the dependencies.
+        """
+        paths = [self.service_dir / 'src']
+        lockfile = self.service_dir / 'Pipfile.lock'
+        if lockfile.is_file():
+            paths.append(fill_dependency_cache(
+                *resolve_dependencies(self.service_dir, hash_file(lockfile))
+            ))
+        return [path.as_posix() for path in paths]
+
+    def resolve_python(self):
+        """
+        The dependencies are those of the service's virtualenv, so they are
+        loaded with its interpreter when there is one.
+        """
+        if self.python:
+            return self.python
+        output = delegator.run('pipenv --py', cwd=self.service_dir)
+        if output.return_code == 0 and output.out.strip():
+            return output.out.strip()
+        return sys.executable
+
+    def run_cold_start(self, python, config, directory, index):
+        config_path = Path(directory) / f'config-{index}.json'
+        results_path = Path(directory) / f'results-{index}.json'
+        config_path.write_text(json.dumps(config))
+        process = subprocess.run(
+            [python, '-I', BENCH_RUNNER.as_posix(), config_path.as_posix(),
+             results_path.as_posix()],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        if process.returncode != 0:
+            raise ClickException(
+                f'Benchmarking {self.lambda_handler} failed:\n'
+                f'{process.stderr[-2000:]}'
+            )
+        return json.loads(results_path.read_text())
+
+    def run(self):
+        python = self.resolve_python()
+        config = {
+            'paths': self.get_paths(),
+            'handler': self.lambda_handler,
+            'function_name': self.service,
+            'events': self.load_events(),
+            'runs': self.runs,
+            'memory': self.memory,
+            'timeout': self.timeout,
+        }
+        click.secho(
+            f'Benchmarking {self.lambda_handler} with {self.cold_starts} '
+            f'cold starts of {self.runs} invocations...', fg='green'
+        )
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for index in range(self.cold_starts):
+                # Profiling only runs in the first interpreter
+                profile_config = dict(config)
+                if index == 0:
+                    profile_config['profile'] = self.profile
+                    profile_config['flamegraph'] = self.flamegraph
+                results.append(
+                    self.run_cold_start(python, profile_config, directory, index)  # noqa: E501
+                )
+        self.echo_results(results)
+
+    def echo_results(self, results):
+        import_ms = statistics.median(result['import'] for result in results) * 1000  # noqa: E501
+        first_ms = statistics.median(result['first'] for result in results) * 1000  # noqa: E501
+        warm = sorted(
+            latency * 1000 for result in results for latency in result['warm']
+        )
+        table = [
+            ['Cold import', import_ms],
+            ['First invocation', first_ms],
+        ]
+        if warm:
+            table += [
+                [f'Warm p{percent}', percentile(warm, percent)]
+                for percent in PERCENTILES
+            ]
+            table += [
+                ['Warm mean', statistics.mean(warm)],
+                ['Warm max', warm[-1]],
+            ]
+        click.echo(tabulate(table, headers=['', 'Time (ms)'], floatfmt='.2f'))
+        click.secho(
+            f'{results[0]["modules"]} modules imported by the handler',
+            fg='green'
+        )
+        errors = sum(result['errors'] for result in results)
+        if errors:
+            click.secho(
+                f'{errors} invocations failed, the first with:\n'
+                f'{next(result["traceback"] for result in results if result["errors"])}',  # noqa: E501
+                fg='red'
+            )
+        if self.profile:
+            click.secho(
+                f'cProfile stats written to {self.profile}, e.g. '
+                f'python -m pstats {self.profile}', fg='green'
+            )
+        if self.flamegraph:
+            click.secho(
+                f'Folded stacks written to {self.flamegraph}, e.g. '
+                f'flamegraph.pl {self.flamegraph} > flamegraph.svg',
+                fg='green'
+            )
+        regressions = []
+        if self.max_cold_ms is not None and import_ms + first_ms > self.max_cold_ms:  # noqa: E501
+            regressions.append(
+                f'cold start {import_ms + first_ms:.1f}ms over {self.max_cold_ms}ms'  # noqa: E501
+            )
+        if self.max_p99_ms is not None and warm and \
+                percentile(warm, 99) > self.max_p99_ms:
+            regressions.append(f'warm p99 over {self.max_p99_ms}ms')
+        if regressions:
+            raise ClickException(', '.join(regressions))
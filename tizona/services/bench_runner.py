@@ -0,0 +1,130 @@
+"""
+Benchmarks a lambda handler inside the fresh interpreter `tizona service
+bench` starts for it. Only the standard library is imported before the
+handler, so the import time measured is the handler's own, as on a cold
+start.
+
+    python -I bench_runner.py <config.json> <results.json>
+"""
+import cProfile
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+import uuid
+from collections import Counter
+
+
+class LambdaContext:
+    def __init__(self, function_name, memory_limit_in_mb, timeout):
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.invoked_function_arn = f'arn:aws:lambda:local:000000000000:function:{function_name}'  # noqa: E501
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = f'/aws/lambda/{function_name}'
+        self.log_stream_name = 'bench'
+        self.deadline = time.time() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.time()) * 1000))
+
+
+class StackProfiler:
+    """
+    Records the time spent in every call stack, in the folded format
+    flamegraph.pl and speedscope read: one line per stack, with the frames
+    separated by semicolons and followed by the microseconds spent in it.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.times = Counter()
+        self.last = time.perf_counter()
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if self.stack:
+            self.times[';'.join(self.stack)] += now - self.last
+        if event == 'call':
+            code = frame.f_code
+            self.stack.append(
+                f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+            )
+        elif event == 'c_call':
+            self.stack.append(getattr(arg, '__qualname__', repr(arg)))
+        elif self.stack:
+            self.stack.pop()
+        self.last = time.perf_counter()
+
+    def write(self, path):
+        with open(path, 'w') as folded:
+            for stack, seconds in self.times.items():
+                if int(seconds * 1e6):
+                    folded.write(f'{stack} {int(seconds * 1e6)}\n')
+
+
+def invoke(handler, event, context, results):
+    started = time.perf_counter()
+    try:
+        handler(event, context)
+    except Exception:
+        results['errors'] += 1
+        results.setdefault('traceback', traceback.format_exc())
+    return time.perf_counter() - started
+
+
+def main():
+    # -I keeps this script's directory out of sys.path, but stay safe in
+    # case it is started without it
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if sys.path and os.path.abspath(sys.path[0] or '.') == script_dir:
+        del sys.path[0]
+    with open(sys.argv[1]) as config_file:
+        config = json.load(config_file)
+    sys.path[:0] = config['paths']
+    module_name, function_name = config['handler'].rsplit('.', 1)
+    results = {'errors': 0}
+    modules = len(sys.modules)
+
+    started = time.perf_counter()
+    handler = getattr(importlib.import_module(module_name), function_name)
+    results['import'] = time.perf_counter() - started
+    results['modules'] = len(sys.modules) - modules
+
+    events = config['events']
+
+    def context():
+        return LambdaContext(
+            config['function_name'], config['memory'], config['timeout']
+        )
+    results['first'] = invoke(handler, events[0], context(), results)
+    results['warm'] = [
+        invoke(handler, events[index % len(events)], context(), results)
+        for index in range(config['runs'])
+    ]
+    # The profiled runs are extra, so that profiling doesn't skew the
+    # timings above
+    profiled_results = {'errors': 0}
+    if config.get('profile'):
+        profile = cProfile.Profile()
+        profile.enable()
+        for index in range(config['runs']):
+            invoke(handler, events[index % len(events)], context(), profiled_results)  # noqa: E501
+        profile.disable()
+        profile.dump_stats(config['profile'])
+    if config.get('flamegraph'):
+        profiler = StackProfiler()
+        sys.setprofile(profiler)
+        for index in range(config['runs']):
+            invoke(handler, events[index % len(events)], context(), profiled_results)  # noqa: E501
+        sys.setprofile(None)
+        profiler.write(config['flamegraph'])
+    with open(sys.argv[2], 'w') as results_file:
+        json.dump(results, results_file)
+
+
+if __name__ == '__main__':
+    main()
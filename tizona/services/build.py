@@ -1,143 +1,267 @@
+import asyncio
+import hashlib
 import os
 import re
 import shutil
 import tempfile
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from distutils.dir_util import copy_tree
 from pathlib import Path
 
 import click
 import click_spinner
 import delegator
-from git import Repo
+from click import ClickException
+from humanize import naturalsize
+from tabulate import tabulate
 
+from tizona import profiling
+from tizona.aws.s3 import hash_file
 from tizona.exceptions import BuildError
+from tizona.services.artifacts import (
+    ArtifactIndex, get_artifact_key, get_artifacts_bucket
+)
 from tizona.services.general import Service
+from tizona.vcs import GitMetadata
+
+# Holds the site-packages the services were built with, under the key
+# given by get_dependencies_key
+DEPENDENCIES_CACHE_PATH = Path('.tizona') / 'cache' / 'dependencies'
+# Entries no build used for this long are removed
+DEPENDENCIES_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+
+def get_service_dir(tizona_config, service):
+    """
+    Returns the directory of the service, given by the `services` mapping
+    of `.tizona.yaml`:
+
+        services:
+          payments:
+            path: services/payments
+
+    Services missing from the mapping are built from the cwd.
+    """
+    services = tizona_config.get('services') or {}
+    if service not in services:
+        return Path.cwd()
+    return (Path.cwd() / (services[service] or {}).get('path', service)).absolute()  # noqa: E501
+
+
+def resolve_site_packages_dir(service_dir):
+    pipenv_dir = delegator.run('pipenv --venv', cwd=service_dir).out.strip()
+    # The following returns a string of the sort `Python 3.6.6`
+    python_version = delegator.run(
+        '`pipenv --py` --version', cwd=service_dir
+    ).out.strip()
+    # The regex below takes `3.6` from `Python 3.6.6`
+    python_dir = 'python' + re.search(r'\d\.\d+', python_version).group(0)
+    return Path(pipenv_dir) / 'lib' / python_dir / 'site-packages'
+
+
+def get_dependencies_key(site_packages_dir, lockfile_hash):
+    """
+    Returns the key of the cache entry of a virtualenv's site-packages: a
+    hash of the lockfile, the python version and the path, size and mtime
+    of every installed file, so that an entry isn't reused once packages
+    are installed, upgraded or removed without updating the lockfile.
+    """
+    digest = hashlib.sha256()
+    digest.update(lockfile_hash.encode())
+    # The name of the parent, e.g. `python3.6`, gives the python version
+    digest.update(site_packages_dir.parent.name.encode())
+    for root, dirs, files in os.walk(site_packages_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = Path(root) / name
+            stat = path.stat()
+            digest.update(
+                f'{path.relative_to(site_packages_dir).as_posix()}:'
+                f'{stat.st_size}:{stat.st_mtime_ns}\n'.encode()
+            )
+    return digest.hexdigest()
+
+
+def resolve_dependencies(service_dir, lockfile_hash):
+    """
+    Returns the site-packages of the service's virtualenv and the key of
+    its cache entry.
+    """
+    site_packages_dir = resolve_site_packages_dir(service_dir)
+    return site_packages_dir, get_dependencies_key(
+        site_packages_dir, lockfile_hash
+    )
+
+
+def fill_dependency_cache(site_packages_dir, dependencies_key):
+    """
+    Copies the site-packages of a virtualenv to its cache entry, unless
+    another build already did, and returns the entry. The copy is moved
+    into place once complete, so that builds running at the same time
+    never see a partial entry.
+    """
+    cache_dir = DEPENDENCIES_CACHE_PATH.absolute() / dependencies_key
+    if cache_dir.is_dir():
+        # Marks the entry as used for prune_dependency_cache
+        os.utime(cache_dir)
+        return cache_dir
+    prune_dependency_cache()
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=cache_dir.parent, prefix='.staging-')
+    copy_tree(site_packages_dir.as_posix(), staging_dir)
+    try:
+        os.rename(staging_dir, cache_dir)
+    except OSError:
+        # Another build filled it in the meantime
+        shutil.rmtree(staging_dir)
+    return cache_dir
+
+
+def prune_dependency_cache(max_age=DEPENDENCIES_CACHE_MAX_AGE):
+    """
+    Removes the cache entries, and the copies of interrupted builds, that
+    weren't used for `max_age` seconds.
+    """
+    if not DEPENDENCIES_CACHE_PATH.is_dir():
+        return
+    cutoff = time.time() - max_age
+    for entry in DEPENDENCIES_CACHE_PATH.iterdir():
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def package_service(src_dir, dependencies_dir, zip_path):
+    """
+    Zips the dependencies and the sources side by side at the root of the
+    package, the sources winning when both have a file, and returns the
+    size and sha256 of the package.
+    """
+    sources = {
+        path.relative_to(src_dir).as_posix(): path
+        for path in Path(src_dir).rglob('*') if path.is_file()
+    }
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as package:
+        if dependencies_dir is not None:
+            for path in sorted(Path(dependencies_dir).rglob('*')):
+                name = path.relative_to(dependencies_dir).as_posix()
+                if path.is_file() and name not in sources:
+                    package.write(path, name)
+        for name, path in sorted(sources.items()):
+            package.write(path, name)
+    return zip_path.stat().st_size, hash_file(zip_path)
+
+
+def build_service(src_dir, dependencies_dir, zip_path):
+    """
+    Builds the package of a service in a worker process, and returns the
+    size and sha256 of the package and the seconds it took.
+    """
+    started = time.perf_counter()
+    size, content_hash = package_service(src_dir, dependencies_dir, zip_path)
+    return size, content_hash, time.perf_counter() - started
 
 
 class Build(Service):
-    def __init__(self, project, service, lambda_function, *args, **kwargs):
+    def __init__(self, project, service, lambda_function, no_cache=False,
+                 *args, **kwargs):
         self.lambda_function = lambda_function
-        self.bucket = 'indago-map'
+        self.no_cache = no_cache
         self.project = project
         self.service = service
-        self.dist_dir = Path.cwd() / 'dist'
-        self.src_dir = Path.cwd() / 'src'
-        self.repo = Repo()
-        self.current_hexsha = self.repo.head.object.hexsha
-        self.untracked_files = self.repo.untracked_files
         super(Build, self).__init__(project, *args, **kwargs)
+        self.service_dir = get_service_dir(self.tizona_config, service)
+        self.src_dir = self.service_dir / 'src'
+        self.lockfile = self.service_dir / 'Pipfile.lock'
+        self.git = GitMetadata(self.service_dir)
+        self.current_hexsha = self.git.head_hexsha
+        self.bucket = get_artifacts_bucket(self.tizona_config)
+        self.artifact_key = get_artifact_key(service, self.current_hexsha)
 
     def run(self):
         # we need option for whether to install dependencies
         with tempfile.TemporaryDirectory() as tmpdirname:
             # self.check_files_committed()
-            # self.make_dist_dir()
             # self.install_dependencies()
             # self.clean_dependencies()
-            self.copy_dependencies()
-            self.copy_src()
-            self.make_zip(tmpdirname)
-            self.upload_s3(tmpdirname)
+            zip_path = Path(tmpdirname) / self.current_hexsha
+            click.secho('Building zip...', fg='green')
+            with click_spinner.spinner():
+                with profiling.phase('copy'):
+                    dependencies_dir = self.get_dependencies_dir()
+                with profiling.phase('zip'):
+                    size, content_hash = package_service(
+                        self.src_dir, dependencies_dir, zip_path
+                    )
+            with profiling.phase('upload'):
+                click.secho('Uploading to s3...', fg='green')
+                with click_spinner.spinner():
+                    self.upload_s3(zip_path, size, content_hash)
         click.secho(
-            f'https://s3-eu-west-1.amazonaws.com/indago-map/{self.current_hexsha}',
+            f'https://s3-{self.aws_region}.amazonaws.com/{self.bucket}/{self.artifact_key}',  # noqa: E501
             fg='green'
         )
         return self.current_hexsha
 
-    def make_dist_dir(self):
+    def get_lockfile_hash(self):
+        if self.lockfile.is_file():
+            return hash_file(self.lockfile)
+
+    def get_dependencies_dir(self):
+        lockfile_hash = self.get_lockfile_hash()
+        if lockfile_hash is None:
+            return None
+        if self.no_cache:
+            return resolve_site_packages_dir(self.service_dir)
+        return fill_dependency_cache(
+            *resolve_dependencies(self.service_dir, lockfile_hash)
+        )
+
+    def get_source_paths(self):
         """
-        Creates a directory called `dist` where the build is stored. If the
-        directory already exists, it removes it first along with its contents
-        to make sure we create a fresh new build.
+        Returns the paths the package is built from.
         """
-        if self.dist_dir.exists():
-            click.secho('Removing `dist` directory for fresh build...', fg='green')  # noqa: E501
-            shutil.rmtree(self.dist_dir.as_posix())
-        self.dist_dir.mkdir()
+        return [self.src_dir, self.service_dir / 'Pipfile', self.lockfile]
 
     def check_files_committed(self):
         """
         The deployed build is named after the current commit in the app repo,
-        so we cannot build the app if there are any uncommitted changes. We
-        look for unstaged files and staged but uncommitted files. Untracked
-        files will be ignored during the build.
+        so we cannot build the app if there are any uncommitted changes in
+        the paths it is built from. We look for unstaged files and staged
+        but uncommitted files. Untracked files will be ignored during the
+        build.
         """
-        # staged but uncommitted
-        uncommitted = self.repo.index.diff(self.current_hexsha)
-        # unstaged changes
-        unstaged = self.repo.index.diff(None)
-        if uncommitted or unstaged:
+        changes = self.git.uncommitted_changes(self.get_source_paths())
+        if changes:
             raise BuildError(
                 'There are uncommitted changes in the repo. Please stash or '
-                'commit before starting a new build.'
+                'commit before starting a new build:\n' + '\n'.join(changes)
             )
 
-    @staticmethod
-    def install_dependencies():
+    def install_dependencies(self):
         click.secho('Installing dependencies...', fg='green')
         with click_spinner.spinner():
-            delegator.run('pipenv install')
+            delegator.run('pipenv install', cwd=self.service_dir)
 
     @staticmethod
     def install_lambda_packages():
         pass
 
-    @staticmethod
-    def clean_dependencies():
+    def clean_dependencies(self):
         click.secho('Removing uncommitted dependencies...', fg='green')
         with click_spinner.spinner():
-            delegator.run('pipenv clean')
-
-    def copy_dependencies(self):
-        site_packages_dir = self._resolve_site_packages_dir()
-        click.secho('Copying dependencies...', fg='green')
-        with click_spinner.spinner():
-            copy_tree(site_packages_dir.as_posix(), self.dist_dir.as_posix())
+            delegator.run('pipenv clean', cwd=self.service_dir)
 
-    @staticmethod
-    def _resolve_site_packages_dir():
-        pipenv_dir = delegator.run('pipenv --venv').out.strip()
-        # The following returns a string of the sort `Python 3.6.6`
-        python_version = delegator.run('`pipenv --py` --version').out.strip()
-        # The regex below takes `3.6` from `Python 3.6.6`
-        python_dir = 'python' + re.search(r'\d\.\d', python_version).group(0)
-        site_packages_dir = Path(pipenv_dir) / 'lib' / python_dir / 'site-packages'  # noqa: E501
-        return site_packages_dir
-
-    def copy_src(self):
-        src_dir = Path.cwd() / 'src'
-        click.secho('Copying source...', fg='green')
-        with click_spinner.spinner():
-            copy_tree(src_dir.as_posix(), self.dist_dir.as_posix())
-
-    def zipdir(self, path, ziph):
-        # ziph is zipfile handle
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                path_to_file = Path(root) / file
-                # replace our local path up to the `dist` directory so that such
-                # structure doesn't get reproduced inside the zip file
-                path_for_zip = path_to_file.as_posix().replace(self.dist_dir.as_posix() + '/', '')  # noqa: E501
-                path_for_zip = path_for_zip.replace(self.src_dir.as_posix() + '/', '')  # noqa: E501
-                ziph.write(Path(Path(root) / file).as_posix(), path_for_zip)
-
-    def make_zip(self, tmpdirname):
-        click.secho('Building zip...', fg='green')
-        with click_spinner.spinner():
-            zipf = zipfile.ZipFile(Path(tmpdirname) / self.current_hexsha, 'w', zipfile.ZIP_DEFLATED)  # noqa: E501
-            self.zipdir(self.dist_dir, zipf)
-            zipf.close()
-
-    def upload_s3(self, tmpdirname):
-        s3 = self.aws_session.client('s3')
-        click.secho('Uploading to s3...', fg='green')
-        # import pdb; pdb.set_trace()
-        with click_spinner.spinner():
-            s3.upload_file(
-                Path(Path(tmpdirname) / self.current_hexsha).as_posix(),
-                self.bucket, self.current_hexsha
-            )
+    def upload_s3(self, zip_path, size, content_hash):
+        s3 = self.client('s3')
+        s3.upload_file(
+            zip_path.as_posix(), self.bucket, self.artifact_key,
+            ExtraArgs={'Metadata': {'sha256': content_hash}}
+        )
+        ArtifactIndex(s3, self.bucket, self.project, self.service).record_build(  # noqa: E501
+            self.current_hexsha, self.artifact_key, size, content_hash
+        )
         # tag the object with the name of the user who made the deployment
 
     # def update_lambda_package(self):
@@ -145,7 +269,7 @@ class Build(Service):
     #     # I want to do this through a call to a step function that updates the
     #     # lambda template by pulling config values from a database and runs
     #     # a stack update
-    #     aws_lambda = self.aws_session.client('lambda')
+    #     aws_lambda = self.client('lambda')
     #     click.secho('Updating lambdas...', fg='green')
     #     api_functions = self.list_api_functions(self.service).values()
     #     if self.lambda_function and self.lambda_function in api_functions:
@@ -162,4 +286,98 @@ class Build(Service):
     #         #     s3Key=self.current_hexsha, publish=True
     #         # )
     #         # if response is success, print a success message, else raise an exception
-    #         # click.secho(str(response), fg='yellow')
\ No newline at end of file
+    #         # click.secho(str(response), fg='yellow')
+
+
+class BuildServices(Service):
+    """
+    Builds several services at once. Each service is packaged by a worker
+    process in its own staging directory, and its package is uploaded as
+    soon as it is ready, while the other services are still building.
+    Services whose installed dependencies match share them, and they are
+    copied once into the dependency cache.
+    """
+
+    def __init__(self, project, services, all_services=False, jobs=None,
+                 no_cache=False, *args, **kwargs):
+        self.project = project
+        self.no_cache = no_cache
+        super(BuildServices, self).__init__(project, *args, **kwargs)
+        if all_services:
+            services = list(self.tizona_config.get('services') or {})
+            if not services:
+                raise ClickException(
+                    'No services mapping found in .tizona.yaml'
+                )
+        self.jobs = jobs or os.cpu_count()
+        # A service named twice is built once
+        self.builds = [
+            Build(self.project, service, None, no_cache, *args, **kwargs)
+            for service in dict.fromkeys(services)
+        ]
+
+    async def build_async(self, executor, build, staging_dir, dependencies):
+        """
+        Builds and uploads a service, and returns a row of the summary.
+        """
+        lockfile_hash = build.get_lockfile_hash()
+        dependencies_dir = None
+        if lockfile_hash is not None:
+            site_packages_dir, key = await asyncio.wrap_future(
+                executor.submit(
+                    resolve_dependencies, build.service_dir, lockfile_hash
+                )
+            )
+            dependencies_dir = site_packages_dir
+        if lockfile_hash is not None and not self.no_cache:
+            if key not in dependencies:
+                # The first service with these dependencies fills their
+                # cache entry, and the services sharing them wait for that
+                # instead of copying them
+                dependencies[key] = asyncio.wrap_future(executor.submit(
+                    fill_dependency_cache, site_packages_dir, key
+                ))
+            dependencies_dir = await dependencies[key]
+        zip_path = staging_dir / build.service / build.current_hexsha
+        zip_path.parent.mkdir()
+        size, content_hash, build_time = await asyncio.wrap_future(
+            executor.submit(
+                build_service, build.src_dir, dependencies_dir, zip_path
+            )
+        )
+        started = time.perf_counter()
+        with profiling.phase('upload'):
+            await self.engine.call(
+                build.upload_s3, zip_path, size, content_hash
+            )
+        return [build.service, build.current_hexsha[:12], naturalsize(size),
+                f'{build_time:.1f}', f'{time.perf_counter() - started:.1f}']
+
+    async def build_all_async(self, staging_dir):
+        dependencies = {}
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            return await self.engine.gather([
+                self.build_async(executor, build, staging_dir, dependencies)
+                for build in self.builds
+            ])
+
+    def run(self):
+        click.secho(
+            f'Building {len(self.builds)} services with {self.jobs} workers...',  # noqa: E501
+            fg='green'
+        )
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory() as staging_dir:
+            with click_spinner.spinner():
+                summary = self.engine.run(
+                    self.build_all_async(Path(staging_dir))
+                )
+        click.echo(tabulate(
+            summary,
+            headers=['Service', 'Commit', 'Size', 'Build (s)', 'Upload (s)'],
+            disable_numparse=True
+        ))
+        click.secho(
+            f'Built {len(summary)} services in '
+            f'{time.perf_counter() - started:.1f}s', fg='green'
+        )
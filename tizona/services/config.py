@@ -8,8 +8,6 @@ class SetConfig(Service):
         self.hexsha = commit
         self.lambda_function = lambda_function
         super(SetConfig, self).__init__(project, *args, **kwargs)
-        self.cloudformation = self.aws_session.client('cloudformation')
-        self.aws_lambda = self.aws_session.client('lambda')
 
     def run(self):
         pass
@@ -7,6 +7,7 @@ class Api:
     api_id: int
     apigateway_client: str
     aws_region: int
+    preload: bool = True
     stage = 'Prod'
 
     # The below attributes are not meant to be set by the caller
@@ -15,10 +16,42 @@ class Api:
     url = ''
 
     def __post_init__(self):
-        self.load_authorizers()
-        self.load_resources()
+        if self.preload:
+            self.load_authorizers()
+            self.load_resources()
         self.url = self.get_api_url()
 
+    async def load_async(self, engine):
+        """
+        Loads the authorizers and resources through `engine`. The integration
+        of every resource method is fetched concurrently.
+        """
+        authorizers, resources = await engine.gather([
+            engine.call(
+                self.apigateway_client.get_authorizers, restApiId=self.api_id
+            ),
+            engine.paginate(
+                self.apigateway_client, 'get_resources', 'items',
+                restApiId=self.api_id
+            ),
+        ])
+        self.authorizers = [
+            authorizer['name'] for authorizer in authorizers['items']
+        ]
+        methods = [
+            (resource['path'], method, resource['id'])
+            for resource in resources if resource.get('resourceMethods')
+            for method in resource['resourceMethods']
+        ]
+        integrations = await engine.gather([
+            engine.call(self.get_method_integration, method, resource_id)
+            for _, method, resource_id in methods
+        ])
+        self.resources = {}
+        for (resource_path, method, _), integration in zip(methods, integrations):  # noqa: E501
+            self.resources.setdefault(resource_path, {})[method] = integration
+        return self
+
     def load_authorizers(self):
         self.authorizers = [
             authorizer['name'] for authorizer in
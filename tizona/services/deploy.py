@@ -3,12 +3,21 @@ import re
 import shutil
 import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from distutils.dir_util import copy_tree
 from pathlib import Path
 
 import click
+from botocore.exceptions import ClientError
+from click import ClickException
 from tabulate import tabulate
 
+from tizona import profiling
+from tizona.aws.graph import LAMBDA_FUNCTION
+from tizona.services.artifacts import (
+    ArtifactIndex, get_artifact_key, get_artifacts_bucket
+)
+from tizona.services.build import Build
 from tizona.services.general import Service
 
 
@@ -28,10 +37,12 @@ class Deploy(Service):
         self.project = project
         self.hexsha = commit
         self.lambda_function = lambda_function
-        self.bucket = 'indago-map'
         super(Deploy, self).__init__(project, *args, **kwargs)
-        self.cloudformation = self.aws_session.client('cloudformation')
-        self.aws_lambda = self.aws_session.client('lambda')
+        self.bucket = get_artifacts_bucket(self.tizona_config)
+        self.s3 = self.client('s3')
+        self.index = ArtifactIndex(
+            self.s3, self.bucket, self.project, self.service
+        )
 
     def run(self):
         # after successfully pinged the function, we can tag the s3 object to
@@ -44,7 +55,7 @@ class Deploy(Service):
         table = []
         for l in lambdas:
             config = self.aws_lambda.get_function_configuration(
-                FunctionName=l['LogicalResourceId'])
+                FunctionName=l.logical_id)
             table.append(
                 [config['FunctionName'], config['Handler'], config['CodeSha256'],
                  config['LastModified']])
@@ -55,12 +66,11 @@ class Deploy(Service):
         stack = self.get_stack(self.service)
         # stack = self.stacks[0]
         # import pdb; pdb.set_trace()
-        resources = self.list_stack_resources(stack['StackName'])
-        lambdas = [resource for resource in resources
-                   if resource['ResourceType'] == 'AWS::Lambda::Function']
+        self.load_stack_resources([stack.name])
+        lambdas = self.graph.find_resources(stack.name, LAMBDA_FUNCTION)
         if self.lambda_function:
             return [lambda_ for lambda_ in lambdas
-                    if lambda_['LogicalResourceId'] == self.lambda_function]
+                    if lambda_.logical_id == self.lambda_function]
         return lambdas
 
     def update_lambda_package(self):
@@ -68,8 +78,9 @@ class Deploy(Service):
         # I want to do this through a call to a step function that updates the
         # lambda template by pulling config values from a database and runs
         # a stack update
-        aws_lambda = self.aws_session.client('lambda')
-        click.secho('Updating lambdas...', fg='green')
+        self.update_functions(self.resolve_functions_to_update())
+
+    def resolve_functions_to_update(self):
         api_functions = self.list_api_functions(self.service).values()
         if self.lambda_function and self.lambda_function in api_functions:
             api_functions = [self.lambda_function]
@@ -79,15 +90,94 @@ class Deploy(Service):
             # as this is a single key value dict
             api_functions = [function_ for function_ in api_functions][0]
         api_functions = [self.lambda_function] if self.lambda_function else api_functions  # noqa: E501
-        for function_ in api_functions:
-            click.secho(f'Updating function {function_}', fg='yellow')
-            aws_lambda.update_function_code(
-                FunctionName=function_, S3Bucket=self.bucket,
-                S3Key=self.hexsha, Publish=True
-            )
+        return api_functions
+
+    def resolve_artifact_key(self):
+        """
+        Returns the key of the package of the commit to deploy. Packages
+        built before the artifact index existed are named after the commit
+        at the root of the bucket.
+        """
+        entry = self.index.get(self.hexsha)
+        if entry is not None:
+            return entry['key']
+        key = get_artifact_key(self.service, self.hexsha)
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                raise
+            return self.hexsha
+        return key
+
+    def update_functions(self, functions):
+        key = self.resolve_artifact_key()
+        click.secho('Updating lambdas...', fg='green')
+        with profiling.phase('update'):
+            for function_ in functions:
+                click.secho(f'Updating function {function_}', fg='yellow')
+                self.aws_lambda.update_function_code(
+                    FunctionName=function_, S3Bucket=self.bucket,
+                    S3Key=key, Publish=True
+                )
+        self.index.record_deployment(self.hexsha, key)
 
     def ping(self):
         pass
 
     def rollback(self):
         pass
+
+
+class LocalDeploy(Deploy):
+    """
+    Packages the local code and deploys it as a single pipeline. The
+    functions to update are discovered and checked in the background while
+    the package is built and uploaded.
+    """
+
+    def __init__(self, service, project, lambda_function, *args, **kwargs):
+        super(LocalDeploy, self).__init__(
+            service, project, lambda_function, None, *args, **kwargs
+        )
+        # Created after the deploy command, so it reuses the config, session
+        # and discovered stacks the deploy command just loaded
+        self.build = Build(self.project, service, lambda_function, *args,
+                           **kwargs)
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            checks = executor.submit(self.check_functions)
+            self.hexsha = self.build.run()
+            functions, configurations = checks.result()
+        click.echo(tabulate(
+            configurations,
+            headers=['Function name', 'handler', 'code sha', 'last modified']
+        ))
+        self.update_functions(functions)
+        return self.hexsha
+
+    def check_functions(self):
+        """
+        Resolves the functions to update and makes sure they all exist
+        before the new package is ready to be deployed.
+        """
+        functions = self.resolve_functions_to_update()
+
+        async def get_configurations():
+            return await self.engine.gather([
+                self.engine.call(
+                    self.aws_lambda.get_function_configuration,
+                    FunctionName=function_
+                )
+                for function_ in functions
+            ])
+        try:
+            configurations = self.engine.run(get_configurations())
+        except self.aws_lambda.exceptions.ResourceNotFoundException as error:
+            raise ClickException(f'Cannot deploy {self.service}: {error}')
+        return functions, [
+            [config['FunctionName'], config['Handler'], config['CodeSha256'],
+             config['LastModified']]
+            for config in configurations
+        ]
@@ -1,62 +1,35 @@
-import operator
-from functools import lru_cache, reduce
-
 import click
 from click import ClickException
 
 from tizona.aws.apigateway import ApiGatewayMixin
-from tizona.core import AWSCommand
+from tizona.aws.graph import LAMBDA_FUNCTION, REST_API, ResourceGraphMixin
 from tizona.services.dataclasses import Api
 
 
-class Service(AWSCommand):
+class Service(ResourceGraphMixin):
     def __init__(self, project, *args, **kwargs):
         super(Service, self).__init__(*args, **kwargs)
-        self.cloudformation = self.aws_session.client('cloudformation')
-        self.aws_lambda = self.aws_session.client('lambda')
-        self.stacks = self.get_stacks()
+        self.aws_lambda = self.client('lambda')
 
     def get_api_url(self, api_id, stage='Prod'):
         return f'https://{api_id}.execute-api.{self.aws_region }.amazonaws.com/{stage}'  # noqa: E501
 
     def list_api_functions(self, api):
         api_functions = {}
-        stacks = self.get_stacks()
+        stacks = self.stacks
         if api is not None:
-            stacks = [stack for stack in stacks if api in stack['StackName']]
+            stacks = [stack for stack in self.graph.find_stacks(api)
+                      if self.project in stack.name]
+        self.load_stack_resources([stack.name for stack in stacks])
         for stack in stacks:
-            resources = self.list_stack_resources(stack['StackName'])
-            functions = [resource['LogicalResourceId'] for resource in resources
-                         if resource['ResourceType'] == 'AWS::Lambda::Function']
-            for resource in resources:
-                if resource['ResourceType'] == 'AWS::ApiGateway::RestApi':
-                    api_functions[resource['LogicalResourceId']] = functions
+            functions = [
+                function_.logical_id for function_ in
+                self.graph.find_resources(stack.name, LAMBDA_FUNCTION)
+            ]
+            for rest_api in self.graph.find_resources(stack.name, REST_API):
+                api_functions[rest_api.logical_id] = functions
         return api_functions
 
-    def list_stack_resources(self, stack_name):
-        resources = []
-        for page in self.cloudformation.get_paginator(
-                'list_stack_resources'
-        ).paginate(StackName=stack_name):
-            for resource in page['StackResourceSummaries']:
-                resources.append(resource)
-        return resources
-
-    @lru_cache(maxsize=30)
-    def get_stacks(self):
-        stacks = reduce(
-            operator.concat,
-            [page['StackSummaries'] for page in
-             self.cloudformation.get_paginator('list_stacks').paginate()]
-        )
-        return [stack for stack in stacks if self.project in stack['StackName']]
-
-    @lru_cache(maxsize=30)
-    def get_stack(self, service):
-        for stack in self.stacks:
-            if service in stack['StackName']:
-                return stack
-
 
 class ListFunctions(Service):
     def __init__(self, api, project, *args, **kwargs):
@@ -79,19 +52,7 @@ class GetApi(Service, ApiGatewayMixin):
         super(GetApi, self).__init__(project, *args, **kwargs)
 
     def run(self):
-        rest_api = None
-        functions = []
-        stack = self.get_stack(self.service)
-        resources = self.list_stack_resources(stack['StackName'])
-        for resource in resources:
-            if resource['ResourceType'] == 'AWS::ApiGateway::RestApi':
-                rest_api = resource
-            elif resource['ResourceType'] == 'AWS::Lambda::Function':
-                functions.append(resource)
-            else:
-                pass
-        rest_api_id = rest_api["PhysicalResourceId"]
-        api = Api(api_id=rest_api_id, apigateway_client=self.apigateway, aws_region=self.aws_region)
+        api = self.engine.run(self.load_api())
 
         click.secho(f'Authorizers: {", ".join(api.authorizers)}', fg='green')
         click.secho(f'Url: {api.url}', fg='green')
@@ -118,24 +79,22 @@ class GetApi(Service, ApiGatewayMixin):
         # get-domain-name
         # get-domain-names
 
+    async def load_api(self):
+        stack = self.get_stack(self.service)
+        await self.load_stack_resources_async([stack.name])
+        rest_api = self.graph.find_resource(stack.name, REST_API)
+        api = Api(api_id=rest_api.physical_id,
+                  apigateway_client=self.apigateway,
+                  aws_region=self.aws_region, preload=False)
+        return await api.load_async(self.engine)
+
 
 class ListApis(Service, ApiGatewayMixin):
     def __init__(self, project, *args, **kwargs):
         super(ListApis, self).__init__(project, *args, **kwargs)
 
     def run(self):
-        api_ids = []
-        stacks = self.get_stacks()
-        # import pdb; pdb.set_trace()
-        resources = reduce(
-            operator.concat,
-            [self.list_stack_resources(stack['StackName']) for stack in stacks]
-        )
-        for resource in resources:
-            if resource['ResourceType'] == 'AWS::ApiGateway::RestApi':
-                api_ids.append(resource['PhysicalResourceId'])
-        for api_id in api_ids:
-            api = Api(api_id=api_id, apigateway_client=self.apigateway, aws_region=self.aws_region)
+        for api in self.engine.run(self.load_apis()):
             click.secho(f'Authorizers: {", ".join(api.authorizers)}',
                         fg='green')
             click.secho(f'Url: {api.url}', fg='green')
@@ -145,3 +104,17 @@ class ListApis(Service, ApiGatewayMixin):
                 for method, integration in methods.items():
                     click.secho(f'  {method}: {integration}')
             click.echo('')
+
+    async def load_apis(self):
+        stack_names = self.get_live_stack_names()
+        await self.load_stack_resources_async(stack_names)
+        apis = [
+            Api(api_id=rest_api.physical_id,
+                apigateway_client=self.apigateway,
+                aws_region=self.aws_region, preload=False)
+            for stack_name in stack_names
+            for rest_api in self.graph.find_resources(stack_name, REST_API)
+        ]
+        return await self.engine.gather(
+            [api.load_async(self.engine) for api in apis]
+        )
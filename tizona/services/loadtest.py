@@ -0,0 +1,316 @@
+import asyncio
+import itertools
+import re
+import ssl
+import time
+from collections import Counter, defaultdict
+from urllib.parse import quote, urlsplit
+
+import click
+from click import ClickException
+from tabulate import tabulate
+
+from tizona.aws.cloudwatch import parse_duration
+from tizona.services.general import GetApi
+
+PATH_PARAMETER = re.compile(r'{([^}+]+)\+?}')
+PERCENTILES = (50, 90, 99)
+
+
+class HTTPConnectionPool:
+    """
+    Minimal HTTP/1.1 client for a single host, on asyncio streams. Requests
+    go over keep-alive connections that are reused once their response has
+    been read, so the load test measures the API rather than TCP and TLS
+    handshakes.
+    """
+
+    def __init__(self, url, headers=None):
+        parsed = urlsplit(url)
+        if parsed.scheme not in ('http', 'https'):
+            raise ClickException(f'Unsupported url {url}')
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parsed.scheme == 'https' else None  # noqa: E501
+        self.base_path = parsed.path.rstrip('/')
+        host_header = self.host if parsed.port is None else f'{self.host}:{self.port}'  # noqa: E501
+        self.headers = {
+            'Host': host_header,
+            'User-Agent': 'tizona-loadtest',
+            'Accept': '*/*',
+            'Connection': 'keep-alive',
+            **(headers or {}),
+        }
+        self.idle = []
+
+    async def connect(self):
+        return await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl,
+            server_hostname=self.host if self.ssl else None
+        )
+
+    async def request(self, method, path):
+        """
+        Sends a request and returns the status code and the size of the
+        body. A reused connection the server closed in the meantime is
+        replaced once before giving up.
+        """
+        while True:
+            reused = bool(self.idle)
+            reader, writer = self.idle.pop() if reused else await self.connect()  # noqa: E501
+            try:
+                status, body_size, keep_alive = await self.exchange(
+                    reader, writer, method, path
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, body_size
+
+    async def exchange(self, reader, writer, method, path):
+        headers = dict(self.headers)
+        if method in ('POST', 'PUT', 'PATCH'):
+            headers['Content-Length'] = '0'
+        writer.write(
+            f'{method} {self.base_path}{path} HTTP/1.1\r\n'.encode() +
+            ''.join(f'{name}: {value}\r\n' for name, value in headers.items()).encode() +  # noqa: E501
+            b'\r\n'
+        )
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        version, status = status_line.split(' ', 2)[:2]
+        response_headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                response_headers[name.strip().lower()] = value.strip()
+        connection = response_headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and \
+            (version == 'HTTP/1.1' or connection == 'keep-alive')
+        if method == 'HEAD' or status.startswith('1') or status in ('204', '304'):  # noqa: E501
+            body_size = 0
+        elif 'chunked' in response_headers.get('transfer-encoding', ''):
+            body_size = await self.read_chunked(reader)
+        elif 'content-length' in response_headers:
+            body_size = int(response_headers['content-length'])
+            await reader.readexactly(body_size)
+        else:
+            # The body runs until the server closes the connection
+            body_size = len(await reader.read())
+            keep_alive = False
+        return int(status), body_size, keep_alive
+
+    @staticmethod
+    async def read_chunked(reader):
+        body_size = 0
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if size == 0:
+                # Trailers, if any, end with an empty line
+                while await reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+                return body_size
+            await reader.readexactly(size + 2)
+            body_size += size
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LoadTest(GetApi):
+    """
+    Sends concurrent requests to the routes of a service's API for a while
+    and reports the latency percentiles, error rate and throughput of each
+    route.
+
+    By default `concurrency` clients send requests back to back. With a
+    `rate`, requests are started at that rate whatever the responses take,
+    up to `concurrency` in flight, and their latency is measured from when
+    they were due, so that a slow API can't hide behind fewer requests.
+
+    The routes always come from the service's API as deployed, so the
+    stack is discovered even with a `url`, which only replaces the base
+    url the requests are sent to, e.g. with a local server running the
+    same API.
+    """
+
+    def __init__(self, project, service, url=None, duration='30s',
+                 concurrency=10, rate=None, methods=('GET',), params=(),
+                 headers=(), timeout=10, *args, **kwargs):
+        self.url = url
+        self.duration = parse_duration(duration)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.methods = {method.upper() for method in methods}
+        self.params = {}
+        for param in params:
+            if '=' not in param:
+                raise ClickException('--param must be NAME=VALUE')
+            name, value = param.split('=', 1)
+            self.params[name] = value
+        self.headers = {}
+        for header in headers:
+            if ':' not in header:
+                raise ClickException('--header must be "Name: value"')
+            name, value = header.split(':', 1)
+            self.headers[name.strip()] = value.strip()
+        self.timeout = timeout
+        super(LoadTest, self).__init__(project, service, *args, **kwargs)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def get_routes(self, api):
+        """
+        Returns the method and path of every route to test, with the path
+        parameters filled in from `params`, escaped so that a value can't
+        change the path. Routes with parameters that aren't given are
+        skipped.
+        """
+        routes = []
+        for path, methods in sorted(api.resources.items()):
+            for method in sorted(methods):
+                # Integrations for any method are tested with GET
+                request_method = 'GET' if method == 'ANY' else method
+                if request_method not in self.methods:
+                    continue
+                missing = [
+                    name for name in PATH_PARAMETER.findall(path)
+                    if name not in self.params
+                ]
+                if missing:
+                    click.secho(
+                        f'Skipping {method} {path}, missing --param for '
+                        f'{", ".join(missing)}', fg='yellow'
+                    )
+                    continue
+                route = (request_method, PATH_PARAMETER.sub(
+                    lambda match: quote(
+                        self.params[match.group(1)], safe=''
+                    ), path
+                ))
+                if route not in routes:
+                    routes.append(route)
+        return routes
+
+    async def send(self, pool, route, started):
+        method, path = route
+        try:
+            status, _ = await asyncio.wait_for(
+                pool.request(method, path), self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.errors[route]['timeout'] += 1
+        except (OSError, asyncio.IncompleteReadError, ValueError) as error:
+            self.errors[route][type(error).__name__] += 1
+        else:
+            if status >= 400:
+                self.errors[route][status] += 1
+        self.latencies[route].append(time.perf_counter() - started)
+
+    async def run_closed_loop(self, pool, routes, deadline):
+        routes = itertools.cycle(routes)
+
+        async def client():
+            while time.perf_counter() < deadline:
+                await self.send(pool, next(routes), time.perf_counter())
+        await asyncio.gather(*(client() for _ in range(self.concurrency)))
+
+    async def run_open_loop(self, pool, routes, deadline):
+        routes = itertools.cycle(routes)
+        in_flight = asyncio.Semaphore(self.concurrency)
+
+        async def send(route, due):
+            async with in_flight:
+                await self.send(pool, route, due)
+        start = time.perf_counter()
+        tasks = []
+        for index in itertools.count():
+            due = start + index / self.rate
+            if due >= deadline:
+                break
+            await asyncio.sleep(max(0, due - time.perf_counter()))
+            tasks.append(asyncio.ensure_future(send(next(routes), due)))
+        await asyncio.gather(*tasks)
+
+    async def load_test(self, url, routes):
+        pool = HTTPConnectionPool(url, self.headers)
+        deadline = time.perf_counter() + self.duration
+        try:
+            if self.rate:
+                await self.run_open_loop(pool, routes, deadline)
+            else:
+                await self.run_closed_loop(pool, routes, deadline)
+        finally:
+            pool.close()
+
+    def run(self):
+        api = self.engine.run(self.load_api())
+        url = self.url or api.url
+        routes = self.get_routes(api)
+        if not routes:
+            raise ClickException(f'No routes to test in {url}')
+        load = f'{self.rate}/s' if self.rate else f'{self.concurrency} clients'  # noqa: E501
+        click.secho(
+            f'Testing {len(routes)} routes of {url} for {self.duration}s '
+            f'with {load}...', fg='green'
+        )
+        started = time.perf_counter()
+        asyncio.run(self.load_test(url, routes))
+        self.echo_results(routes, time.perf_counter() - started)
+
+    def echo_results(self, routes, elapsed):
+        table = []
+        for route in routes + [None]:
+            if route is None:
+                latencies = sorted(itertools.chain(*self.latencies.values()))
+                errors = sum(sum(counter.values()) for counter in self.errors.values())  # noqa: E501
+                name = 'Total'
+            else:
+                latencies = sorted(self.latencies[route])
+                errors = sum(self.errors[route].values())
+                name = ' '.join(route)
+            if not latencies:
+                continue
+            table.append(
+                [name, len(latencies), errors / len(latencies) * 100,
+                 len(latencies) / elapsed] +
+                [percentile(latencies, percent) * 1000 for percent in PERCENTILES] +  # noqa: E501
+                [latencies[-1] * 1000]
+            )
+        click.echo(tabulate(
+            table,
+            headers=['Route', 'Requests', 'Errors (%)', 'Req/s'] +
+                    [f'p{percent} (ms)' for percent in PERCENTILES] +
+                    ['Max (ms)'],
+            floatfmt='.1f'
+        ))
+        for route, counter in self.errors.items():
+            if not counter:
+                continue
+            click.secho(
+                f'{" ".join(route)}: ' + ', '.join(
+                    f'{count} x {error}' for error, count in counter.most_common()  # noqa: E501
+                ), fg='red'
+            )
@@ -1,17 +1,43 @@
-import operator
-from functools import lru_cache, reduce
+import hashlib
+import json
+import re
+from datetime import datetime, timezone
 from pathlib import Path
 
 import click
 import click_spinner
 import delegator
+from botocore.exceptions import ClientError, WaiterError
 from click import ClickException
-from git import Repo
+from humanize import naturalsize
+from tabulate import tabulate
 
-from tizona.core import AWSCommand
+from tizona import profiling
+from tizona.aws.cloudfront import (
+    batch_paths, changed_paths, create_invalidation
+)
+from tizona.aws.graph import (
+    CLOUDFRONT_DISTRIBUTION, S3_BUCKET, ResourceGraphMixin
+)
+from tizona.aws.s3 import S3Uploader, hash_file
+from tizona.vcs import GitMetadata
 
+RELEASES_MANIFEST_KEY = '.tizona/releases.json'
+# Releases kept in the manifest by default: `max_releases` of `.tizona.yaml`
+# overrides it
+DEFAULT_MAX_RELEASES = 30
+BUILD_CACHE_PATH = Path('.tizona') / 'cache' / 'ui-build.json'
+YARN_LOCK = Path('yarn.lock')
+ENTRY_NAME = re.compile(r'[0-9a-f]{40}\.html')
+# What `yarn run build` reads, besides the `.env` files
+BUILD_INPUTS = (
+    'src', 'public', 'package.json', 'yarn.lock', 'babel.config.js',
+    'vue.config.js', 'webpack.config.js', 'vite.config.js', 'vite.config.ts',
+    'postcss.config.js', 'tsconfig.json', '.browserslistrc',
+)
 
-class UICore(AWSCommand):
+
+class UICore(ResourceGraphMixin):
     def __init__(self, project, *args, **kwargs):
         if not project:
             raise ClickException(
@@ -19,61 +45,98 @@ class UICore(AWSCommand):
             )
         self.project = project
         super(UICore, self).__init__(*args, **kwargs)
-        self.cloudformation = self.aws_session.client('cloudformation')
-        self.aws_lambda = self.aws_session.client('lambda')
-        self.stacks = self.get_stacks()
+        self.aws_lambda = self.client('lambda')
         self.stack = self.get_stack('s3-website')
-        self.stack_name = self.stack['StackName']
+        self.stack_name = self.stack.name
         self.bucket = self._get_bucket()
         self.distribution_url = f'https://s3-{self.aws_region}.amazonaws.com/{self.bucket}'  # noqa: E501
 
     def _get_bucket(self):
-        resources = self.list_stack_resources(self.stack_name)
-        for resource in resources:
-            if resource['ResourceType'] == 'AWS::S3::Bucket':
-                return resource['PhysicalResourceId']
-
-    def list_stack_resources(self, stack_name):
-        resources = []
-        for page in self.cloudformation.get_paginator(
-                'list_stack_resources'
-        ).paginate(StackName=stack_name):
-            for resource in page['StackResourceSummaries']:
-                resources.append(resource)
-        return resources
-
-    @lru_cache(maxsize=30)
-    def get_stacks(self):
-        stacks = reduce(
-            operator.concat,
-            [page['StackSummaries'] for page in
-             self.cloudformation.get_paginator('list_stacks').paginate()]
-        )
-        return [stack for stack in stacks if self.project in stack['StackName']]
-
-    @lru_cache(maxsize=30)
-    def get_stack(self, service):
-        for stack in self.stacks:
-            if service in stack['StackName']:
-                return stack
+        return self.find_resource(self.stack_name, S3_BUCKET).physical_id
 
 
 class Build(UICore):
-    def __init__(self, project, *args, **kwargs):
+    """
+    Builds the app into dist/. The hashes of `yarn.lock` and of the sources
+    the last successful install and build ran with are kept in
+    `.tizona/cache/ui-build.json`, and a step whose inputs haven't changed
+    since is skipped, reusing `node_modules/` or `dist/` as they are.
+    """
+
+    def __init__(self, project, force=False, *args, **kwargs):
         self.project = project
-        self.repo = Repo()
-        self.current_hexsha = self.repo.head.object.hexsha
-        self.untracked_files = self.repo.untracked_files
+        self.force = force
+        self.git = GitMetadata()
+        self.current_hexsha = self.git.head_hexsha
         super(Build, self).__init__(project, *args, **kwargs)
 
     def run(self):
+        build_cache = self.load_build_cache()
         with click_spinner.spinner():
-            click.secho('Installing dependencies...', fg='green')
-            delegator.run('yarn')
-            click.secho('Building the app...', fg='green')
-            delegator.run('yarn run build')
+            if not self.force and YARN_LOCK.is_file() and \
+                    build_cache.get('lockfile') == hash_file(YARN_LOCK) and \
+                    Path('node_modules').is_dir():
+                click.secho('yarn.lock unchanged, skipping install', fg='green')  # noqa: E501
+            else:
+                click.secho('Installing dependencies...', fg='green')
+                with profiling.phase('install'):
+                    self.run_step('yarn')
+                # yarn may have updated the lockfile
+                if YARN_LOCK.is_file():
+                    build_cache['lockfile'] = hash_file(YARN_LOCK)
+                    self.save_build_cache(build_cache)
+            sources_hash = self.hash_sources()
+            if not self.force and build_cache.get('sources') == sources_hash \
+                    and (Path('dist') / 'index.html').is_file():
+                click.secho('Sources unchanged, reusing dist/', fg='green')
+            else:
+                click.secho('Building the app...', fg='green')
+                # A failed build leaves dist/ half-written
+                build_cache.pop('sources', None)
+                self.save_build_cache(build_cache)
+                with profiling.phase('build'):
+                    self.run_step('yarn run build')
+                build_cache['sources'] = sources_hash
+                self.save_build_cache(build_cache)
             self.update_index_file()
 
+    @staticmethod
+    def run_step(command):
+        output = delegator.run(command)
+        if output.return_code != 0:
+            raise ClickException(
+                f'`{command}` failed:\n{output.err or output.out}'
+            )
+
+    def hash_sources(self):
+        """
+        Hashes the files the build depends on: the files of `BUILD_INPUTS`
+        that aren't ignored, plus the `.env` files, which usually are.
+        """
+        paths = set(self.git.cmd.ls_files(
+            '--cached', '--others', '--exclude-standard', '--', *BUILD_INPUTS
+        ).splitlines())
+        paths.update(path.as_posix() for path in Path().glob('.env*'))
+        digest = hashlib.sha256()
+        for path in sorted(paths):
+            if not Path(path).is_file():
+                continue
+            digest.update(path.encode())
+            digest.update(hash_file(Path(path)).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def load_build_cache():
+        try:
+            return json.loads(BUILD_CACHE_PATH.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def save_build_cache(build_cache):
+        BUILD_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        BUILD_CACHE_PATH.write_text(json.dumps(build_cache, indent=2))
+
     def update_index_file(self):
         """
         sed -i "s/\=\//\=https\:\/\/s3-eu-west-1.amazonaws.com\/indago-maps-website\//g" dist/index.html
@@ -84,91 +147,290 @@ class Build(UICore):
             index_contents = index_file.read_text()
             new_contents = index_contents.replace('=/', f'={full_s3_url_prefix}')
             hashed_index = Path('dist') / f'{self.current_hexsha}.html'
+            # A reused dist/ still has the entries of the releases it was
+            # built for, which would be uploaded with this one
+            for entry in Path('dist').glob('*.html'):
+                if ENTRY_NAME.fullmatch(entry.name) and entry != hashed_index:
+                    entry.unlink()
             hashed_index.write_text(new_contents)
 
 
-class Deploy(UICore):
-    def __init__(self, project, *args, **kwargs):
+class Release(UICore):
+    """
+    Base for the commands that switch the release the distribution serves.
+    Releases live side by side in the bucket, each under the prefix of its
+    commit, and the distribution serves the one its `DefaultRootObject`,
+    `<hexsha>.html`, points at. Every deploy records the release in the
+    `.tizona/releases.json` manifest of the bucket, newest last, which keeps
+    the last `max_releases`. Older releases stay in the bucket, but can't
+    be rolled back to.
+
+    Each release records the hash of its entry and of every file under its
+    prefix, so the paths CloudFront may hold stale copies of are found by
+    comparing what the distribution serves at each path before and after
+    a switch: the root whenever the release it serves changes, and the
+    files a redeploy of the same commit with other content rewrote.
+    """
+
+    def __init__(self, project, wait=False, *args, **kwargs):
         self.project = project
-        self.repo = Repo()
-        self.current_hexsha = self.repo.head.object.hexsha
-        self.untracked_files = self.repo.untracked_files
-        super(Deploy, self).__init__(project, *args, **kwargs)
+        self.wait = wait
+        super(Release, self).__init__(project, *args, **kwargs)
         self.distribution_id = self._get_distribution_id()
-        self.cloudfront = self.aws_session.client('cloudfront')
+        self.cloudfront = self.client('cloudfront')
+        self.s3 = self.client('s3')
+
+    def _get_distribution_id(self):
+        return self.find_resource(
+            self.stack_name, CLOUDFRONT_DISTRIBUTION
+        ).physical_id
+
+    def get_distribution_config(self):
+        distribution_config = self.cloudfront.get_distribution_config(
+            Id=self.distribution_id
+        )
+        return distribution_config['ETag'], distribution_config['DistributionConfig']  # noqa: E501
+
+    def get_served_release(self):
+        _, config = self.get_distribution_config()
+        return config['DefaultRootObject'].rsplit('.html', 1)[0]
+
+    def set_default_root_object(self, hexsha):
+        """
+        Points the distribution at the release of `hexsha` and returns the
+        ETag of the new config. The update is guarded by the ETag of the
+        config it modifies, so it fails rather than overwrite a change made
+        in between.
+        """
+        etag, config = self.get_distribution_config()
+        config['DefaultRootObject'] = f'{hexsha}.html'
+        try:
+            return self.cloudfront.update_distribution(
+                DistributionConfig=config, Id=self.distribution_id,
+                IfMatch=etag
+            )['ETag']
+        except ClientError as error:
+            if error.response['Error']['Code'] == 'PreconditionFailed':
+                raise ClickException(
+                    'The distribution was modified while it was being '
+                    'updated. Try again.'
+                )
+            raise
+
+    @staticmethod
+    def get_release_paths(release):
+        """
+        Returns the hash of the content the distribution serves at each path
+        of `release` once it serves it at its root.
+        """
+        hexsha = release['hexsha']
+        paths = {
+            f'/{hexsha}/{path}': content_hash
+            for path, content_hash in release.get('assets', {}).items()
+        }
+        paths[f'/{hexsha}.html'] = release['entry']
+        paths['/'] = release['entry']
+        return paths
+
+    @staticmethod
+    def get_served_paths(releases, served, hexsha=None):
+        """
+        Returns the hash of the content the distribution serves at each path
+        before it switches releases: the paths of the `served` release, and
+        those of `hexsha` as it was last deployed, which a redeploy may
+        rewrite. The content of the root is unknown when the served release
+        isn't in `releases`.
+        """
+        releases = {release['hexsha']: release for release in releases}
+        paths = {}
+        if hexsha in releases:
+            paths.update(Release.get_release_paths(releases[hexsha]))
+        paths['/'] = None
+        if served in releases:
+            paths.update(Release.get_release_paths(releases[served]))
+        return paths
+
+    def invalidate(self, before, after, etag):
+        """
+        Invalidates the paths whose content differs between `before` and
+        `after`, the hashes of what the distribution serves at each path
+        before and after the switch. The invalidation belongs to the
+        distribution update that produced `etag`, so retrying it doesn't
+        invalidate twice.
+        """
+        paths = batch_paths(changed_paths(before, after))
+        if not paths:
+            click.secho('Nothing to invalidate', fg='green')
+            return
+        click.secho(f'Invalidating {", ".join(paths)}', fg='green')
+        with click_spinner.spinner():
+            try:
+                create_invalidation(
+                    self.cloudfront, self.distribution_id, paths, etag,
+                    wait=self.wait
+                )
+            except WaiterError as error:
+                raise ClickException(f'Invalidation failed: {error}')
+
+    def load_releases(self):
+        try:
+            response = self.s3.get_object(
+                Bucket=self.bucket, Key=RELEASES_MANIFEST_KEY
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return []
+            raise
+        return json.loads(response['Body'].read())
+
+    def save_releases(self, releases):
+        self.s3.put_object(
+            Bucket=self.bucket, Key=RELEASES_MANIFEST_KEY,
+            Body=json.dumps(releases, indent=2).encode(),
+            ContentType='application/json'
+        )
+
+
+class Deploy(Release):
+    def __init__(self, project, compress=None, wait=False, *args, **kwargs):
+        self.project = project
+        self.compress = compress
+        self.git = GitMetadata()
+        self.current_hexsha = self.git.head_hexsha
+        super(Deploy, self).__init__(project, wait, *args, **kwargs)
 
     def run(self):
         with click_spinner.spinner():
-            self.upload_to_s3()
+            releases = self.load_releases()
+            # Taken before the release is recorded, which replaces the
+            # record of an earlier deploy of the same commit
+            before = self.get_served_paths(
+                releases, self.get_served_release(), self.current_hexsha
+            )
+            with profiling.phase('upload'):
+                entry_hash, assets = self.upload_to_s3()
             self.tag_object()
-            self.update_cloudfront_default_root_object()
-            # self.reset_cloudfront_cache()
-
-    def _get_distribution_id(self):
-        for resource in self.list_stack_resources(self.stack_name):
-            if resource['ResourceType'] == 'AWS::CloudFront::Distribution':
-                return resource['PhysicalResourceId']
+            with profiling.phase('update'):
+                release = self.record_release(releases, entry_hash, assets)
+                etag = self.update_cloudfront_default_root_object()
+            with profiling.phase('invalidation'):
+                self.reset_cloudfront_cache(before, release, etag)
 
     def upload_to_s3(self):
         click.secho('Uploading to s3...', fg='green')
+        uploader = S3Uploader(
+            self.s3, self.bucket, self.engine, encoding=self.compress
+        )
         with click_spinner.spinner():
-            output = delegator.run(
-                f'aws s3 sync dist/ s3://{self.bucket}/{self.current_hexsha}',
-                env={
-                    'AWS_DEFAULT_PROFILE': self.aws_profile,
-                    'AWS_DEFAULT_REGION': self.aws_region
-                }
+            files, uploaded, uploaded_bytes = self.engine.run(
+                uploader.sync_async(Path('dist'), self.current_hexsha)
             )
             click.secho('uploading the file...', fg='green')
-            bucket = self.aws_session.resource('s3').Bucket(self.bucket)
-            response = bucket.put_object(
-                ACL='public-read',
-                Body=Path(f'dist/{self.current_hexsha}.html').read_text(),
-                ContentType='text/html',
-                Key=f'{self.current_hexsha}.html',
+            entry_hash = uploader.upload_entry(
+                Path(f'dist/{self.current_hexsha}.html'),
+                f'{self.current_hexsha}.html'
             )
-        if output.err:
-            click.secho('The following error was encountered: ', fg='red')
-            click.secho(output.err, fg='red')
-        click.echo(response)
+        click.secho(
+            f'{uploaded} of {len(files)} files uploaded '
+            f'({naturalsize(uploaded_bytes)}), the rest copied from '
+            f'previous releases', fg='green'
+        )
+        return entry_hash, files
 
     def tag_object(self):
         click.secho('Object tagged', fg='green')
 
-    def get_distribution_config(self):
-        distribution_config = self.cloudfront.get_distribution_config(
-            Id=self.distribution_id
-        )
-        return distribution_config['ETag'], distribution_config['DistributionConfig']  # noqa: E501
-
     def update_cloudfront_default_root_object(self):
         click.secho('Updating cloudfront distribution', fg='green')
-        etag, config = self.get_distribution_config()
-        config['DefaultRootObject'] = f'{self.current_hexsha}.html'
         with click_spinner.spinner():
-            self.cloudfront.update_distribution(
-                DistributionConfig=config, Id=self.distribution_id, IfMatch=etag
+            return self.set_default_root_object(self.current_hexsha)
+
+    def record_release(self, releases, entry_hash, assets):
+        release = {
+            'hexsha': self.current_hexsha,
+            'summary': self.git.summary,
+            'entry': entry_hash,
+            'assets': assets,
+            'released_at': datetime.now(timezone.utc).isoformat(),
+        }
+        releases = [
+            previous for previous in releases
+            if previous['hexsha'] != self.current_hexsha
+        ] + [release]
+        max_releases = self.tizona_config.get(
+            'max_releases', DEFAULT_MAX_RELEASES
+        )
+        # The release being deployed is always kept
+        self.save_releases(releases[-max(max_releases, 1):])
+        return release
+
+    def reset_cloudfront_cache(self, before, release, etag):
+        self.invalidate(before, self.get_release_paths(release), etag)
+
+
+class Rollback(Release):
+    """
+    Serves an earlier release again by pointing the distribution back at
+    it, without building or uploading anything. Without a target, rolls
+    back to the release deployed before the current one.
+    """
+
+    def __init__(self, project, to=None, list_releases=False, wait=False,
+                 *args, **kwargs):
+        self.project = project
+        self.to = to
+        self.list_releases = list_releases
+        super(Rollback, self).__init__(project, wait, *args, **kwargs)
+
+    def run(self):
+        releases = self.load_releases()
+        if not releases:
+            raise ClickException(f'No releases recorded in {self.bucket}')
+        current = self.get_served_release()
+        if self.list_releases:
+            return self.echo_releases(releases, current)
+        release = self.find_release(releases, current)
+        if release['hexsha'] == current:
+            click.secho(f'{current} is already being served', fg='green')
+            return
+        click.secho(f'Rolling back to {release["hexsha"]}', fg='green')
+        with click_spinner.spinner():
+            etag = self.set_default_root_object(release['hexsha'])
+        click.secho('Distribution updated', fg='green')
+        self.invalidate(
+            self.get_served_paths(releases, current),
+            self.get_release_paths(release), etag
+        )
+
+    def find_release(self, releases, current):
+        if self.to:
+            matches = [
+                release for release in releases
+                if release['hexsha'].startswith(self.to)
+            ]
+            if len(matches) != 1:
+                raise ClickException(
+                    f'{self.to} matches {len(matches)} releases, run '
+                    f'`tizona ui rollback --list` to see them'
+                )
+            return matches[0]
+        hexshas = [release['hexsha'] for release in releases]
+        if current not in hexshas or hexshas.index(current) == 0:
+            raise ClickException(
+                'There is no release before the current one, use --to to '
+                'choose one'
             )
+        return releases[hexshas.index(current) - 1]
 
-    def reset_cloudfront_cache(self):
-        # click.secho('Cloudfront cache reset', fg='green')
-        # with click_spinner.spinner():
-        #     self.cloudfront.create_invalidation(
-        #         DistributionId=self.distribution_id,
-        #         InvalidationBatch={
-        #             'Paths': {
-        #                 'Quantity': 123,
-        #                 'Items': [
-        #                     'string',
-        #                 ]
-        #             },
-        #             'CallerReference': 'string'
-        #         }
-        #     )
-        # I don't think I need to invalidate the cache because I'm changing the
-        # name of the default root object
-        pass
-
-
-class Rollback(UICore):
-    pass
+    @staticmethod
+    def echo_releases(releases, current):
+        table = [
+            ['*' if release['hexsha'] == current else '',
+             release['hexsha'][:12], release['released_at'],
+             release.get('summary', '')]
+            for release in reversed(releases)
+        ]
+        click.secho(
+            tabulate(table, headers=['', 'Commit', 'Released at', 'Summary']),
+            fg='green'
+        )
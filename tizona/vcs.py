@@ -0,0 +1,113 @@
+"""
+Git metadata of the working directory, read only when a step needs it.
+The current commit is read from `HEAD` and the refs on disk, and anything
+else runs git from the working directory, scoped to the paths it is about,
+so nothing walks the whole working tree of a large repository.
+"""
+import re
+from pathlib import Path
+
+from click import ClickException
+from git import Git, Repo
+
+HEXSHA_PATTERN = re.compile(r'[0-9a-f]{40}([0-9a-f]{24})?')
+
+
+class GitMetadata:
+    def __init__(self, path=None):
+        self.path = Path(path or Path.cwd()).absolute()
+        self._git_dir = None
+        self._cmd = None
+        self._repo = None
+        self._head_hexsha = None
+
+    @property
+    def git_dir(self):
+        if self._git_dir is None:
+            self._git_dir = self._find_git_dir()
+        return self._git_dir
+
+    def _find_git_dir(self):
+        for directory in (self.path, *self.path.parents):
+            dot_git = directory / '.git'
+            if dot_git.is_dir():
+                return dot_git
+            if dot_git.is_file():
+                # Worktrees and submodules have a file pointing at their git
+                # directory instead
+                content = dot_git.read_text().strip()
+                if content.startswith('gitdir:'):
+                    return (directory / content[len('gitdir:'):].strip()).resolve()  # noqa: E501
+        raise ClickException(f'{self.path} is not in a git repository')
+
+    @property
+    def common_dir(self):
+        """
+        The directory holding the refs shared by every worktree.
+        """
+        commondir = self.git_dir / 'commondir'
+        if commondir.is_file():
+            return (self.git_dir / commondir.read_text().strip()).resolve()
+        return self.git_dir
+
+    @property
+    def cmd(self):
+        """
+        Runs git commands from `path`, so relative paths and the paths git
+        prints are relative to it.
+        """
+        if self._cmd is None:
+            self._cmd = Git(self.path)
+        return self._cmd
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            self._repo = Repo(self.path, search_parent_directories=True)
+        return self._repo
+
+    def resolve_ref(self, ref):
+        for git_dir in (self.git_dir, self.common_dir):
+            ref_path = git_dir / ref
+            if ref_path.is_file():
+                return ref_path.read_text().strip()
+        packed_refs = self.common_dir / 'packed-refs'
+        if packed_refs.is_file():
+            for line in packed_refs.read_text().splitlines():
+                if line.endswith(f' {ref}'):
+                    return line.split(' ', 1)[0]
+
+    @property
+    def head_hexsha(self):
+        if self._head_hexsha is None:
+            self._head_hexsha = self._read_head()
+        return self._head_hexsha
+
+    def _read_head(self):
+        head = (self.git_dir / 'HEAD').read_text().strip()
+        if not head.startswith('ref:'):
+            # Detached HEAD
+            hexsha = head
+        else:
+            hexsha = self.resolve_ref(head[len('ref:'):].strip())
+        if hexsha is None or not HEXSHA_PATTERN.fullmatch(hexsha):
+            # Refs that aren't plain files, e.g. in the reftable format
+            return self.repo.head.object.hexsha
+        return hexsha
+
+    @property
+    def summary(self):
+        return self.cmd.log('-1', '--format=%s', self.head_hexsha)
+
+    def uncommitted_changes(self, paths):
+        """
+        Returns the files under `paths` with staged or unstaged changes.
+        Untracked files are ignored, and git only looks at `paths`.
+        """
+        paths = [Path(path).as_posix() for path in paths if Path(path).exists()]  # noqa: E501
+        if not paths:
+            return []
+        output = self.cmd.status(
+            '--porcelain', '--untracked-files=no', '--', *paths
+        )
+        return [line[3:] for line in output.splitlines()]